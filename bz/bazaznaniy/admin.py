@@ -1,5 +1,37 @@
 from django.contrib import admin
-from .models import Sector, Language, Topic, Question, Answer, UserProgress, Tip
+from . import admin_tools
+from .admin_tools import LargeTableAdmin, related_filter
+from .attempts import unpack_answers
+from .models import (Sector, Language, Topic, Question, Answer, UserProgress, Tip, Submission,
+                     Attempt, QuestionStats, ReviewItem)
+
+TopicFilter = related_filter('topic', 'Тема', 'name__icontains')
+QuestionFilter = related_filter('question', 'Вопрос', 'code', placeholder='id или код')
+UserFilter = related_filter('user', 'Пользователь', 'username', placeholder='id или логин')
+QuestionTopicFilter = related_filter('question__topic', 'Тема', 'name__icontains')
+
+
+@admin.action(description='Сделать активными')
+def make_active(modeladmin, request, queryset):
+    updated = admin_tools.set_active(queryset, True)
+    modeladmin.message_user(request, f'Активировано: {updated}')
+
+@admin.action(description='Сделать неактивными')
+def make_inactive(modeladmin, request, queryset):
+    updated = admin_tools.set_active(queryset, False)
+    modeladmin.message_user(request, f'Скрыто: {updated}')
+
+@admin.action(description='Перенумеровать порядок')
+def renumber(modeladmin, request, queryset):
+    updated = admin_tools.reorder(queryset)
+    modeladmin.message_user(request, f'Перенумеровано: {updated}')
+
+@admin.action(description='Пересчитать прохождение тем')
+def recompute_progress(modeladmin, request, queryset):
+    updated = admin_tools.recompute_progress(queryset)
+    modeladmin.message_user(request, f'Отмечено пройденными: {updated}')
+
+CONTENT_ACTIONS = [make_active, make_inactive, renumber]
 
 class LanguageInline(admin.TabularInline):
     model = Language
@@ -40,6 +72,7 @@ class SectorAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     inlines = [LanguageInline]
     ordering = ('order', 'name')
+    actions = CONTENT_ACTIONS
 
 @admin.register(Language)
 class LanguageAdmin(admin.ModelAdmin):
@@ -50,54 +83,140 @@ class LanguageAdmin(admin.ModelAdmin):
     inlines = [TopicInline]
     list_editable = ('is_active', 'order')
     ordering = ('sector', 'order', 'name')
+    list_select_related = ('sector',)
+    actions = CONTENT_ACTIONS
 
 @admin.register(Topic)
 class TopicAdmin(admin.ModelAdmin):
-    list_display = ('name', 'lang', 'icon', 'is_active', 'order', 'created_at')
+    list_display = ('name', 'lang', 'icon', 'questions_per_test', 'is_active', 'order', 'created_at')
     list_filter = ('lang', 'is_active')
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
     inlines = [QuestionInline, TipInline]
-    list_editable = ('is_active', 'order')
+    list_editable = ('questions_per_test', 'is_active', 'order')
     ordering = ('lang', 'order', 'name')
+    list_select_related = ('lang',)
+    autocomplete_fields = ('lang',)
+    actions = CONTENT_ACTIONS
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(LargeTableAdmin):
     list_display = ('text_short', 'topic', 'question_type', 'points', 'is_active', 'order')
-    list_filter = ('topic', 'question_type', 'is_active')
-    search_fields = ('text',)
+    list_filter = (TopicFilter, 'question_type', 'is_active')
+    search_fields = ('text', 'code')
     inlines = [AnswerInline]
     list_editable = ('points', 'is_active', 'order')
-    ordering = ('topic', 'order')
+    ordering = ('topic_id', 'order')
+    list_select_related = ('topic__lang',)
+    autocomplete_fields = ('topic',)
+    actions = CONTENT_ACTIONS
 
     def text_short(self, obj):
         return obj.text[:50] + '...' if len(obj.text) > 50 else obj.text
     text_short.short_description = 'Текст вопроса'
 
 @admin.register(Answer)
-class AnswerAdmin(admin.ModelAdmin):
+class AnswerAdmin(LargeTableAdmin):
     list_display = ('text_short', 'question', 'is_correct', 'order')
-    list_filter = ('question', 'is_correct')
+    list_filter = (QuestionFilter, 'is_correct')
     search_fields = ('text',)
     list_editable = ('is_correct', 'order')
-    ordering = ('question', 'order')
+    ordering = ('question_id', 'order')
+    list_select_related = ('question',)
+    autocomplete_fields = ('question',)
+    actions = [renumber]
 
     def text_short(self, obj):
         return obj.text[:50] + '...' if len(obj.text) > 50 else obj.text
     text_short.short_description = 'Текст ответа'
 
 @admin.register(Tip)
-class TipAdmin(admin.ModelAdmin):
+class TipAdmin(LargeTableAdmin):
     list_display = ('title', 'topic', 'is_active', 'order', 'created_at')
-    list_filter = ('topic', 'is_active')
+    list_filter = (TopicFilter, 'is_active')
     search_fields = ('title', 'content')
     list_editable = ('is_active', 'order')
-    ordering = ('topic', 'order', 'title')
-    list_select_related = ('topic',)
+    ordering = ('topic_id', 'order', 'title')
+    list_select_related = ('topic__lang',)
+    autocomplete_fields = ('topic',)
+    actions = CONTENT_ACTIONS
 
 @admin.register(UserProgress)
-class UserProgressAdmin(admin.ModelAdmin):
+class UserProgressAdmin(LargeTableAdmin):
     list_display = ('user', 'topic', 'is_completed', 'score', 'max_score', 'percentage', 'attempts', 'last_attempt_at')
-    list_filter = ('is_completed', 'topic', 'user')
+    list_filter = ('is_completed', TopicFilter, UserFilter)
     search_fields = ('user__username', 'topic__name')
-    ordering = ('-last_attempt_at',)
\ No newline at end of file
+    ordering = ('-last_attempt_at',)
+    list_select_related = ('user', 'topic__lang')
+    autocomplete_fields = ('user', 'topic')
+    actions = [recompute_progress]
+
+@admin.register(Submission)
+class SubmissionAdmin(LargeTableAdmin):
+    list_display = ('user', 'topic', 'status', 'score', 'total_points', 'created_at', 'graded_at')
+    list_filter = ('status', TopicFilter, UserFilter)
+    search_fields = ('user__username', 'topic__name')
+    ordering = ('-created_at',)
+    list_select_related = ('user', 'topic__lang')
+    autocomplete_fields = ('user', 'topic')
+    readonly_fields = ('answers', 'seed', 'created_at', 'graded_at')
+
+@admin.register(Attempt)
+class AttemptAdmin(LargeTableAdmin):
+    list_display = ('user', 'topic', 'score', 'total_points', 'created_at')
+    list_filter = (TopicFilter, UserFilter)
+    search_fields = ('user__username', 'topic__name')
+    ordering = ('-created_at',)
+    list_select_related = ('user', 'topic__lang')
+    exclude = ('answers',)
+    readonly_fields = ('user', 'topic', 'seed', 'score', 'total_points', 'answers_display', 'created_at')
+
+    def answers_display(self, obj):
+        return '; '.join(
+            f"#{record.question_id}: {'верно' if record.is_correct else 'неверно'}"
+            + (f" ({', '.join(map(str, record.answer_ids))})" if record.answer_ids else '')
+            for record in unpack_answers(obj.answers)
+        )
+    answers_display.short_description = 'Ответы'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(QuestionStats)
+class QuestionStatsAdmin(LargeTableAdmin):
+    list_display = ('question', 'topic', 'attempts', 'difficulty_display', 'discrimination_display')
+    list_filter = (QuestionTopicFilter,)
+    search_fields = ('question__text', 'question__code')
+    list_select_related = ('question__topic__lang',)
+    ordering = ('question__topic', 'question__order')
+
+    def topic(self, obj):
+        return obj.question.topic
+    topic.short_description = 'Тема'
+
+    def difficulty_display(self, obj):
+        value = obj.difficulty
+        return '—' if value is None else f'{value:.0%}'
+    difficulty_display.short_description = 'Доля верных'
+
+    def discrimination_display(self, obj):
+        value = obj.discrimination
+        return '—' if value is None else f'{value:.2f}'
+    discrimination_display.short_description = 'Дискриминативность'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ReviewItem)
+class ReviewItemAdmin(LargeTableAdmin):
+    list_display = ('user', 'question', 'topic', 'easiness', 'interval', 'repetitions', 'due_at')
+    list_filter = (UserFilter, TopicFilter)
+    ordering = ('user_id', 'due_at')
+    list_select_related = ('user', 'question', 'topic__lang')
+    readonly_fields = ('user', 'question', 'topic', 'last_attempt_id')
@@ -0,0 +1,208 @@
+"""Помощники админки для больших таблиц.
+
+- EstimatedCountPaginator: на PostgreSQL число строк для постраничного
+  вывода берётся из оценки планировщика (EXPLAIN), а точный COUNT(*)
+  выполняется, только если оценка меньше EXACT_COUNT_LIMIT.
+- related_filter: фильтр по внешнему ключу в виде поля ввода (id или
+  имя) вместо списка из всех строк связанной таблицы.
+- set_active, reorder, recompute_progress: массовые действия одним
+  UPDATE. Сигналы post_save при этом не вызываются, поэтому кэши и
+  индекс поиска сбрасываются здесь же, как после импорта контента.
+"""
+import json
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .api import CONTENT_VERSION
+from .catalog import CATALOG_VERSION
+from .grading import answer_key_version_name
+from .models import Answer, Attempt, Language, Question, Sector, Tip, Topic
+from .progress import CHUNK_SIZE, invalidate_summaries, refresh_rollups, refresh_topic_rollups
+from .versions import bump_version_on_commit
+from . import catalog_stats, search
+
+EXACT_COUNT_LIMIT = 10000
+ORDER_STEP = 10
+
+# Путь от строки к её теме
+TOPIC_PATHS = {
+    Topic: 'pk',
+    Question: 'topic_id',
+    Answer: 'question__topic_id',
+    Tip: 'topic_id',
+}
+# Поле родителя, внутри которого нумеруется order
+ORDER_PARENTS = {
+    Sector: None,
+    Language: 'sector_id',
+    Topic: 'lang_id',
+    Question: 'topic_id',
+    Answer: 'question_id',
+    Tip: 'topic_id',
+}
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по плану запроса; None, если база её не даёт."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без точных COUNT(*) по всей таблице."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class RelatedInputFilter(admin.SimpleListFilter):
+    template = 'admin/bazaznaniy/input_filter.html'
+    field_path = None
+    search_lookup = None
+    placeholder = 'id или название'
+
+    def lookups(self, request, model_admin):
+        # Варианты не выводятся, но без них фильтр не показывается
+        return ((None, None),)
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'query_parts': [
+                (name, value)
+                for name, values in changelist.get_filters_params().items()
+                if name != self.parameter_name
+                for value in (values if isinstance(values, list) else [values])
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return None
+        if value.isdigit():
+            return queryset.filter(**{self.field_path: int(value)})
+        return queryset.filter(**{f'{self.field_path}__{self.search_lookup}': value})
+
+
+def related_filter(field_path, title, search_lookup, placeholder=RelatedInputFilter.placeholder):
+    """Фильтр по связанной строке: число ищется по id, остальное — по search_lookup."""
+    return type(f'{field_path.title().replace("__", "")}Filter', (RelatedInputFilter,), {
+        'title': title,
+        'parameter_name': field_path,
+        'field_path': field_path,
+        'search_lookup': search_lookup,
+        'placeholder': placeholder,
+    })
+
+
+def _topic_ids(queryset):
+    path = TOPIC_PATHS.get(queryset.model)
+    if path is None:
+        return set()
+    return set(queryset.order_by().values_list(path, flat=True).distinct())
+
+
+def content_updated(model, topic_ids):
+    """Сбрасывает кэши после массового UPDATE контента."""
+    if model in (Sector, Language, Topic):
+        bump_version_on_commit(CATALOG_VERSION)
+    else:
+        bump_version_on_commit(CONTENT_VERSION)
+    if model in (Question, Answer):
+        bump_version_on_commit(*(answer_key_version_name(topic_id) for topic_id in topic_ids))
+    if model in (Topic, Question, Tip) and topic_ids:
+        search.reindex_topics(topic_ids)
+    if model in (Topic, Question) and topic_ids:
+        catalog_stats.refresh_topics(topic_ids)
+
+
+def set_active(queryset, is_active):
+    topic_ids = _topic_ids(queryset)
+    with transaction.atomic():
+        updated = queryset.update(is_active=is_active)
+        content_updated(queryset.model, topic_ids)
+        if queryset.model is Topic:
+            # В сводках считаются только активные темы
+            refresh_topic_rollups(topic_ids)
+    return updated
+
+
+def reorder(queryset):
+    """Перенумеровывает order выбранных строк шагом ORDER_STEP внутри родителя.
+
+    Текущий порядок сохраняется (order, затем id), нумерация считается
+    оконной функцией в том же UPDATE.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    pk = qn(model._meta.pk.column)
+    parent = ORDER_PARENTS[model]
+    partition = f'PARTITION BY {qn(parent)} ' if parent else ''
+    selected, params = queryset.order_by().values('pk').query.sql_with_params()
+    topic_ids = _topic_ids(queryset)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET {qn("order")} = numbered.position * {ORDER_STEP} '
+            f'FROM (SELECT {pk} AS row_id, ROW_NUMBER() OVER ({partition}ORDER BY {qn("order")}, {pk}) '
+            f'AS position FROM {table} WHERE {pk} IN ({selected})) AS numbered '
+            f'WHERE {table}.{pk} = numbered.row_id',
+            params,
+        )
+        updated = cursor.rowcount
+    content_updated(model, topic_ids)
+    return updated
+
+
+def recompute_progress(queryset):
+    """Отмечает темы пройденными по текущему порогу TEST_PASS_PERCENTAGE.
+
+    Тема считается пройденной, если проходной балл набран в последней
+    попытке или в любой попытке из журнала Attempt. Уже пройденные темы
+    не сбрасываются: пройденной тема остаётся и при проверке тестов.
+    """
+    percent = settings.TEST_PASS_PERCENTAGE
+    passed_attempt = Attempt.objects.filter(
+        user_id=OuterRef('user_id'), topic_id=OuterRef('topic_id'), total_points__gt=0,
+    ).filter(GreaterThanOrEqual(F('score') * 100, F('total_points') * percent))
+    passed = (
+        Q(max_score__gt=0) & Q(GreaterThanOrEqual(F('score') * 100, F('max_score') * percent))
+        | Q(Exists(passed_attempt))
+    )
+    newly_completed = queryset.filter(passed, is_completed=False)
+    with transaction.atomic():
+        pairs = list(newly_completed.order_by().values_list('user_id', 'topic_id'))
+        newly_completed.update(is_completed=True,
+                               completed_at=Coalesce('completed_at', Value(timezone.now())))
+        for start in range(0, len(pairs), CHUNK_SIZE):
+            refresh_rollups(pairs[start:start + CHUNK_SIZE])
+        catalog_stats.refresh_topics({topic_id for _, topic_id in pairs})
+    invalidate_summaries({user_id for user_id, _ in pairs})
+    return len(pairs)
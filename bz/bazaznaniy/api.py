@@ -0,0 +1,416 @@
+"""JSON API: каталог только для чтения и прогресс личного кабинета.
+
+Каталог (/api/sectors/...). ETag ответа — хэш версий контента, от которых
+он зависит (каталог, ключ ответов темы, общий счётчик контента), и
+полного пути с параметрами, плюс выбранное сжатие. Поэтому ETag сильный
+и известен до сериализации: условный запрос получает 304 без обращения
+к БД, а готовое сжатое тело лежит в кэше под своим ETag. Клиент может
+запросить только нужные поля (?fields=id,slug,name). Правильность
+ответов API не отдаёт никогда, а для текстовых вопросов не отдаёт и
+варианты ответа (это и есть правильные ответы).
+
+Прогресс пользователя отдаётся страницами с keyset-пагинацией по
+(last_attempt_at, id): каждая страница — один запрос с JOIN до темы,
+языка и отрасли по индексу progress_recent_idx, без OFFSET. Курсор —
+непрозрачная строка с позицией последней строки страницы.
+
+Пакет темы для режима без сети (/bundle/) — те же вопросы без
+правильности. Его адрес содержит метку версий (?v=), поэтому браузер и
+service worker хранят его год и не спрашивают сервер повторно.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import zlib
+from datetime import datetime
+from functools import wraps
+from itertools import islice
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .catalog import CATALOG_VERSION, get_catalog
+from .models import Answer, Question, Tip, UserProgress
+from .routers import route_stream
+from .versions import get_version
+
+try:
+    import brotli
+except ImportError:  # сжатие br необязательно, без пакета отдаём gzip
+    brotli = None
+
+# Сдвигается при любом изменении вопросов, ответов и советов (см. signals.py)
+CONTENT_VERSION = 'content'
+API_CACHE_TIMEOUT = 3600
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+MIN_COMPRESS_SIZE = 200
+DUMP_BATCH = 100
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class ProgressItem(NamedTuple):
+    topic_slug: str
+    topic_name: str
+    url: str
+    score: int
+    max_score: int
+    percentage: float
+    attempts: int
+    is_completed: bool
+    last_attempt_at: datetime
+
+
+class ProgressGroup(NamedTuple):
+    sector_slug: str
+    sector_name: str
+    lang_slug: str
+    lang_name: str
+    items: list
+
+
+class ProgressPage(NamedTuple):
+    groups: list
+    next_cursor: str = None
+
+    def as_json(self):
+        return {
+            'groups': [
+                {
+                    'sector': {'slug': group.sector_slug, 'name': group.sector_name},
+                    'language': {'slug': group.lang_slug, 'name': group.lang_name},
+                    'items': [item._asdict() for item in group.items],
+                }
+                for group in self.groups
+            ],
+            'next_cursor': self.next_cursor,
+        }
+
+
+def encode_cursor(last_attempt_at, pk):
+    raw = f'{last_attempt_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Позиция (last_attempt_at, id) из курсора; ValueError, если курсор испорчен."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        when, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(when), int(pk)
+    except (UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise ValueError('Неверный курсор') from exc
+
+
+def progress_page(user_id, cursor=None, limit=PAGE_SIZE):
+    """Страница прогресса пользователя, новые попытки сверху, по группам язык/отрасль."""
+    queryset = UserProgress.objects.filter(user_id=user_id)
+    if cursor:
+        when, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(last_attempt_at__lt=when) | Q(last_attempt_at=when, id__lt=pk))
+    rows = list(
+        queryset.order_by('-last_attempt_at', '-id').values_list(
+            'id', 'score', 'max_score', 'attempts', 'is_completed', 'last_attempt_at',
+            'topic__slug', 'topic__name', 'topic__lang__slug', 'topic__lang__name',
+            'topic__lang__sector__slug', 'topic__lang__sector__name',
+        )[:limit + 1]
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][5], rows[-1][0])
+
+    groups = {}
+    for (pk, score, max_score, attempts, is_completed, last_attempt_at,
+         topic_slug, topic_name, lang_slug, lang_name, sector_slug, sector_name) in rows:
+        group = groups.get((sector_slug, lang_slug))
+        if group is None:
+            group = groups[(sector_slug, lang_slug)] = ProgressGroup(
+                sector_slug, sector_name, lang_slug, lang_name, [])
+        group.items.append(ProgressItem(
+            topic_slug, topic_name,
+            reverse('topic_detail', kwargs={
+                'sector_slug': sector_slug, 'lang_slug': lang_slug, 'topic_slug': topic_slug,
+            }),
+            score, max_score,
+            round(score / max_score * 100, 1) if max_score > 0 else 0,
+            attempts, is_completed, last_attempt_at,
+        ))
+    return ProgressPage(list(groups.values()), next_cursor)
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), cls=DjangoJSONEncoder).encode()
+
+
+def _error(message, status):
+    return HttpResponse(_dumps({'error': message}), status=status,
+                        content_type='application/json; charset=utf-8')
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def negotiate_encoding(request):
+    accepted = _accepted_encodings(request)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _finish(response, etag, encoding, private, immutable=False):
+    response['Content-Type'] = 'application/json; charset=utf-8'
+    response['ETag'] = etag
+    if encoding:
+        response['Content-Encoding'] = encoding
+    scope = {'private': True} if private else {'public': True}
+    if immutable:
+        patch_cache_control(response, max_age=IMMUTABLE_MAX_AGE, immutable=True, **scope)
+    else:
+        patch_cache_control(response, max_age=0, must_revalidate=True, **scope)
+    patch_vary_headers(response, ['Accept-Encoding'] + (['Cookie'] if private else []))
+    return response
+
+
+def _version_state(names):
+    return ':'.join(f'{name}={get_version(name)}' for name in names)
+
+
+def version_tag(names):
+    """Короткая метка текущих версий `names` для параметра ?v= неизменяемых ответов."""
+    return hashlib.md5(_version_state(names).encode()).hexdigest()[:12]
+
+
+def json_api(versions=lambda **kwargs: [CATALOG_VERSION], private=False, stream=False, immutable=False):
+    """Декоратор для представлений каталожного API.
+
+    versions(**kwargs) — имена счётчиков версий, от которых зависит ответ.
+    Представление возвращает данные для JSON, а при stream=True — итератор
+    уже сериализованных байтовых кусков.
+
+    При immutable=True адрес ответа содержит метку версий (?v=, см.
+    version_tag): по актуальной метке ответ кэшируется клиентом на год,
+    по устаревшей или без неё — перенаправление на актуальный адрес.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return _error('Метод не поддерживается', 405)
+            if private and not request.user.is_authenticated:
+                return _error('Требуется авторизация', 401)
+            try:
+                names = versions(**kwargs)
+            except Http404:
+                return _error('Не найдено', 404)
+
+            if immutable:
+                tag = version_tag(names)
+                if request.GET.get('v') != tag:
+                    return HttpResponseRedirect(f'{request.path}?v={tag}')
+
+            encoding = negotiate_encoding(request)
+            state = _version_state(names)
+            digest = hashlib.md5(f'{state}|{request.get_full_path()}'.encode()).hexdigest()[:20]
+            etag = quote_etag(f'{digest}-{encoding}' if encoding else digest)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return _finish(not_modified, etag, None, private, immutable)
+
+            cache_key = f'bz:api:{etag}'
+            if not stream:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    body, used = cached
+                    return _finish(HttpResponse(body), etag, used, private, immutable)
+
+            try:
+                data = view(request, *args, **kwargs)
+            except ApiError as exc:
+                return _error(str(exc), exc.status)
+            except Http404:
+                return _error('Не найдено', 404)
+
+            if stream:
+                data = route_stream(data)
+                chunks = _compress_stream(data, encoding) if encoding else data
+                return _finish(StreamingHttpResponse(chunks), etag, encoding, private, immutable)
+
+            body = _dumps(data)
+            used = encoding if encoding and len(body) >= MIN_COMPRESS_SIZE else None
+            if used:
+                body = _compress(body, used)
+            cache.set(cache_key, (body, used), API_CACHE_TIMEOUT)
+            return _finish(HttpResponse(body), etag, used, private, immutable)
+        return wrapper
+    return decorator
+
+
+def requested_fields(request, allowed):
+    """Поля из ?fields=a,b; без параметра — все разрешённые."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return None
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}. Доступны: {", ".join(allowed)}')
+    return fields
+
+
+def pick(item, fields):
+    if fields is None:
+        return item
+    return {field: item[field] for field in fields}
+
+
+SECTOR_FIELDS = ('id', 'slug', 'name', 'languages')
+LANGUAGE_FIELDS = ('id', 'slug', 'name', 'description', 'sector', 'topics')
+TOPIC_FIELDS = ('id', 'slug', 'name', 'description', 'icon', 'language', 'sector', 'tips')
+QUESTION_FIELDS = ('id', 'code', 'text', 'type', 'points', 'answers')
+
+
+def sector_json(sector):
+    return {
+        'id': sector.id, 'slug': sector.slug, 'name': sector.name,
+        'languages': [{'id': lang.id, 'slug': lang.slug, 'name': lang.name} for lang in sector.languages],
+    }
+
+
+def language_json(lang):
+    return {
+        'id': lang.id, 'slug': lang.slug, 'name': lang.name, 'description': lang.description,
+        'sector': lang.sector_slug,
+        'topics': [{'id': topic.id, 'slug': topic.slug, 'name': topic.name, 'icon': topic.icon}
+                   for topic in lang.topics],
+    }
+
+
+def _tips_by_topic(topic_ids):
+    tips = {}
+    for topic_id, tip_id, title, content, html in (
+            Tip.objects.filter(topic_id__in=topic_ids, is_active=True)
+            .order_by('topic_id', 'order')
+            .values_list('topic_id', 'id', 'title', 'content', 'content_html')):
+        tips.setdefault(topic_id, []).append({'id': tip_id, 'title': title, 'content': content, 'html': html})
+    return tips
+
+
+def topic_json(topic, tips=None):
+    if tips is None:
+        tips = _tips_by_topic([topic.id]).get(topic.id, [])
+    return {
+        'id': topic.id, 'slug': topic.slug, 'name': topic.name, 'description': topic.description,
+        'icon': topic.icon, 'language': topic.lang_slug, 'sector': topic.sector_slug, 'tips': tips,
+    }
+
+
+def _questions_by_topic(topic_ids):
+    """Вопросы тем без признака правильности; у текстовых вопросов нет вариантов."""
+    answers = {}
+    for question_id, answer_id, text in (
+            Answer.objects.filter(question__topic_id__in=topic_ids, question__is_active=True)
+            .exclude(question__question_type='text')
+            .order_by('order', 'id').values_list('question_id', 'id', 'text')):
+        answers.setdefault(question_id, []).append({'id': answer_id, 'text': text})
+    questions = {}
+    for topic_id, question_id, code, text, question_type, points in (
+            Question.objects.filter(topic_id__in=topic_ids, is_active=True)
+            .order_by('order', 'id')
+            .values_list('topic_id', 'id', 'code', 'text', 'question_type', 'points')):
+        questions.setdefault(topic_id, []).append({
+            'id': question_id, 'code': code, 'text': text, 'type': question_type, 'points': points,
+            'answers': answers.get(question_id, []),
+        })
+    return questions
+
+
+def topic_questions(topic_id):
+    return _questions_by_topic([topic_id]).get(topic_id, [])
+
+
+def topic_bundle(topic, draw_size):
+    """Всё для прохождения теста темы без сети: вопросы пула без правильности."""
+    return {
+        'topic': {'id': topic.id, 'slug': topic.slug, 'name': topic.name,
+                  'language': topic.lang_slug, 'sector': topic.sector_slug},
+        'draw_size': draw_size,
+        'questions': topic_questions(topic.id),
+    }
+
+
+def dump_topics(topics):
+    """Потоковая выгрузка тем с советами и вопросами: JSON-массив кусками по DUMP_BATCH тем."""
+    yield b'['
+    first = True
+    topics = iter(topics)
+    while True:
+        batch = list(islice(topics, DUMP_BATCH))
+        if not batch:
+            break
+        topic_ids = [topic.id for topic in batch]
+        tips = _tips_by_topic(topic_ids)
+        questions = _questions_by_topic(topic_ids)
+        for topic in batch:
+            item = topic_json(topic, tips.get(topic.id, []))
+            item['questions'] = questions.get(topic.id, [])
+            yield (b'' if first else b',') + _dumps(item)
+            first = False
+    yield b']'
+
+
+def catalog_topics(sector_slug=None, lang_slug=None):
+    """Активные темы каталога, при необходимости — только одной отрасли или языка."""
+    for sector in get_catalog().sectors:
+        if sector_slug and sector.slug != sector_slug:
+            continue
+        for lang in sector.languages:
+            if lang_slug and lang.slug != lang_slug:
+                continue
+            yield from lang.topics
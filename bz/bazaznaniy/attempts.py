@@ -0,0 +1,135 @@
+"""Журнал попыток и накопительная статистика по вопросам.
+
+Каждая проверенная попытка добавляет одну строку Attempt. Ответы
+упакованы в байты: последовательность uint32 (little-endian)
+
+    question_id, (число_ответов << 1) | верно, answer_id, answer_id, ...
+
+Для текстовых вопросов сохраняется только признак «верно».
+
+Вместе с журналом одним INSERT ... ON CONFLICT DO UPDATE прибавляются
+счётчики QuestionStats, поэтому на пике экзамена запись пачки попыток —
+это один bulk_create и один executemany, а трудность и дискриминативность
+вопросов читаются из готовых счётчиков.
+"""
+import struct
+from typing import NamedTuple
+
+from django.db import connection, transaction
+
+from .models import Attempt, QuestionStats
+
+CHUNK_SIZE = 2000
+
+
+class AnswerRecord(NamedTuple):
+    """Ответ на один вопрос попытки."""
+    question_id: int
+    is_correct: bool
+    answer_ids: tuple
+
+
+def pack_answers(records):
+    values = []
+    for record in records:
+        values.append(record.question_id)
+        values.append(len(record.answer_ids) << 1 | bool(record.is_correct))
+        values.extend(record.answer_ids)
+    return struct.pack(f'<{len(values)}I', *values)
+
+
+def unpack_answers(data):
+    data = bytes(data)
+    values = struct.unpack(f'<{len(data) // 4}I', data)
+    records = []
+    position = 0
+    while position < len(values):
+        question_id, header = values[position], values[position + 1]
+        count = header >> 1
+        records.append(AnswerRecord(question_id, bool(header & 1),
+                                    values[position + 2:position + 2 + count]))
+        position += 2 + count
+    return records
+
+
+def _counter_rows(attempts):
+    """Сводит ответы пачки попыток в прибавки к счётчикам по вопросам."""
+    counters = {}
+    for records, share in attempts:
+        for record in records:
+            row = counters.setdefault(record.question_id, [0, 0, 0.0, 0.0, 0.0])
+            row[0] += 1
+            row[2] += share
+            row[3] += share * share
+            if record.is_correct:
+                row[1] += 1
+                row[4] += share
+    # Порядок по id — чтобы параллельные обработчики брали блокировки одинаково
+    return [(question_id, *row) for question_id, row in sorted(counters.items())]
+
+
+def add_question_stats(rows):
+    """Прибавляет счётчики одним upsert'ом: строки (question_id, attempts, correct, ...)."""
+    if not rows:
+        return
+    table = connection.ops.quote_name(QuestionStats._meta.db_table)
+    columns = ['attempts', 'correct', 'score_sum', 'score_sq_sum', 'correct_score_sum']
+    updates = ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in columns)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (question_id, {", ".join(columns)}) '
+            f'VALUES (%s, %s, %s, %s, %s, %s) '
+            f'ON CONFLICT (question_id) DO UPDATE SET {updates}',
+            rows,
+        )
+
+
+def log_attempts(entries):
+    """Пишет попытки в журнал и обновляет счётчики вопросов.
+
+    entries — пары (Attempt без answers, список AnswerRecord).
+    """
+    attempts = []
+    shares = []
+    for attempt, records in entries:
+        attempt.answers = pack_answers(records)
+        attempts.append(attempt)
+        share = attempt.score / attempt.total_points if attempt.total_points > 0 else 0.0
+        shares.append((records, share))
+    with transaction.atomic():
+        Attempt.objects.bulk_create(attempts)
+        add_question_stats(_counter_rows(shares))
+
+
+def rebuild_question_stats():
+    """Пересчитывает все счётчики по журналу — для восстановления после ручных правок."""
+    with transaction.atomic():
+        QuestionStats.objects.all().delete()
+        batch = []
+        rows = Attempt.objects.order_by('pk').values_list('score', 'total_points', 'answers')
+        for score, total_points, answers in rows.iterator(chunk_size=CHUNK_SIZE):
+            share = score / total_points if total_points > 0 else 0.0
+            batch.append((unpack_answers(answers), share))
+            if len(batch) >= CHUNK_SIZE:
+                add_question_stats(_counter_rows(batch))
+                batch = []
+        add_question_stats(_counter_rows(batch))
+    return QuestionStats.objects.count()
+
+
+def topic_question_stats(topic_id):
+    """Статистика вопросов темы, от самых трудных к самым лёгким."""
+    stats = list(
+        QuestionStats.objects.filter(question__topic_id=topic_id)
+        .select_related('question')
+    )
+    stats.sort(key=lambda row: (row.difficulty is None, row.difficulty or 0))
+    return stats
+
+
+def user_attempts(user, topic_id=None):
+    """История попыток пользователя, новые сверху."""
+    queryset = Attempt.objects.filter(user=user).defer('answers')
+    if topic_id is not None:
+        queryset = queryset.filter(topic_id=topic_id)
+    return queryset.order_by('-created_at')
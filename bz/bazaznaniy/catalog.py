@@ -0,0 +1,164 @@
+"""Дерево каталога Отрасль → Язык → Тема.
+
+Всё активное дерево загружается тремя запросами и хранится как набор
+неизменяемых кортежей: в памяти процесса и в общем кэше Django. Версия
+дерева сдвигается сигналами при изменении Sector/Language/Topic
+(см. signals.py), после чего каждый процесс перестраивает свою копию.
+"""
+import threading
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.http import Http404
+
+from .models import Language, Sector, Topic
+from .versions import get_version
+
+CATALOG_VERSION = 'catalog'
+
+
+class TopicNode(NamedTuple):
+    id: int
+    slug: str
+    name: str
+    description: str
+    icon: str
+    lang_id: int
+    lang_slug: str
+    lang_name: str
+    sector_id: int
+    sector_slug: str
+    sector_name: str
+
+    def __str__(self):
+        return f"{self.name} ({self.lang_name})"
+
+
+class LanguageNode(NamedTuple):
+    id: int
+    slug: str
+    name: str
+    description: str
+    sector_id: int
+    sector_slug: str
+    sector_name: str
+    topics: tuple
+
+    def __str__(self):
+        return self.name
+
+
+class SectorNode(NamedTuple):
+    id: int
+    slug: str
+    name: str
+    languages: tuple
+
+    def __str__(self):
+        return self.name
+
+
+class Catalog:
+    """Дерево каталога с индексами по пути из slug'ов и по id темы."""
+
+    def __init__(self, version, sectors):
+        self.version = version
+        self.sectors = sectors
+        self._by_path = {}
+        self._topics_by_id = {}
+        for sector in sectors:
+            self._by_path[(sector.slug,)] = sector
+            for lang in sector.languages:
+                self._by_path[(sector.slug, lang.slug)] = lang
+                for topic in lang.topics:
+                    self._by_path[(sector.slug, lang.slug, topic.slug)] = topic
+                    self._topics_by_id[topic.id] = topic
+
+    def sector(self, slug):
+        return self._by_path.get((slug,))
+
+    def language(self, sector_slug, lang_slug):
+        return self._by_path.get((sector_slug, lang_slug))
+
+    def topic(self, sector_slug, lang_slug, topic_slug):
+        return self._by_path.get((sector_slug, lang_slug, topic_slug))
+
+    def topic_by_id(self, topic_id):
+        return self._topics_by_id.get(topic_id)
+
+
+_local_catalog = None
+_local_lock = threading.Lock()
+
+
+def build_tree():
+    """Загружает активное дерево тремя запросами (с основной базы, см. routers.py)."""
+    sectors = list(
+        Sector.objects.using('default').filter(is_active=True)
+        .order_by('order', 'name')
+        .values_list('id', 'slug', 'name')
+    )
+    languages = list(
+        Language.objects.using('default').filter(is_active=True, sector__is_active=True)
+        .order_by('order', 'name')
+        .values_list('id', 'slug', 'name', 'description', 'sector_id')
+    )
+    topics = list(
+        Topic.objects.using('default')
+        .filter(is_active=True, lang__is_active=True, lang__sector__is_active=True)
+        .order_by('order', 'name')
+        .values_list('id', 'slug', 'name', 'description', 'icon', 'lang_id')
+    )
+
+    sector_info = {sector_id: (slug, name) for sector_id, slug, name in sectors}
+    lang_info = {
+        lang_id: (slug, name, sector_id)
+        for lang_id, slug, name, description, sector_id in languages
+    }
+
+    topics_by_lang = {}
+    for topic_id, slug, name, description, icon, lang_id in topics:
+        lang_slug, lang_name, sector_id = lang_info[lang_id]
+        sector_slug, sector_name = sector_info[sector_id]
+        topics_by_lang.setdefault(lang_id, []).append(TopicNode(
+            topic_id, slug, name, description, icon,
+            lang_id, lang_slug, lang_name, sector_id, sector_slug, sector_name,
+        ))
+
+    languages_by_sector = {}
+    for lang_id, slug, name, description, sector_id in languages:
+        sector_slug, sector_name = sector_info[sector_id]
+        languages_by_sector.setdefault(sector_id, []).append(LanguageNode(
+            lang_id, slug, name, description, sector_id, sector_slug, sector_name,
+            tuple(topics_by_lang.get(lang_id, ())),
+        ))
+
+    return tuple(
+        SectorNode(sector_id, slug, name, tuple(languages_by_sector.get(sector_id, ())))
+        for sector_id, slug, name in sectors
+    )
+
+
+def get_catalog():
+    """Актуальное дерево каталога: из памяти процесса, из кэша или из БД."""
+    global _local_catalog
+    version = get_version(CATALOG_VERSION)
+    catalog = _local_catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    cache_key = f'bz:catalog:{version}'
+    sectors = cache.get(cache_key)
+    if sectors is None:
+        sectors = build_tree()
+        cache.set(cache_key, sectors, timeout=None)
+    catalog = Catalog(version, sectors)
+    with _local_lock:
+        _local_catalog = catalog
+    return catalog
+
+
+def get_or_404(node):
+    if node is None:
+        raise Http404('Раздел не найден')
+    return node
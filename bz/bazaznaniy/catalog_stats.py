@@ -0,0 +1,214 @@
+"""Готовая статистика тем и языков для страниц каталога.
+
+TopicStats и LanguageStats хранят число вопросов, сумму баллов и счётчики
+результатов, поэтому список тем языка и список языков отрасли читают
+готовые строки по первичному ключу без агрегатов по Question и
+UserProgress.
+
+Строки поддерживаются так:
+- при проверке тестов (grading.save_results) счётчики результатов
+  прибавляются одним INSERT ... ON CONFLICT DO UPDATE на тему и язык —
+  как счётчики QuestionStats в attempts.py;
+- правки вопросов, тем и прогресса из админки, импорт и массовые действия
+  пересчитывают строки затронутых тем целиком (refresh_topics);
+- `manage.py rebuild_stats` пересчитывает всё.
+
+Пересчёт строк (число тем, вопросов и баллов) сдвигает версию
+STATS_VERSION после коммита: она входит в ключ и ETag кэшированных
+страниц со статистикой (page_cache.py) и в ключ фрагмента списка тем.
+Счётчики результатов версию не сдвигают — иначе каждая проверенная
+попытка сбрасывала бы страницы всех отраслей и языков. Страницы с ними
+устаревают раз в RESULTS_TTL секунд (results_epoch()).
+
+Сигналы копят затронутые темы до коммита транзакции и пересчитывают их
+одним вызовом (refresh_on_commit), а не по разу на каждую сохранённую
+строку.
+
+Пересчёт и чтение статистики для кэшируемых страниц идут с основной
+базы: строки с реплики могли бы отставать.
+"""
+import time
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from .catalog import get_catalog
+from .models import Language, LanguageStats, Question, Topic, TopicStats, UserProgress
+from .versions import bump_version_on_commit
+
+STATS_VERSION = 'catalog_stats'
+RESULTS_TTL = 60
+
+CONTENT_FIELDS = ['question_count', 'max_score']
+RESULT_FIELDS = ['results', 'completed', 'percentage_sum']
+
+
+def percentage(score, max_score):
+    return score / max_score * 100 if max_score > 0 else 0.0
+
+
+def results_epoch():
+    """Номер текущего интервала RESULTS_TTL: входит в ключи кэша со счётчиками результатов."""
+    return int(time.time()) // RESULTS_TTL
+
+
+def _percentage_expression():
+    return Case(
+        When(max_score__gt=0, then=Cast('score', FloatField()) * 100 / F('max_score')),
+        default=Value(0.0), output_field=FloatField(),
+    )
+
+
+def refresh_languages(lang_ids):
+    """Пересчитывает LanguageStats по строкам TopicStats активных тем."""
+    lang_ids = set(Language.objects.using('default').filter(pk__in=set(lang_ids)).values_list('pk', flat=True))
+    if not lang_ids:
+        return
+    summed = CONTENT_FIELDS + RESULT_FIELDS
+    totals = {
+        row[0]: row[1:]
+        for row in TopicStats.objects.using('default')
+        .filter(topic__lang_id__in=lang_ids, topic__is_active=True)
+        .order_by().values('topic__lang_id')
+        .annotate(topic_total=Count('pk'), **{f'{field}_total': Sum(field) for field in summed})
+        .values_list('topic__lang_id', 'topic_total', *[f'{field}_total' for field in summed])
+    }
+    fields = ['topic_count', *summed]
+    empty = [0] * len(fields)
+    LanguageStats.objects.bulk_create(
+        [
+            LanguageStats(language_id=lang_id, **dict(zip(fields, totals.get(lang_id, empty))))
+            for lang_id in sorted(lang_ids)
+        ],
+        update_conflicts=True, unique_fields=['language'], update_fields=fields,
+    )
+    bump_version_on_commit(STATS_VERSION)
+
+
+def refresh_topics(topic_ids):
+    """Пересчитывает TopicStats тем целиком, затем LanguageStats их языков."""
+    topics = dict(Topic.objects.using('default').filter(pk__in=set(topic_ids)).values_list('pk', 'lang_id'))
+    if not topics:
+        return
+    content = {
+        row['topic_id']: row
+        for row in Question.objects.using('default').filter(topic_id__in=topics, is_active=True)
+        .order_by().values('topic_id')
+        .annotate(question_count=Count('pk'), max_score=Coalesce(Sum('points'), 0))
+    }
+    results = {
+        row['topic_id']: row
+        for row in UserProgress.objects.using('default').filter(topic_id__in=topics)
+        .order_by().values('topic_id')
+        .annotate(
+            results=Count('pk'),
+            completed=Count('pk', filter=Q(is_completed=True)),
+            percentage_sum=Coalesce(Sum(_percentage_expression()), 0.0),
+        )
+    }
+    fields = CONTENT_FIELDS + RESULT_FIELDS
+    with transaction.atomic():
+        TopicStats.objects.bulk_create(
+            [
+                TopicStats(topic_id=topic_id, **{
+                    field: {**content.get(topic_id, {}), **results.get(topic_id, {})}.get(field, 0)
+                    for field in fields
+                })
+                for topic_id in sorted(topics)
+            ],
+            update_conflicts=True, unique_fields=['topic'], update_fields=fields,
+        )
+        refresh_languages(topics.values())
+
+
+def _add(model, key, zero_fields, rows):
+    if not rows:
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = [key, *zero_fields, *RESULT_FIELDS]
+    updates = ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in RESULT_FIELDS)
+    # Порядок по id — чтобы параллельные обработчики брали блокировки одинаково
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} ({", ".join(columns)}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))}) '
+            f'ON CONFLICT ({key}) DO UPDATE SET {updates}',
+            [(row_id, *[0] * len(zero_fields), *counters) for row_id, counters in sorted(rows.items())],
+        )
+
+
+def add_results(changes):
+    """Прибавляет изменения результатов к счётчикам тем и языков.
+
+    changes — пары (прежняя строка UserProgress или None, новая строка);
+    у прежней строки нужны score, max_score и is_completed.
+    """
+    catalog = get_catalog()
+    topics = {}
+    languages = {}
+    for previous, row in changes:
+        delta = [
+            0 if previous else 1,
+            int(row.is_completed) - int(bool(previous and previous.is_completed)),
+            percentage(row.score, row.max_score)
+            - (percentage(previous.score, previous.max_score) if previous else 0.0),
+        ]
+        targets = [topics.setdefault(row.topic_id, [0, 0, 0.0])]
+        node = catalog.topic_by_id(row.topic_id)
+        if node is not None:
+            targets.append(languages.setdefault(node.lang_id, [0, 0, 0.0]))
+        for counters in targets:
+            for index, value in enumerate(delta):
+                counters[index] += value
+    _add(TopicStats, 'topic_id', CONTENT_FIELDS, topics)
+    _add(LanguageStats, 'language_id', ['topic_count', *CONTENT_FIELDS], languages)
+
+
+class _PendingRefresh:
+    """Темы и языки, которые пересчитаются после коммита транзакции."""
+
+    def __init__(self):
+        self.topic_ids = set()
+        self.lang_ids = set()
+
+    def __call__(self):
+        refresh_topics(self.topic_ids)
+        if self.lang_ids:
+            refresh_languages(self.lang_ids)
+
+
+def refresh_on_commit(topic_ids=(), lang_ids=()):
+    """Пересчитывает темы и языки после коммита — один раз на транзакцию."""
+    connection = transaction.get_connection()
+    pending = getattr(connection, 'bz_pending_stats', None)
+    # После коммита или отката (в том числе точки сохранения, где его
+    # зарегистрировали) прежнего обработчика в run_on_commit уже нет
+    new = pending is None or not any(entry[1] is pending for entry in connection.run_on_commit)
+    if new:
+        pending = connection.bz_pending_stats = _PendingRefresh()
+    pending.topic_ids.update(topic_ids)
+    pending.lang_ids.update(lang_ids)
+    if new:
+        # Вне транзакции выполняется сразу
+        transaction.on_commit(pending)
+
+
+def rebuild():
+    """Пересчитывает статистику всех тем и языков."""
+    with transaction.atomic():
+        TopicStats.objects.all().delete()
+        LanguageStats.objects.all().delete()
+        refresh_topics(Topic.objects.values_list('pk', flat=True))
+        refresh_languages(Language.objects.values_list('pk', flat=True))
+    return TopicStats.objects.count(), LanguageStats.objects.count()
+
+
+def topic_stats(topic_ids):
+    """{topic_id: TopicStats} — один запрос по первичному ключу."""
+    return TopicStats.objects.using('default').in_bulk(list(topic_ids))
+
+
+def language_stats(lang_ids):
+    """{language_id: LanguageStats} — один запрос по первичному ключу."""
+    return LanguageStats.objects.using('default').in_bulk(list(lang_ids))
@@ -0,0 +1,348 @@
+"""Импорт и экспорт курсов: Отрасль → Язык → Тема → Вопросы/Ответы и Советы.
+
+Файл курса — поток документов, по одному на тему: строки JSON (JSONL)
+или документы YAML, разделённые `---`. Документ выглядит так:
+
+    {"sector": {"slug": "prog", "name": "Программирование", "order": 0},
+     "language": {"slug": "python", "name": "Python", "description": "", "order": 0},
+     "topic": {"slug": "basics", "name": "Основы", "description": "", "icon": "", "order": 0},
+     "questions": [{"code": "q1", "text": "2 + 2?", "type": "single", "points": 1, "order": 0,
+                    "answers": [{"text": "4", "correct": true}, {"text": "5"}]}],
+     "tips": [{"title": "Совет", "content": "Текст", "order": 0}]}
+
+Файл читается потоково, документы собираются в пачки, и каждая пачка
+записывается в одной транзакции: отрасли, языки, темы и вопросы —
+bulk_create(update_conflicts=True) по slug'ам (для вопросов — по коду
+в теме). Ответы и советы сверяются со строками в базе по вопросу (теме) и
+порядку: неизменные строки не трогаются и сохраняют id, изменённые
+обновляются, а удаляются только пропавшие из файла.
+"""
+import json
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import catalog_stats, search
+from .api import CONTENT_VERSION
+from .catalog import CATALOG_VERSION
+from .grading import answer_key_version_name
+from .models import Answer, Language, Question, Sector, Tip, Topic
+from .progress import refresh_topic_rollups
+from .versions import bump_version_on_commit
+
+EXPORT_BATCH = 200
+QUESTION_TYPES = {choice for choice, _ in Question.QUESTION_TYPES}
+
+
+class ContentError(ValueError):
+    """Ошибка в файле курса."""
+
+
+def read_documents(stream, fmt):
+    """Лениво читает документы курса из открытого файла."""
+    if fmt == 'yaml':
+        import yaml
+        try:
+            for document in yaml.safe_load_all(stream):
+                if document:
+                    yield document
+        except yaml.YAMLError as exc:
+            raise ContentError(f'Ошибка YAML: {exc}')
+        return
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise ContentError(f'Строка {line_no}: {exc}')
+
+
+def write_documents(documents, stream, fmt):
+    for document in documents:
+        if fmt == 'yaml':
+            import yaml
+            stream.write('---\n')
+            yaml.safe_dump(document, stream, allow_unicode=True, sort_keys=False)
+        else:
+            stream.write(json.dumps(document, ensure_ascii=False))
+            stream.write('\n')
+
+
+def _required(mapping, key, where):
+    value = mapping.get(key) if isinstance(mapping, dict) else None
+    if value in (None, ''):
+        raise ContentError(f'{where}: нет поля "{key}"')
+    return value
+
+
+def _diff(stats, name, existing, rows, fields):
+    """Считает, сколько строк будет создано, изменено и осталось как есть."""
+    for key, values in rows.items():
+        current = existing.get(key)
+        if current is None:
+            stats[f'{name}: создано'] += 1
+        elif any(current[field] != values[field] for field in fields):
+            stats[f'{name}: изменено'] += 1
+        else:
+            stats[f'{name}: без изменений'] += 1
+
+
+def _upsert(model, rows, unique_fields, update_fields, stats, name):
+    """Upsert строк `rows` ({ключ: поля}) и возврат {ключ: id}."""
+    lookup = {}
+    for field_index, field in enumerate(unique_fields):
+        lookup[f'{field}__in'] = {key[field_index] for key in rows}
+    existing = {
+        tuple(row[field] for field in unique_fields): row
+        for row in model.objects.filter(**lookup).values('id', *unique_fields, *update_fields)
+    }
+    _diff(stats, name, existing, rows, update_fields)
+    model.objects.bulk_create(
+        [model(**values) for values in rows.values()],
+        update_conflicts=True, unique_fields=unique_fields, update_fields=update_fields,
+    )
+    ids = {
+        tuple(row[field] for field in unique_fields): row['id']
+        for row in model.objects.filter(**lookup).values('id', *unique_fields)
+    }
+    return ids
+
+
+def _raw_delete(queryset):
+    return queryset._raw_delete(queryset.db)
+
+
+def _by_order(items):
+    """{(родитель, порядок, номер среди строк с таким порядком): строка}."""
+    seen = Counter()
+    keyed = {}
+    for parent_id, order, item in items:
+        keyed[(parent_id, order, seen[parent_id, order])] = item
+        seen[parent_id, order] += 1
+    return keyed
+
+
+def _sync_children(model, parent_field, rows, fields, stats, name, prepare=None):
+    """Приводит ответы или советы родителей из `rows` к содержимому файла.
+
+    rows — {id родителя: [поля строк]}. Строки сопоставляются по родителю и
+    порядку, поэтому у неизменённых строк сохраняются id. `prepare`
+    вызывается для создаваемых и изменённых объектов перед записью.
+    """
+    existing = _by_order(
+        (getattr(obj, parent_field), obj.order, obj)
+        for obj in model.objects.filter(**{f'{parent_field}__in': rows}).order_by(parent_field, 'order', 'id')
+    )
+    incoming = _by_order(
+        (parent_id, values['order'], values)
+        for parent_id, items in rows.items()
+        for values in sorted(items, key=lambda values: values['order'])
+    )
+    created, changed = [], []
+    for key, values in incoming.items():
+        obj = existing.get(key)
+        if obj is None:
+            created.append(model(**values))
+        elif any(getattr(obj, field) != values[field] for field in fields):
+            for field in fields:
+                setattr(obj, field, values[field])
+            changed.append(obj)
+    missing = [obj.pk for key, obj in existing.items() if key not in incoming]
+
+    update_fields = list(fields)
+    if prepare is not None:
+        for obj in created + changed:
+            update_fields = prepare(obj, fields)
+    # Без сигналов: версии ключей ответов и поисковый индекс обновляются
+    # один раз в import_documents()
+    if missing:
+        _raw_delete(model.objects.filter(pk__in=missing))
+    model.objects.bulk_create(created)
+    model.objects.bulk_update(changed, update_fields)
+    stats[f'{name}: создано'] += len(created)
+    stats[f'{name}: изменено'] += len(changed)
+    stats[f'{name}: удалено'] += len(missing)
+    stats[f'{name}: без изменений'] += len(existing) - len(changed) - len(missing)
+
+
+def _prepare_tip(tip, fields):
+    tip.render_content()
+    tip.updated_at = timezone.now()
+    return [*fields, 'content_html', 'content_hash', 'updated_at']
+
+
+def _import_chunk(documents, stats):
+    sectors, languages, topics = {}, {}, {}
+    for number, document in documents:
+        where = f'Документ {number}'
+        sector = _required(document, 'sector', where)
+        language = _required(document, 'language', where)
+        topic = _required(document, 'topic', where)
+        sector_slug = _required(sector, 'slug', where)
+        lang_key = (sector_slug, _required(language, 'slug', where))
+        topic_key = (*lang_key, _required(topic, 'slug', where))
+        sectors[sector_slug] = {
+            'slug': sector_slug, 'name': _required(sector, 'name', where),
+            'order': sector.get('order', 0), 'is_active': sector.get('is_active', True),
+        }
+        languages[lang_key] = {
+            'slug': lang_key[1], 'name': _required(language, 'name', where),
+            'description': language.get('description', ''),
+            'order': language.get('order', 0), 'is_active': language.get('is_active', True),
+        }
+        topics[topic_key] = (document, {
+            'slug': topic_key[2], 'name': _required(topic, 'name', where),
+            'description': topic.get('description', ''), 'icon': topic.get('icon', ''),
+            'order': topic.get('order', 0), 'questions_per_test': topic.get('questions_per_test', 0),
+            'is_active': topic.get('is_active', True),
+        })
+
+    sector_ids = _upsert(Sector, {(slug,): values for slug, values in sectors.items()},
+                         ['slug'], ['name', 'order', 'is_active'], stats, 'Отрасли')
+    lang_rows = {}
+    for (sector_slug, slug), values in languages.items():
+        sector_id = sector_ids[(sector_slug,)]
+        lang_rows[(sector_id, slug)] = {**values, 'sector_id': sector_id}
+    lang_ids = _upsert(Language, lang_rows, ['sector_id', 'slug'],
+                       ['name', 'description', 'order', 'is_active'], stats, 'Языки')
+
+    topic_rows = {}
+    documents_by_topic = {}
+    for (sector_slug, lang_slug, slug), (document, values) in topics.items():
+        lang_id = lang_ids[(sector_ids[(sector_slug,)], lang_slug)]
+        topic_rows[(lang_id, slug)] = {**values, 'lang_id': lang_id}
+        documents_by_topic[(lang_id, slug)] = document
+    was_active = {
+        (lang_id, slug): is_active
+        for lang_id, slug, is_active in Topic.objects.filter(
+            lang_id__in={lang_id for lang_id, _ in topic_rows}, slug__in={slug for _, slug in topic_rows},
+        ).values_list('lang_id', 'slug', 'is_active')
+    }
+    topic_ids = _upsert(Topic, topic_rows, ['lang_id', 'slug'],
+                        ['name', 'description', 'icon', 'order', 'questions_per_test', 'is_active'],
+                        stats, 'Темы')
+
+    question_rows = {}
+    answers_by_question = {}
+    tips = {topic_id: [] for topic_id in topic_ids.values()}
+    for key, document in documents_by_topic.items():
+        topic_id = topic_ids[key]
+        for index, question in enumerate(document.get('questions') or []):
+            where = f'Тема {key[1]}, вопрос {index + 1}'
+            code = str(_required(question, 'code', where))
+            question_type = question.get('type', 'single')
+            if question_type not in QUESTION_TYPES:
+                raise ContentError(f'{where}: неизвестный тип "{question_type}"')
+            question_rows[(topic_id, code)] = {
+                'topic_id': topic_id, 'code': code, 'text': _required(question, 'text', where),
+                'question_type': question_type, 'points': question.get('points', 1),
+                'order': question.get('order', index), 'is_active': question.get('is_active', True),
+            }
+            answers_by_question[(topic_id, code)] = question.get('answers') or []
+        for index, tip in enumerate(document.get('tips') or []):
+            where = f'Тема {key[1]}, совет {index + 1}'
+            tips[topic_id].append({
+                'topic_id': topic_id, 'title': _required(tip, 'title', where),
+                'content': _required(tip, 'content', where),
+                'order': tip.get('order', index), 'is_active': tip.get('is_active', True),
+            })
+
+    question_ids = {}
+    if question_rows:
+        question_ids = _upsert(Question, question_rows, ['topic_id', 'code'],
+                               ['text', 'question_type', 'points', 'order', 'is_active'],
+                               stats, 'Вопросы')
+
+    answers = {
+        question_ids[key]: [
+            {'question_id': question_ids[key],
+             'text': str(_required(answer, 'text', f'Вопрос {key[1]}')),
+             'is_correct': bool(answer.get('correct', False)), 'order': answer.get('order', index)}
+            for index, answer in enumerate(items)
+        ]
+        for key, items in answers_by_question.items()
+    }
+    _sync_children(Answer, 'question_id', answers, ['text', 'is_correct'], stats, 'Ответы')
+    _sync_children(Tip, 'topic_id', tips, ['title', 'content', 'is_active'], stats, 'Советы',
+                   prepare=_prepare_tip)
+    toggled = {
+        topic_ids[key] for key, values in topic_rows.items()
+        if key in was_active and was_active[key] != values['is_active']
+    }
+    return set(topic_ids.values()), toggled
+
+
+def import_documents(documents, chunk_size=200, dry_run=False):
+    """Импортирует поток документов пачками по `chunk_size` тем.
+
+    Возвращает Counter с числом созданных/изменённых/неизменённых строк.
+    При dry_run каждая пачка откатывается, а счётчики показывают разницу
+    с текущим содержимым базы.
+    """
+    stats = Counter()
+    numbered = enumerate(documents, 1)
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            break
+        with transaction.atomic():
+            touched, toggled = _import_chunk(chunk, stats)
+            if dry_run:
+                transaction.set_rollback(True)
+            elif touched:
+                # bulk_create не вызывает сигналы: сбрасываем кэши и индекс поиска сами,
+                # в транзакции пачки — ошибка в следующей пачке не оставит их устаревшими
+                bump_version_on_commit(CATALOG_VERSION, CONTENT_VERSION,
+                                       *(answer_key_version_name(topic_id) for topic_id in touched))
+                search.reindex_topics(touched)
+                catalog_stats.refresh_topics(touched)
+                # Скрытая или снова открытая тема меняет сводки всех, кто её прошёл
+                refresh_topic_rollups(toggled)
+        stats['Документов'] += len(chunk)
+    return stats
+
+
+def export_documents(topics=None):
+    """Лениво отдаёт документы курса по темам, пачками по EXPORT_BATCH тем."""
+    topics = (topics if topics is not None else Topic.objects.all())
+    topics = topics.select_related('lang__sector').order_by('lang__sector__order', 'lang__sector__slug',
+                                                            'lang__order', 'lang__slug', 'order', 'slug')
+    iterator = topics.iterator(chunk_size=EXPORT_BATCH)
+    while True:
+        batch = list(islice(iterator, EXPORT_BATCH))
+        if not batch:
+            return
+        topic_ids = [topic.id for topic in batch]
+        answers = {}
+        for answer in Answer.objects.filter(question__topic_id__in=topic_ids).order_by('order', 'id'):
+            answers.setdefault(answer.question_id, []).append(
+                {'text': answer.text, 'correct': answer.is_correct, 'order': answer.order})
+        questions = {}
+        for question in Question.objects.filter(topic_id__in=topic_ids).order_by('order', 'id'):
+            questions.setdefault(question.topic_id, []).append({
+                'code': question.code, 'text': question.text, 'type': question.question_type,
+                'points': question.points, 'order': question.order, 'is_active': question.is_active,
+                'answers': answers.get(question.id, []),
+            })
+        tips = {}
+        for tip in Tip.objects.filter(topic_id__in=topic_ids).order_by('order', 'id'):
+            tips.setdefault(tip.topic_id, []).append({
+                'title': tip.title, 'content': tip.content, 'order': tip.order, 'is_active': tip.is_active,
+            })
+        for topic in batch:
+            lang = topic.lang
+            sector = lang.sector
+            yield {
+                'sector': {'slug': sector.slug, 'name': sector.name, 'order': sector.order,
+                           'is_active': sector.is_active},
+                'language': {'slug': lang.slug, 'name': lang.name, 'description': lang.description,
+                             'order': lang.order, 'is_active': lang.is_active},
+                'topic': {'slug': topic.slug, 'name': topic.name, 'description': topic.description,
+                          'icon': topic.icon, 'order': topic.order,
+                          'questions_per_test': topic.questions_per_test, 'is_active': topic.is_active},
+                'questions': questions.get(topic.id, []),
+                'tips': tips.get(topic.id, []),
+            }
@@ -0,0 +1,333 @@
+"""Проверка тестов по заранее собранному ключу ответов.
+
+Ключ темы строится одним запросом, хранится в памяти процесса и в кэше
+Django и сбрасывается сигналами при изменении вопросов и ответов
+(см. signals.py). Сама проверка работает только с ключом и не ходит в БД.
+
+Если у темы задан questions_per_test, каждая попытка получает свой
+вариант: N вопросов, выбранных из ключа генератором с зерном попытки.
+Зерно и id выданных вопросов подписываются в самой форме (см.
+offline.sign_variant), и при проверке вариант собирается из ключа по этим
+id. Если вопроса из варианта в ключе уже нет (удалён или скрыт), вариант
+устарел: попытка отклоняется (StaleVariant), а не проверяется по другому
+набору вопросов.
+
+grade_submissions() проверяет пачку отправленных тестов и записывает
+результаты в UserProgress одним upsert-запросом.
+"""
+import random
+import secrets
+import threading
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .attempts import AnswerRecord, log_attempts
+from .catalog_stats import add_results
+from .leaderboard import record_results
+from .models import Attempt, Question, UserProgress
+from .progress import invalidate_summaries, refresh_rollups
+from .versions import get_version
+
+
+class StaleVariant(Exception):
+    """Вопросы выданного варианта изменились: тест нужно открыть заново."""
+
+
+class QuestionKey(NamedTuple):
+    id: int
+    question_type: str
+    points: int
+    correct_ids: frozenset
+    correct_texts: frozenset
+
+
+class AnswerKey(NamedTuple):
+    topic_id: int
+    version: int
+    questions: tuple
+    draw_size: int = 0
+
+    @property
+    def total_points(self):
+        return sum(question.points for question in self.questions)
+
+    @property
+    def is_pooled(self):
+        """Берёт ли тема для попытки только часть вопросов."""
+        return 0 < self.draw_size < len(self.questions)
+
+    def draw(self, seed):
+        """Ключ варианта с зерном `seed`: draw_size вопросов из пула.
+
+        random.sample по кортежу из ключа не трогает БД и стоит O(draw_size),
+        поэтому пул на 10 000 вопросов обходится так же дёшево, как на 20.
+        """
+        if seed is None or not self.is_pooled:
+            return self
+        return self._replace(questions=tuple(random.Random(seed).sample(self.questions, self.draw_size)))
+
+    def variant(self, seed, question_ids=None):
+        """Ключ выданного варианта: вопросы question_ids в порядке выдачи.
+
+        Без question_ids (формы и задачи, выданные до подписи id) вариант
+        восстанавливается по зерну. StaleVariant, если какого-то вопроса
+        в ключе уже нет.
+        """
+        if question_ids is None:
+            return self.draw(seed)
+        by_id = {question.id: question for question in self.questions}
+        try:
+            return self._replace(questions=tuple(by_id[question_id] for question_id in question_ids))
+        except (KeyError, TypeError):
+            raise StaleVariant('Вопросы теста изменились, откройте тест заново')
+
+
+_local_keys = {}
+_local_lock = threading.Lock()
+
+
+def new_seed():
+    """Зерно для нового варианта теста."""
+    return secrets.randbelow(2 ** 31)
+
+
+def shuffle_answers(answers, seed, question_id):
+    """Перемешивает варианты ответа вопроса одинаково для одного и того же зерна."""
+    answers = list(answers)
+    if seed is not None:
+        random.Random(f'{seed}:{question_id}').shuffle(answers)
+    return answers
+
+
+def normalize_text(value):
+    """Приводит текстовый ответ к виду для сравнения."""
+    return ' '.join(value.split()).lower()
+
+
+def answer_key_version_name(topic_id):
+    return f'answer_key:{topic_id}'
+
+
+def build_answer_key(topic_id, version=0):
+    """Собирает ключ ответов темы одним запросом (вопросы LEFT JOIN ответы)."""
+    rows = (
+        Question.objects.using('default')
+        .filter(topic_id=topic_id, is_active=True)
+        .order_by('order', 'id')
+        .values_list('id', 'question_type', 'points', 'topic__questions_per_test',
+                     'answers__id', 'answers__is_correct', 'answers__text')
+    )
+    questions = {}
+    draw_size = 0
+    for question_id, question_type, points, draw_size, answer_id, is_correct, text in rows:
+        entry = questions.setdefault(question_id, (question_type, points, set(), set()))
+        if answer_id is not None and is_correct:
+            entry[2].add(answer_id)
+            entry[3].add(normalize_text(text))
+    return AnswerKey(
+        topic_id=topic_id,
+        version=version,
+        questions=tuple(
+            QuestionKey(question_id, question_type, points,
+                        frozenset(correct_ids), frozenset(correct_texts))
+            for question_id, (question_type, points, correct_ids, correct_texts)
+            in questions.items()
+        ),
+        draw_size=draw_size,
+    )
+
+
+def get_answer_key(topic_id):
+    """Ключ ответов темы: сначала из памяти процесса, затем из кэша, затем из БД."""
+    version = get_version(answer_key_version_name(topic_id))
+    key = _local_keys.get(topic_id)
+    if key is not None and key.version == version:
+        return key
+
+    cache_key = f'bz:answer_key:{topic_id}:{version}'
+    key = cache.get(cache_key)
+    if key is None:
+        key = build_answer_key(topic_id, version)
+        cache.set(cache_key, key, timeout=None)
+    with _local_lock:
+        _local_keys[topic_id] = key
+    return key
+
+
+def answers_from_post(key, data):
+    """Достаёт из POST-данных ответы на вопросы ключа: {question_id: [значения]}."""
+    return {
+        question.id: data.getlist(f'question_{question.id}')
+        for question in key.questions
+    }
+
+
+def _to_ids(values):
+    ids = set()
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def is_correct(question, values):
+    """Верно ли отвечен вопрос `question` ответами `values`."""
+    if question.question_type == 'single':
+        selected = _to_ids(values[:1])
+        return bool(selected) and selected <= question.correct_ids
+    if question.question_type == 'multiple':
+        return _to_ids(values) == question.correct_ids
+    # text
+    answer = normalize_text(values[0]) if values else ''
+    return bool(answer) and answer in question.correct_texts
+
+
+def grade_answers(key, answers):
+    """Считает баллы по ключу. Возвращает (score, total_points, [AnswerRecord])."""
+    score = 0
+    total_points = 0
+    records = []
+    for question in key.questions:
+        values = answers.get(question.id, [])
+        correct = is_correct(question, values)
+        total_points += question.points
+        if correct:
+            score += question.points
+        answer_ids = () if question.question_type == 'text' else tuple(sorted(_to_ids(values)))
+        records.append(AnswerRecord(question.id, correct, answer_ids))
+    return score, total_points, records
+
+
+def grade(key, answers):
+    """Считает баллы по ключу. Возвращает (score, total_points)."""
+    score, total_points, _ = grade_answers(key, answers)
+    return score, total_points
+
+
+class SubmittedAnswers(NamedTuple):
+    """Один отправленный тест: ответы в виде {question_id: [значения]}, зерно и вопросы варианта."""
+    user_id: int
+    topic_id: int
+    answers: dict
+    seed: int = None
+    question_ids: tuple = None
+
+
+class GradeResult(NamedTuple):
+    user_id: int
+    topic_id: int
+    score: int
+    total_points: int
+    records: tuple = ()
+
+    @property
+    def percentage(self):
+        return (self.score / self.total_points * 100) if self.total_points > 0 else 0
+
+    @property
+    def is_passed(self):
+        return self.total_points > 0 and self.percentage >= settings.TEST_PASS_PERCENTAGE
+
+
+def _normalize_answers(answers):
+    """Ключи — id вопросов (int), значения — списки строк.
+
+    Ключ, который не является id, не может совпасть ни с одним вопросом
+    ключа и отбрасывается, как и нечисловые значения в _to_ids.
+    """
+    normalized = {}
+    for question_id, values in answers.items():
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        normalized[question_id] = [str(value) for value in values]
+    return normalized
+
+
+def grade_submissions(submissions):
+    """Проверяет пачку тестов и сохраняет прогресс.
+
+    Существующие строки UserProgress читаются одним запросом, результаты
+    записываются одним bulk_create(update_conflicts=True) по (user, topic).
+    Каждая попытка добавляется в журнал Attempt (см. attempts.py), лучшие
+    результаты — в рейтинги (см. leaderboard.py).
+    Возвращает список GradeResult в порядке submissions.
+    """
+    results = []
+    for submission in submissions:
+        key = get_answer_key(submission.topic_id).variant(submission.seed, submission.question_ids)
+        score, total_points, records = grade_answers(key, _normalize_answers(submission.answers))
+        results.append(GradeResult(submission.user_id, submission.topic_id, score, total_points,
+                                   tuple(records)))
+    if results:
+        with transaction.atomic():
+            save_results(results)
+            log_attempts(
+                (Attempt(user_id=result.user_id, topic_id=result.topic_id, seed=submission.seed,
+                         score=result.score, total_points=result.total_points), result.records)
+                for submission, result in zip(submissions, results)
+            )
+            record_results(results)
+    return results
+
+
+def save_results(results):
+    """Пишет результаты в UserProgress: attempts, max_score, is_completed, completed_at."""
+    now = timezone.now()
+    user_ids = {result.user_id for result in results}
+    topic_ids = {result.topic_id for result in results}
+
+    with transaction.atomic():
+        existing = {
+            (row.user_id, row.topic_id): row
+            for row in UserProgress.objects.select_for_update().filter(
+                user_id__in=user_ids, topic_id__in=topic_ids,
+            ).only('id', 'user_id', 'topic_id', 'score', 'max_score', 'attempts',
+                   'is_completed', 'completed_at')
+        }
+        # Несколько попыток одного пользователя в пачке сливаются в одну строку:
+        # upsert не может дважды обновить одну и ту же строку за запрос.
+        rows = {}
+        newly_completed = []
+        for result in results:
+            pair = (result.user_id, result.topic_id)
+            row = rows.get(pair)
+            if row is None:
+                previous = existing.get(pair)
+                row = UserProgress(
+                    user_id=result.user_id,
+                    topic_id=result.topic_id,
+                    attempts=previous.attempts if previous else 0,
+                    is_completed=previous.is_completed if previous else False,
+                    completed_at=previous.completed_at if previous else None,
+                )
+                rows[pair] = row
+            row.score = result.score
+            row.total_points = result.total_points
+            row.max_score = result.total_points
+            row.attempts += 1
+            if result.is_passed and not row.is_completed:
+                row.is_completed = True
+                row.completed_at = now
+                newly_completed.append(pair)
+
+        UserProgress.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=['user', 'topic'],
+            update_fields=['score', 'total_points', 'max_score', 'attempts',
+                           'is_completed', 'completed_at', 'last_attempt_at'],
+        )
+        if newly_completed:
+            refresh_rollups(newly_completed)
+        add_results((existing.get(pair), row) for pair, row in rows.items())
+    invalidate_summaries(user_ids)
@@ -0,0 +1,153 @@
+"""Очередь проверки тестов на таблице Submission.
+
+Запрос topic_test только сохраняет ответы (enqueue), а проверку и запись
+UserProgress выполняет отдельный процесс `manage.py grade_worker`.
+Задачи забираются через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+несколько обработчиков не мешают друг другу. На SQLite, где SKIP LOCKED
+нет, задача захватывается условным UPDATE по одной.
+
+Взятая задача помечается временем claimed_at. Если обработчик умер, не
+дописав пачку, её задачи через GRADING_LEASE_SECONDS забирает другой.
+"""
+import logging
+import signal
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .grading import SubmittedAnswers, grade_submissions
+from .models import Submission
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(user_id, topic_id, answers, seed=None, question_ids=None):
+    """Ставит отправленный тест в очередь."""
+    return Submission.objects.create(user_id=user_id, topic_id=topic_id, answers=answers, seed=seed,
+                                     question_ids=question_ids)
+
+
+def enqueue_many(submissions):
+    """Ставит в очередь пачку SubmittedAnswers одним INSERT."""
+    return Submission.objects.bulk_create([
+        Submission(user_id=item.user_id, topic_id=item.topic_id, answers=item.answers, seed=item.seed,
+                   question_ids=item.question_ids)
+        for item in submissions
+    ])
+
+
+def claim_batch(limit):
+    """Забирает до `limit` задач из очереди и помечает их как проверяемые.
+
+    Кроме новых задач забираются и «зависшие»: взятые обработчиком, который
+    упал или был убит, больше GRADING_LEASE_SECONDS назад.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.GRADING_LEASE_SECONDS)
+    claimable = Submission.objects.filter(
+        Q(status=Submission.STATUS_PENDING)
+        | Q(status=Submission.STATUS_PROCESSING, claimed_at__lt=stale)
+        | Q(status=Submission.STATUS_PROCESSING, claimed_at__isnull=True)
+    ).order_by('id')
+    claim = {'status': Submission.STATUS_PROCESSING, 'claimed_at': now}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(
+                claimable.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit]
+            )
+            if ids:
+                Submission.objects.filter(pk__in=ids).update(**claim)
+    else:
+        ids = []
+        for submission_id in claimable.values_list('id', flat=True)[:limit]:
+            if claimable.filter(pk=submission_id).update(**claim):
+                ids.append(submission_id)
+
+    if not ids:
+        return []
+    return list(Submission.objects.filter(pk__in=ids).order_by('id'))
+
+
+def _owned(submissions):
+    """Блокирует задачи пачки, которые всё ещё за этим обработчиком.
+
+    Если обработчик проверял дольше GRADING_LEASE_SECONDS, задачу мог
+    забрать другой: её claimed_at уже другой, и второй раз она не
+    проверяется.
+    """
+    claimed_at = {submission.pk: submission.claimed_at for submission in submissions}
+    rows = (
+        Submission.objects.select_for_update()
+        .filter(pk__in=claimed_at, status=Submission.STATUS_PROCESSING)
+        .values_list('pk', 'claimed_at')
+    )
+    owned = {pk for pk, claimed in rows if claimed == claimed_at[pk]}
+    return [submission for submission in submissions if submission.pk in owned]
+
+
+def process_batch(batch):
+    """Проверяет пачку задач и записывает результат в сами задачи.
+
+    Результаты проверки и статусы задач пишутся в одной транзакции: задача
+    не может остаться «проверяемой» при записанном прогрессе и наоборот.
+    """
+    try:
+        with transaction.atomic():
+            submissions = _owned(batch)
+            results = grade_submissions([
+                SubmittedAnswers(submission.user_id, submission.topic_id, submission.answers,
+                                 submission.seed, submission.question_ids)
+                for submission in submissions
+            ])
+            now = timezone.now()
+            for submission, result in zip(submissions, results):
+                submission.status = Submission.STATUS_DONE
+                submission.score = result.score
+                submission.total_points = result.total_points
+                submission.graded_at = now
+            Submission.objects.bulk_update(submissions, ['status', 'score', 'total_points', 'graded_at'])
+    except Exception as exc:
+        if len(batch) > 1:
+            # Проверяем по одной, чтобы одна битая задача не валила всю пачку
+            return sum(process_batch([submission]) for submission in batch)
+        [submission] = batch
+        logger.exception('Ошибка проверки теста #%d', submission.pk)
+        Submission.objects.filter(
+            pk=submission.pk, status=Submission.STATUS_PROCESSING, claimed_at=submission.claimed_at,
+        ).update(status=Submission.STATUS_FAILED, error=str(exc), graded_at=timezone.now())
+        return 0
+    return len(submissions)
+
+
+_stopping = threading.Event()
+
+
+def request_stop(*args):
+    """Просит обработчик завершиться после текущей пачки."""
+    _stopping.set()
+
+
+def run_worker(batch_size=100, poll_interval=0.5, once=False):
+    """Цикл обработчика: забирает пачки, пока очередь не пуста, иначе ждёт.
+
+    SIGTERM и SIGINT не прерывают пачку: обработчик дописывает её и
+    выходит, поэтому при деплое задачи не остаются «проверяемыми».
+    """
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+    processed = 0
+    while not _stopping.is_set():
+        submissions = claim_batch(batch_size)
+        if submissions:
+            processed += process_batch(submissions)
+            continue
+        if once:
+            break
+        _stopping.wait(poll_interval)
+    return processed
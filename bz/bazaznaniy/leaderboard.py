@@ -0,0 +1,235 @@
+"""Рейтинги по темам, языкам и отраслям.
+
+Рейтинг не сортирует UserProgress на каждый запрос, а читается из
+таблицы Ranking, которая обновляется при проверке тестов: строка темы
+хранит лучший результат пользователя, а при его росте разница
+прибавляется к строкам языка и отрасли одним upsert'ом. Топ — это
+LIMIT по индексу (scope, scope_id, -points, reached_at).
+
+Место пользователя — COUNT строк впереди по тому же индексу, но не
+дальше EXACT_RANK_LIMIT строк. Ниже этой границы место берётся из
+position — её пересчитывает одним UPDATE с ROW_NUMBER() команда
+`manage.py refresh_rankings` (раз в несколько минут), а до первого
+пересчёта — по соседней строке с таким же или большим числом баллов.
+Такое место показывается как приблизительное.
+
+Строка темы сначала вставляется (или уже есть) и только потом
+блокируется: две первые параллельные отправки одного пользователя не
+прибавят баллы к языку и отрасли дважды.
+"""
+from typing import NamedTuple
+
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .models import Attempt, Ranking, Topic, UserProgress
+
+CHUNK_SIZE = 2000
+EXACT_RANK_LIMIT = 1000
+
+
+class LeaderRow(NamedTuple):
+    rank: int
+    user_id: int
+    username: str
+    points: int
+    approximate: bool = False
+
+
+class Leaderboard(NamedTuple):
+    scope: str
+    scope_id: int
+    rows: list
+    me: LeaderRow = None
+
+    @property
+    def me_in_top(self):
+        return self.me is not None and any(row.user_id == self.me.user_id for row in self.rows)
+
+
+def _parents(topic_ids):
+    """{topic_id: [(scope, scope_id)]} — язык и отрасль каждой темы.
+
+    Активные темы берутся из каталога. Скрытых тем (и тем скрытых языков и
+    отраслей) в нём нет, их родители читаются из БД одним запросом: баллы,
+    набранные, пока тема скрыта (например, задачей из очереди), тоже
+    засчитываются языку и отрасли и не теряются после открытия темы.
+    """
+    catalog = get_catalog()
+    parents = {}
+    missing = set()
+    for topic_id in set(topic_ids):
+        topic = catalog.topic_by_id(topic_id)
+        if topic is None:
+            missing.add(topic_id)
+        else:
+            parents[topic_id] = (topic.lang_id, topic.sector_id)
+    if missing:
+        parents.update(
+            (topic_id, (lang_id, sector_id))
+            for topic_id, lang_id, sector_id in Topic.objects.filter(pk__in=missing).values_list(
+                'pk', 'lang_id', 'lang__sector_id').iterator(chunk_size=CHUNK_SIZE)
+        )
+    return {
+        topic_id: [(Ranking.SCOPE_LANGUAGE, lang_id), (Ranking.SCOPE_SECTOR, sector_id)]
+        for topic_id, (lang_id, sector_id) in parents.items()
+    }
+
+
+def _add_points(deltas, now):
+    """Прибавляет баллы к строкам языков и отраслей: {(scope, scope_id, user_id): delta}."""
+    if not deltas:
+        return
+    table = connection.ops.quote_name(Ranking._meta.db_table)
+    reached_at = connection.ops.adapt_datetimefield_value(now)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (scope, scope_id, user_id, points, reached_at) '
+            f'VALUES (%s, %s, %s, %s, %s) '
+            f'ON CONFLICT (scope, scope_id, user_id) DO UPDATE SET '
+            f'points = {table}.points + excluded.points, reached_at = excluded.reached_at',
+            [(*key, delta, reached_at) for key, delta in sorted(deltas.items())],
+        )
+
+
+def record_results(results):
+    """Учитывает в рейтингах пачку результатов (GradeResult)."""
+    best = {}
+    for result in results:
+        pair = (result.user_id, result.topic_id)
+        best[pair] = max(best.get(pair, 0), result.score)
+    if not best:
+        return
+
+    now = timezone.now()
+    parents = _parents(topic_id for _, topic_id in best)
+    with transaction.atomic():
+        # Недостающие строки тем вставляются с нулём: параллельная вставка
+        # той же строки дождётся коммита, и ниже обе транзакции заблокируют
+        # одну и ту же строку, а не посчитают результат первым каждая.
+        Ranking.objects.bulk_create(
+            [Ranking(scope=Ranking.SCOPE_TOPIC, scope_id=topic_id, user_id=user_id, points=0, reached_at=now)
+             for user_id, topic_id in sorted(best)],
+            ignore_conflicts=True,
+        )
+        existing = {
+            (user_id, topic_id): (row_id, points)
+            for row_id, user_id, topic_id, points in Ranking.objects.select_for_update().filter(
+                scope=Ranking.SCOPE_TOPIC,
+                user_id__in={user_id for user_id, _ in best},
+                scope_id__in={topic_id for _, topic_id in best},
+            ).order_by('id').values_list('id', 'user_id', 'scope_id', 'points')
+        }
+        rows = []
+        deltas = {}
+        for (user_id, topic_id), score in best.items():
+            row_id, previous = existing[(user_id, topic_id)]
+            if score <= previous:
+                continue
+            rows.append(Ranking(pk=row_id, points=score, reached_at=now))
+            for scope, scope_id in parents.get(topic_id, ()):
+                key = (scope, scope_id, user_id)
+                deltas[key] = deltas.get(key, 0) + score - previous
+        Ranking.objects.bulk_update(rows, ['points', 'reached_at'])
+        _add_points(deltas, now)
+
+
+def _ordered(scope, scope_id):
+    return Ranking.objects.filter(scope=scope, scope_id=scope_id).order_by('-points', 'reached_at', 'user_id')
+
+
+def top(scope, scope_id, limit):
+    rows = _ordered(scope, scope_id).values_list('user_id', 'user__username', 'points')[:limit]
+    return [LeaderRow(rank, user_id, username, points)
+            for rank, (user_id, username, points) in enumerate(rows, 1)]
+
+
+def rank_of(scope, scope_id, user):
+    """Место пользователя в рейтинге или None, если он там ещё не появился."""
+    row = (
+        Ranking.objects.filter(scope=scope, scope_id=scope_id, user=user)
+        .values_list('points', 'reached_at', 'position').first()
+    )
+    if row is None:
+        return None
+    points, reached_at, position = row
+    ahead = _ordered(scope, scope_id).filter(
+        Q(points__gt=points)
+        | Q(points=points, reached_at__lt=reached_at)
+        | Q(points=points, reached_at=reached_at, user_id__lt=user.pk)
+    )
+    # Строки впереди идут по индексу первыми: COUNT читает не больше EXACT_RANK_LIMIT
+    exact = ahead[:EXACT_RANK_LIMIT].count()
+    if exact < EXACT_RANK_LIMIT:
+        return LeaderRow(exact + 1, user.pk, user.username, points)
+    if position is None:
+        # Ещё не пересчитан: место сразу за последним пересчитанным с теми же или большими баллами
+        neighbour = (
+            Ranking.objects.filter(scope=scope, scope_id=scope_id, points__gte=points, position__isnull=False)
+            .order_by('points', '-reached_at').values_list('position', flat=True).first()
+        )
+        position = (neighbour or 0) + 1
+    return LeaderRow(max(position, EXACT_RANK_LIMIT + 1), user.pk, user.username, points, approximate=True)
+
+
+def refresh_positions():
+    """Пересчитывает position во всех рейтингах одним UPDATE. Возвращает число изменённых строк."""
+    table = connection.ops.quote_name(Ranking._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET position = ranked.position '
+            f'FROM (SELECT id AS row_id, ROW_NUMBER() OVER ('
+            f'PARTITION BY scope, scope_id ORDER BY points DESC, reached_at, user_id) AS position '
+            f'FROM {table}) AS ranked '
+            f'WHERE {table}.id = ranked.row_id '
+            f'AND ({table}.position IS NULL OR {table}.position <> ranked.position)'
+        )
+        return cursor.rowcount
+
+
+def get_leaderboard(scope, scope_id, user, limit):
+    rows = top(scope, scope_id, limit)
+    me = None
+    if user.is_authenticated:
+        me = next((row for row in rows if row.user_id == user.pk), None) or rank_of(scope, scope_id, user)
+    return Leaderboard(scope, scope_id, rows, me)
+
+
+def rebuild():
+    """Пересобирает рейтинги по UserProgress и журналу попыток."""
+    best = {}
+
+    def consider(user_id, topic_id, score, when):
+        current = best.get((user_id, topic_id))
+        if current is None or score > current[0] or (score == current[0] and when < current[1]):
+            best[(user_id, topic_id)] = (score, when)
+
+    for user_id, topic_id, score, when in UserProgress.objects.values_list(
+            'user_id', 'topic_id', 'score', 'last_attempt_at').iterator(chunk_size=CHUNK_SIZE):
+        consider(user_id, topic_id, score, when)
+    for user_id, topic_id, score, when in (
+            Attempt.objects.values('user_id', 'topic_id')
+            .annotate(best=Max('score'), when=Max('created_at'))
+            .values_list('user_id', 'topic_id', 'best', 'when')):
+        consider(user_id, topic_id, score, when)
+
+    parents = _parents(topic_id for _, topic_id in best)
+    rows = {}
+    for (user_id, topic_id), (score, when) in best.items():
+        rows[(Ranking.SCOPE_TOPIC, topic_id, user_id)] = [score, when]
+        for scope, scope_id in parents.get(topic_id, ()):
+            row = rows.setdefault((scope, scope_id, user_id), [0, when])
+            row[0] += score
+            row[1] = max(row[1], when)
+
+    with transaction.atomic():
+        Ranking.objects.all().delete()
+        Ranking.objects.bulk_create(
+            (Ranking(scope=scope, scope_id=scope_id, user_id=user_id, points=points, reached_at=when)
+             for (scope, scope_id, user_id), (points, when) in rows.items()),
+            batch_size=CHUNK_SIZE,
+        )
+        refresh_positions()
+    return len(rows)
@@ -0,0 +1,182 @@
+import json
+import re
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from bazaznaniy import urls
+from bazaznaniy.catalog import get_catalog
+from bazaznaniy.grading import get_answer_key
+from bazaznaniy.models import Submission
+from bazaznaniy.progress import summary_version_name
+from bazaznaniy.versions import bump_version
+
+
+HIDDEN_INPUT = re.compile(r'<input type="hidden" name="([^"]+)" value="([^"]*)"')
+# Управление транзакциями не считается: внутри откатываемой транзакции
+# замера BEGIN/COMMIT представлений превращаются в точки сохранения
+TRANSACTION_SQL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все адреса bazaznaniy/urls.py через тестовый клиент и '
+            'сохраняет p50/p95, число запросов к БД (наибольшее и медиану) и размер ответа в JSON. '
+            'Всё, что записали запросы, откатывается')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Запросов на каждый адрес')
+        parser.add_argument('--output', default='benchmark.json', help='Файл для результатов')
+        parser.add_argument('--baseline', help='Файл прошлых результатов для сравнения числа запросов')
+        parser.add_argument('--tolerance', type=int, default=0,
+                            help='Сколько лишних запросов к БД допустимо относительно baseline')
+        parser.add_argument('--username', default='bench-user-0',
+                            help='Пользователь для авторизованных запросов (см. seed_catalog)')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должен быть положительным')
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {options["username"]} не найден, запустите seed_catalog')
+
+        topic = self._pick_topic()
+        if topic is None:
+            raise CommandError('В каталоге нет активных тем с вопросами, запустите seed_catalog')
+
+        # Отправки теста, задача для submission_result и сессии пишут в базу:
+        # замер идёт в транзакции, которая откатывается целиком. Обработчики
+        # on_commit (сдвиг версий, пересчёт статистики) при откате не выполняются.
+        with transaction.atomic():
+            results = self._run(user, topic, options)
+            transaction.set_rollback(True)
+        # Сводка профиля собрана по откаченным результатам
+        bump_version(summary_version_name(user.id))
+
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:40} p50 {row["p50_ms"]:8.2f} мс  p95 {row["p95_ms"]:8.2f} мс  '
+                f'запросов {row["queries"]:4} (медиана {row["queries_median"]:g})  '
+                f'байт {row["bytes"]:8}  статус {row["status"]}'
+            )
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump({'iterations': options['iterations'], 'endpoints': results}, f,
+                      ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+        if options['baseline']:
+            self._compare(results, options['baseline'], options['tolerance'])
+
+    def _run(self, user, topic, options):
+        submission = Submission.objects.create(user=user, topic_id=topic.id)
+        params = {
+            'slug': topic.sector_slug,
+            'sector_slug': topic.sector_slug,
+            'lang_slug': topic.lang_slug,
+            'topic_slug': topic.slug,
+            'pk': submission.pk,
+        }
+
+        anonymous = Client()
+        authenticated = Client()
+        authenticated.force_login(user)
+
+        results = {}
+        # Лимит частоты отправки теста замер бы только упирал в 429
+        with override_settings(ALLOWED_HOSTS=['*'], TEST_SUBMIT_BURST=0):
+            for pattern in urls.urlpatterns:
+                names = list(pattern.pattern.converters)
+                if any(name not in params for name in names):
+                    self.stderr.write(f'Пропущен {pattern.name}: неизвестные параметры {names}')
+                    continue
+                url = reverse(pattern.name, kwargs={name: params[name] for name in names})
+                results[f'{pattern.name} GET anon'] = self._measure(anonymous, 'get', url, options)
+                results[f'{pattern.name} GET auth'] = self._measure(authenticated, 'get', url, options)
+                if pattern.name == 'topic_test':
+                    results[f'{pattern.name} POST auth'] = self._measure(
+                        authenticated, 'post', url, options,
+                        data=lambda: self._form_data(authenticated, url, topic.id))
+        return results
+
+    def _pick_topic(self):
+        for sector in get_catalog().sectors:
+            for lang in sector.languages:
+                for topic in lang.topics:
+                    if get_answer_key(topic.id).questions:
+                        return topic
+        return None
+
+    def _answers(self, topic_id):
+        data = {}
+        for question in get_answer_key(topic_id).questions:
+            if question.question_type == 'text':
+                data[f'question_{question.id}'] = next(iter(question.correct_texts), '')
+            else:
+                data[f'question_{question.id}'] = [str(answer_id) for answer_id in question.correct_ids]
+        return data
+
+    def _form_data(self, client, url, topic_id):
+        """Скрытые поля свежей формы теста (ключ попытки, вариант) и верные ответы."""
+        response = client.get(url)
+        page = b''.join(response.streaming_content) if response.streaming else response.content
+        return {**dict(HIDDEN_INPUT.findall(page.decode())), **self._answers(topic_id)}
+
+    def _measure(self, client, method, url, options, data=None):
+        """data — функция, которая перед каждым запросом готовит тело POST (вне замера)."""
+        timings = []
+        queries = []
+        size = 0
+        status = None
+        for _ in range(options['iterations']):
+            body = data() if data else None
+            # Чтения, направленные на реплики, идут через свои соединения
+            with ExitStack() as stack:
+                captured = [stack.enter_context(CaptureQueriesContext(db)) for db in connections.all()]
+                started = time.perf_counter()
+                response = getattr(client, method)(url, body) if data else getattr(client, method)(url)
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(sum(
+                1 for ctx in captured for query in ctx.captured_queries
+                if not query['sql'].startswith(TRANSACTION_SQL)
+            ))
+            size = len(content)
+            status = response.status_code
+        return {
+            'url': url,
+            'method': method.upper(),
+            'status': status,
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            # Наибольшее: первый запрос к адресу может заполнять кэши
+            'queries': max(queries),
+            'queries_median': statistics.median(queries),
+            'bytes': size,
+        }
+
+    def _compare(self, results, baseline_path, tolerance):
+        try:
+            with open(baseline_path, encoding='utf-8') as f:
+                baseline = json.load(f)['endpoints']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Не удалось прочитать baseline: {exc}')
+        regressions = [
+            f'{name}: {baseline[name]["queries"]} → {row["queries"]}'
+            for name, row in results.items()
+            if name in baseline and row['queries'] > baseline[name]['queries'] + tolerance
+        ]
+        if regressions:
+            raise CommandError('Выросло число запросов к БД:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Число запросов к БД не выросло'))
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from bazaznaniy.content_io import export_documents, write_documents
+from bazaznaniy.models import Topic
+
+
+class Command(BaseCommand):
+    help = 'Выгружает курсы в JSONL/YAML-файл (по документу на тему), совместимый с import_content'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или "-" для stdout')
+        parser.add_argument('--format', choices=['jsonl', 'yaml'], default=None,
+                            help='Формат файла; по умолчанию — по расширению')
+        parser.add_argument('--sector', help='Выгрузить только отрасль с этим slug')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('yaml' if path.endswith(('.yaml', '.yml')) else 'jsonl')
+        topics = Topic.objects.all()
+        if options['sector']:
+            topics = topics.filter(lang__sector__slug=options['sector'])
+
+        stream = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8')
+        try:
+            write_documents(export_documents(topics), stream, fmt)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        if stream is not sys.stdout:
+            self.stdout.write(self.style.SUCCESS(f'Выгружено в {path}'))
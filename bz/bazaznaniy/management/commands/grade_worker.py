@@ -0,0 +1,85 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from bazaznaniy.grading_queue import run_worker
+from bazaznaniy.versions import is_shared_cache
+
+
+class Command(BaseCommand):
+    help = 'Запускает фоновые обработчики очереди проверки тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Количество процессов-обработчиков (по умолчанию 1)')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Сколько тестов забирать из очереди за раз (по умолчанию 100)')
+        parser.add_argument('--poll-interval', type=float, default=0.5,
+                            help='Пауза между опросами пустой очереди, в секундах')
+        parser.add_argument('--once', action='store_true',
+                            help='Разобрать очередь и завершиться')
+        parser.add_argument('--stop-timeout', type=float, default=60,
+                            help='Сколько секунд при остановке ждать, пока обработчики '
+                                 'допишут текущую пачку (по умолчанию 60)')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError('--processes должен быть положительным')
+        if not options['once'] and not is_shared_cache():
+            # Правки из админки сдвигают версии ключей ответов только в кэше веб-процесса
+            raise CommandError('Обработчику нужен общий с сайтом кэш: задайте CACHE_BACKEND=redis '
+                               'или memcached и CACHE_LOCATION')
+        worker_options = {
+            'batch_size': options['batch_size'],
+            'poll_interval': options['poll_interval'],
+            'once': options['once'],
+        }
+
+        if processes > 1 and not connection.features.has_select_for_update_skip_locked:
+            # Без SKIP LOCKED (SQLite) параллельные обработчики только блокируют друг друга
+            self.stderr.write(self.style.WARNING(
+                'База данных не поддерживает SKIP LOCKED, запускается один обработчик'
+            ))
+            processes = 1
+
+        if processes == 1:
+            processed = run_worker(**worker_options)
+            if processed is not None:
+                self.stdout.write(self.style.SUCCESS(f'Проверено тестов: {processed}'))
+            return
+
+        # Соединения с БД не должны наследоваться дочерними процессами
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=run_worker, kwargs=worker_options, daemon=True)
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Запущено обработчиков: {processes}')
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self._stop(workers, options['stop_timeout']))
+        for worker in workers:
+            worker.join()
+
+    def _stop(self, workers, timeout):
+        # terminate() шлёт SIGTERM: обработчик дописывает пачку и выходит сам
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+        for worker in workers:
+            if worker.is_alive():
+                # Задачи недописанной пачки заберут по истечении GRADING_LEASE_SECONDS
+                self.stderr.write(self.style.WARNING(f'Обработчик {worker.pid} не завершился, снимаем'))
+                worker.kill()
+                worker.join()
+        raise SystemExit(0)
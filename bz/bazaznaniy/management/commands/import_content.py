@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bazaznaniy.content_io import ContentError, import_documents, read_documents
+
+
+class Command(BaseCommand):
+    help = 'Импортирует курсы из JSONL/YAML-файла (по документу на тему) с upsert по slug и коду вопроса'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или "-" для stdin')
+        parser.add_argument('--format', choices=['jsonl', 'yaml'], default=None,
+                            help='Формат файла; по умолчанию — по расширению')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Тем в одной транзакции')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать изменения, ничего не записывая')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('yaml' if path.endswith(('.yaml', '.yml')) else 'jsonl')
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        try:
+            stats = import_documents(read_documents(stream, fmt),
+                                     chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        except ContentError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for name in sorted(stats):
+            self.stdout.write(f'{name}: {stats[name]}')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Пробный запуск: изменения не сохранены'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Импорт завершён'))
@@ -0,0 +1,28 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from bazaznaniy.perf import report
+
+
+class Command(BaseCommand):
+    help = 'Выводит сводку PerformanceMiddleware по именам URL со всех процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Вывести сводку в JSON')
+
+    def handle(self, *args, **options):
+        data = report()
+        if options['json']:
+            self.stdout.write(json.dumps(data, ensure_ascii=False, indent=2))
+            return
+        if not data:
+            self.stdout.write('Замеров пока нет')
+            return
+        for name, row in data.items():
+            self.stdout.write(
+                f'{name:30} запросов {row["requests"]:6}  p50 {row["p50_ms"]:8.2f} мс  '
+                f'p95 {row["p95_ms"]:8.2f} мс  SQL {row["avg_queries"]:6} (max {row["max_queries"]})  '
+                f'SQL {row["avg_sql_ms"]:7.2f} мс  шаблоны {row["avg_template_ms"]:7.2f} мс  '
+                f'повторов SQL {row["duplicate_queries"]}'
+            )
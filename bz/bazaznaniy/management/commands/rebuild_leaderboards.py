@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bazaznaniy.leaderboard import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает рейтинги по темам, языкам и отраслям из прогресса и журнала попыток'
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Строк в рейтингах: {count}'))
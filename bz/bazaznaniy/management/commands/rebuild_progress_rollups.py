@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from bazaznaniy.progress import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает сводный прогресс пользователей по языкам и отраслям'
+
+    def handle(self, *args, **options):
+        languages, sectors = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано строк: по языкам — {languages}, по отраслям — {sectors}'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bazaznaniy.attempts import rebuild_question_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику вопросов (трудность, дискриминативность) по журналу попыток'
+
+    def handle(self, *args, **options):
+        count = rebuild_question_stats()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитана статистика вопросов: {count}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bazaznaniy.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс по активным темам, вопросам и советам'
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'В индексе записей: {count}'))
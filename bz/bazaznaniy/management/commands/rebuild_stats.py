@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bazaznaniy.catalog_stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику тем и языков (вопросы, баллы, средний результат)'
+
+    def handle(self, *args, **options):
+        topics, languages = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитана статистика: тем {topics}, языков {languages}'))
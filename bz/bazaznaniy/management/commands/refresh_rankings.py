@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from bazaznaniy.leaderboard import refresh_positions
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает места в рейтингах для пользователей далеко от вершины; '
+            'запускать раз в несколько минут')
+
+    def handle(self, *args, **options):
+        updated = refresh_positions()
+        self.stdout.write(self.style.SUCCESS(f'Обновлено мест: {updated}'))
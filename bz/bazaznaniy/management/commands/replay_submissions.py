@@ -0,0 +1,107 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from bazaznaniy.grading import SubmittedAnswers, grade_submissions
+from bazaznaniy.models import Topic
+
+
+def parse_record(line):
+    """SubmittedAnswers из строки JSONL; ValueError с причиной, если строка негодна."""
+    try:
+        record = json.loads(line)
+    except ValueError as exc:
+        raise ValueError(f'неверный JSON: {exc}')
+    if not isinstance(record, dict):
+        raise ValueError('ожидается объект')
+    ids = {}
+    for name in ('user_id', 'topic_id'):
+        value = record.get(name)
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f'нет целого {name}')
+        try:
+            ids[name] = int(value)
+        except ValueError:
+            raise ValueError(f'{name} не целое число: {value!r}')
+    answers = record.get('answers', {})
+    if not isinstance(answers, dict):
+        raise ValueError('answers должен быть объектом {"id вопроса": [значения]}')
+    try:
+        answers = {int(question_id): values for question_id, values in answers.items()}
+    except ValueError as exc:
+        raise ValueError(f'id вопроса не целое число: {exc}')
+    seed = record.get('seed')
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int)):
+        raise ValueError(f'seed не целое число: {seed!r}')
+    return SubmittedAnswers(ids['user_id'], ids['topic_id'], answers, seed)
+
+
+class Command(BaseCommand):
+    help = ('Проверяет тесты из JSONL-файла пачками через grade_submissions. '
+            'Каждая строка: {"user_id": 1, "topic_id": 2, "answers": {"10": ["31"]}, "seed": 42}; '
+            'seed нужен только для тем с пулом вопросов. Негодные строки и строки с '
+            'несуществующим пользователем или темой пропускаются с номером строки в stderr')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к JSONL-файлу с отправленными тестами')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько тестов проверять за один upsert (по умолчанию 500)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным')
+
+        self.total = 0
+        self.batches = 0
+        self.skipped = 0
+        started = time.perf_counter()
+        batch = []
+        try:
+            with open(options['path'], encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        batch.append((line_no, parse_record(line)))
+                    except ValueError as exc:
+                        self.skip(line_no, exc)
+                        continue
+                    if len(batch) >= batch_size:
+                        self.grade(batch)
+                        batch = []
+        except OSError as exc:
+            raise CommandError(str(exc))
+        if batch:
+            self.grade(batch)
+
+        elapsed = time.perf_counter() - started
+        rate = self.total / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено {self.total} тестов в {self.batches} пачках за {elapsed:.2f} с ({rate:.0f} тестов/с)'
+        ))
+        if self.skipped:
+            self.stdout.write(self.style.WARNING(f'Пропущено строк: {self.skipped}'))
+
+    def skip(self, line_no, reason):
+        self.skipped += 1
+        self.stderr.write(f'Строка {line_no}: {reason}')
+
+    def grade(self, batch):
+        """Проверяет пачку, отбросив строки с несуществующими пользователями и темами."""
+        users = set(User.objects.filter(pk__in={item.user_id for _, item in batch}).values_list('pk', flat=True))
+        topics = set(Topic.objects.filter(pk__in={item.topic_id for _, item in batch}).values_list('pk', flat=True))
+        submissions = []
+        for line_no, item in batch:
+            if item.user_id not in users:
+                self.skip(line_no, f'нет пользователя {item.user_id}')
+            elif item.topic_id not in topics:
+                self.skip(line_no, f'нет темы {item.topic_id}')
+            else:
+                submissions.append(item)
+        if submissions:
+            self.total += len(grade_submissions(submissions))
+            self.batches += 1
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from bazaznaniy.tips import rerender
+
+
+class Command(BaseCommand):
+    help = 'Перерисовывает HTML советов, у которых изменился текст или версия отрисовщика'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Перерисовать все советы')
+
+    def handle(self, *args, **options):
+        checked, rendered = rerender(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'Проверено советов: {checked}, перерисовано: {rendered}'))
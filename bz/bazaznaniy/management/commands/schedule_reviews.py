@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from bazaznaniy.review import rebuild, schedule_from_attempts
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает расписание повторения вопросов по новым попыткам из журнала; '
+            'запускать раз в сутки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Построить расписание заново по всему журналу')
+
+    def handle(self, *args, **options):
+        attempts, updated = rebuild() if options['rebuild'] else schedule_from_attempts()
+        self.stdout.write(self.style.SUCCESS(f'Учтено попыток: {attempts}, обновлено строк расписания: {updated}'))
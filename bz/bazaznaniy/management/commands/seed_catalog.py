@@ -0,0 +1,102 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from bazaznaniy.catalog import CATALOG_VERSION
+from bazaznaniy.catalog_stats import refresh_topics
+from bazaznaniy.models import Answer, Language, Question, Sector, Topic, UserProgress
+from bazaznaniy.progress import rebuild_rollups
+from bazaznaniy.search import reindex_topics
+from bazaznaniy.versions import bump_version
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу тестовым каталогом заданного размера: '
+            'отрасли × языки × темы × вопросы × ответы, пользователи и их прогресс')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sectors', type=int, default=3)
+        parser.add_argument('--languages', type=int, default=4, help='Языков в отрасли')
+        parser.add_argument('--topics', type=int, default=10, help='Тем в языке')
+        parser.add_argument('--questions', type=int, default=20, help='Вопросов в теме')
+        parser.add_argument('--answers', type=int, default=4, help='Вариантов ответа в вопросе')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--progress', type=int, default=10,
+                            help='Сколько тем прошёл каждый пользователь')
+        parser.add_argument('--prefix', default='bench', help='Префикс slug’ов и имён пользователей')
+        parser.add_argument('--password', default='bench-password', help='Пароль тестовых пользователей')
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить ранее созданные данные с этим префиксом')
+        parser.add_argument('--seed', type=int, default=0, help='Seed генератора случайных чисел')
+
+    def handle(self, *args, **options):
+        if min(options['sectors'], options['languages'], options['topics']) < 1:
+            raise CommandError('Размеры каталога должны быть положительными')
+        prefix = options['prefix']
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            if options['clear']:
+                Sector.objects.filter(slug__startswith=f'{prefix}-').delete()
+                User.objects.filter(username__startswith=f'{prefix}-').delete()
+            elif (Sector.objects.filter(slug__startswith=f'{prefix}-').exists()
+                  or User.objects.filter(username__startswith=f'{prefix}-').exists()):
+                raise CommandError(f'Данные с префиксом «{prefix}» уже есть: добавьте --clear '
+                                   f'или укажите другой --prefix')
+
+            sectors = Sector.objects.bulk_create([
+                Sector(name=f'Отрасль {i}', slug=f'{prefix}-s{i}', order=i)
+                for i in range(options['sectors'])
+            ])
+            languages = Language.objects.bulk_create([
+                Language(sector=sector, name=f'Язык {sector.order}.{i}', slug=f'lang-{i}',
+                         description=f'Описание языка {i}', order=i)
+                for sector in sectors for i in range(options['languages'])
+            ])
+            topics = Topic.objects.bulk_create([
+                Topic(lang=lang, name=f'Тема {lang.name} / {i}', slug=f'topic-{i}',
+                      description=f'Описание темы {i}', order=i)
+                for lang in languages for i in range(options['topics'])
+            ])
+            types = [choice for choice, _ in Question.QUESTION_TYPES]
+            questions = Question.objects.bulk_create([
+                Question(topic=topic, code=f'q{i}', text=f'Вопрос {i} по теме «{topic.name}»',
+                         question_type=types[i % len(types)], order=i, points=1 + i % 3)
+                for topic in topics for i in range(options['questions'])
+            ], batch_size=2000)
+            Answer.objects.bulk_create([
+                Answer(question=question, text=f'Ответ {i}', order=i,
+                       is_correct=i == 0 or (question.question_type == 'multiple' and i == 1))
+                for question in questions for i in range(options['answers'])
+            ], batch_size=5000)
+
+            password = make_password(options['password'])
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}-user-{i}', password=password)
+                for i in range(options['users'])
+            ], batch_size=2000)
+            per_user = min(options['progress'], len(topics))
+            UserProgress.objects.bulk_create([
+                UserProgress(user=user, topic=topic, score=score, total_points=10, max_score=10,
+                             attempts=rng.randint(1, 5), is_completed=score >= 7)
+                for user in users
+                for topic in rng.sample(topics, per_user)
+                for score in [rng.randint(0, 10)]
+            ], batch_size=5000)
+
+        # bulk_create не вызывает сигналы: сбрасываем кэш каталога, сводки и индекс поиска вручную
+        bump_version(CATALOG_VERSION)
+        rebuild_rollups()
+        refresh_topics(topic.pk for topic in topics)
+        reindex_topics(topic.pk for topic in topics)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {time.perf_counter() - started:.1f} с: отраслей {len(sectors)}, '
+            f'языков {len(languages)}, тем {len(topics)}, вопросов {len(questions)}, '
+            f'пользователей {len(users)}, строк прогресса {len(users) * per_user}'
+        ))
@@ -0,0 +1,84 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROBE = (
+    'import json, sys\n'
+    'from bazaznaniy.startup import profile_startup\n'
+    'print(json.dumps(profile_startup(sys.argv[1] == "warm", sys.argv[2])))\n'
+)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время и память запуска воркера по этапам (django.setup(), admin, '
+            'URLconf, шаблоны, соединение с БД) без подготовки и с warm_up()')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Запусков чистого процесса на режим')
+        parser.add_argument('--path', default='/', help='Адрес первого запроса')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs должен быть положительным')
+        results = {}
+        for mode in ('cold', 'warm'):
+            runs = [self._probe(mode, options['path']) for _ in range(options['runs'])]
+            results[mode] = self._median(runs)
+            self._report(mode, results[mode])
+
+        cold, warm = results['cold'], results['warm']
+        self.stdout.write(
+            f'\nПервый запрос: {cold["first_ms"]:.0f} мс без подготовки, '
+            f'{warm["first_ms"]:.0f} мс после warm_up(); '
+            f'запуск до готовности: {cold["ready_ms"]:.0f} → {warm["ready_ms"]:.0f} мс'
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Результаты сохранены в {options["output"]}'))
+
+    def _probe(self, mode, path):
+        # Каждый замер — в новом интерпретаторе: импорт должен быть холодным
+        completed = subprocess.run(
+            [sys.executable, '-c', PROBE, mode, path],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f'Замер завершился с ошибкой:\n{completed.stderr}')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def _median(self, runs):
+        names = [row['stage'] for row in runs[0]['stages']]
+        stages = [
+            {
+                'stage': name,
+                'ms': round(statistics.median(run['stages'][index]['ms'] for run in runs), 2),
+                'rss_kb': statistics.median(run['stages'][index]['rss_kb'] for run in runs),
+            }
+            for index, name in enumerate(names)
+        ]
+        return {
+            'stages': stages,
+            'ready_ms': round(statistics.median(run['ready_ms'] for run in runs), 2),
+            'ready_rss_kb': statistics.median(run['ready_rss_kb'] for run in runs),
+            'first_ms': stages[-2]['ms'],
+            'modules': runs[0]['modules'],
+            'status': runs[0]['status'],
+        }
+
+    def _report(self, mode, result):
+        title = 'Без подготовки' if mode == 'cold' else 'С warm_up()'
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{title} (медиана, ответ {result["status"]})'))
+        self.stdout.write(f'{"Этап":<32} {"мс":>9} {"RSS, КБ":>9}')
+        for row in result['stages']:
+            self.stdout.write(f'{row["stage"]:<32} {row["ms"]:>9.1f} {row["rss_kb"]:>9.0f}')
+        self.stdout.write(
+            f'{"Готов к запросам":<32} {result["ready_ms"]:>9.1f} {result["ready_rss_kb"]:>9.0f}'
+            f'  (модулей: {result["modules"]})'
+        )
@@ -0,0 +1,78 @@
+"""Отрисовка текста советов: Markdown с подсветкой кода через Pygments.
+
+HTML строится один раз при сохранении совета и хранится в
+Tip.content_html вместе с хэшем исходного текста. В хэш входит
+RENDERER_VERSION: после смены настроек отрисовки её нужно увеличить и
+запустить `manage.py rerender_tips`, который перерисует только
+устаревшие советы.
+
+Сырой HTML в тексте не пропускается, а экранируется. Ссылки и картинки
+допускаются только на http(s), mailto и относительные адреса: у ссылки с
+другой схемой (javascript:, data: и т. п.) остаётся только текст, у
+картинки — подпись.
+
+Markdown и Pygments импортируются при первой отрисовке, а не при импорте
+модуля: модуль подтягивает models.py, а Pygments при импорте форматтеров
+перебирает entry points установленных пакетов — это заметная доля
+django.setup() каждого воркера (см. `manage.py startup_profile`).
+"""
+import hashlib
+import re
+
+RENDERER_VERSION = 2
+CODE_CSS_CLASS = 'codehilite'
+PYGMENTS_STYLE = 'default'
+
+EXTENSIONS = ['fenced_code', 'codehilite', 'tables', 'sane_lists']
+EXTENSION_CONFIGS = {
+    'codehilite': {'css_class': CODE_CSS_CLASS, 'guess_lang': False},
+}
+
+SAFE_SCHEMES = {'http', 'https', 'mailto'}
+URL_SCHEME = re.compile(r'^([a-z][a-z0-9+.-]*):', re.IGNORECASE)
+# Браузер пропускает пробелы и управляющие символы внутри схемы: "java\tscript:"
+URL_IGNORED = re.compile(r'[\x00-\x20\x7f]+')
+
+
+def content_hash(text):
+    return hashlib.sha256(f'{RENDERER_VERSION}:{text}'.encode()).hexdigest()
+
+
+def is_safe_url(url):
+    """Адрес без схемы (относительный) или со схемой из SAFE_SCHEMES."""
+    scheme = URL_SCHEME.match(URL_IGNORED.sub('', url))
+    return scheme is None or scheme.group(1).lower() in SAFE_SCHEMES
+
+
+def _drop_unsafe_links(root):
+    for element in root.iter():
+        if element.tag == 'a' and not is_safe_url(element.get('href', '')):
+            element.tag = 'span'
+            element.attrib.clear()
+        elif element.tag == 'img' and not is_safe_url(element.get('src', '')):
+            element.tag = 'span'
+            element.text = element.get('alt', '')
+            element.attrib.clear()
+
+
+def render_markdown(text):
+    import markdown
+    from markdown.treeprocessors import Treeprocessor
+
+    class SafeLinks(Treeprocessor):
+        def run(self, root):
+            _drop_unsafe_links(root)
+
+    md = markdown.Markdown(extensions=EXTENSIONS, extension_configs=EXTENSION_CONFIGS)
+    md.preprocessors.deregister('html_block')
+    md.inlinePatterns.deregister('html')
+    # После 'unescape' (приоритет 0): к этому моменту адреса окончательные
+    md.treeprocessors.register(SafeLinks(md), 'safe_links', -1)
+    return md.convert(text)
+
+
+def pygments_css():
+    """CSS для подсветки кода; лежит в static/bazaznaniy/css/pygments.css."""
+    from pygments.formatters import HtmlFormatter
+
+    return HtmlFormatter(style=PYGMENTS_STYLE).get_style_defs(f'.{CODE_CSS_CLASS}')
@@ -0,0 +1,145 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.template.base import Template
+
+from . import perf
+
+logger = logging.getLogger('bazaznaniy.perf')
+
+_current = ContextVar('bazaznaniy_request_stats', default=None)
+
+
+class RequestStats:
+    """Счётчики одного запроса; сам объект служит обёрткой execute_wrapper."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+        self.in_template = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+
+def _install_template_timer():
+    """Оборачивает Template.render, чтобы учитывать время внешнего рендеринга."""
+    original = Template.render
+    if getattr(original, 'bazaznaniy_timed', False):
+        return
+
+    def render(self, context):
+        stats = _current.get()
+        if stats is None or stats.in_template:
+            return original(self, context)
+        stats.in_template = True
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.in_template = False
+
+    render.bazaznaniy_timed = True
+    Template.render = render
+
+
+class PerformanceMiddleware:
+    """Замеряет запросы к БД, время SQL и шаблонов для каждого запроса.
+
+    Результат уходит в заголовок Server-Timing, в лог `bazaznaniy.perf`
+    строкой JSON и в кольцевой буфер по имени URL (см. perf.py).
+
+    Тело StreamingHttpResponse читается уже после выхода из middleware,
+    поэтому счётчики остаются включёнными, пока поток не закончится, и
+    лог с буфером пишутся в конце потока. Заголовок уходит раньше тела —
+    в нём только то, что было до начала потока (desc="... before body").
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _install_template_timer()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        started = time.perf_counter()
+        with _measuring(stats):
+            response = self.get_response(request)
+        streamed = response.streaming and not response.is_async
+        response['Server-Timing'] = _server_timing(stats, started, partial=response.streaming)
+        if streamed:
+            response.streaming_content = self._measured(response.streaming_content, request, response,
+                                                        stats, started)
+        else:
+            # Асинхронный поток не оборачиваем: его замер неполный
+            _report(request, response, stats, started)
+        return response
+
+    def _measured(self, chunks, request, response, stats, started):
+        try:
+            with _measuring(stats):
+                yield from chunks
+        finally:
+            # И при обрыве соединения: сервер закрывает поток через response.close()
+            _report(request, response, stats, started)
+
+
+@contextmanager
+def _measuring(stats):
+    token = _current.set(stats)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            yield
+    finally:
+        _current.reset(token)
+
+
+def _server_timing(stats, started, partial=False):
+    total_ms = (time.perf_counter() - started) * 1000
+    note = ', before body' if partial else ''
+    return ', '.join([
+        f'sql;dur={stats.sql_time * 1000:.2f};desc="{stats.queries} queries, {stats.duplicates} duplicated{note}"',
+        f'tpl;dur={stats.template_time * 1000:.2f}',
+        f'total;dur={total_ms:.2f}',
+    ])
+
+
+def _report(request, response, stats, started):
+    total_ms = (time.perf_counter() - started) * 1000
+    sql_ms = stats.sql_time * 1000
+    template_ms = stats.template_time * 1000
+    match = request.resolver_match
+    url_name = match.view_name if match else None
+    logger.info(json.dumps({
+        'url_name': url_name,
+        'path': request.path,
+        'method': request.method,
+        'status': response.status_code,
+        'streamed': response.streaming,
+        'partial': response.streaming and response.is_async,
+        'total_ms': round(total_ms, 2),
+        'queries': stats.queries,
+        'sql_ms': round(sql_ms, 2),
+        'template_ms': round(template_ms, 2),
+        'duplicate_queries': stats.duplicates,
+    }, ensure_ascii=False))
+    perf.record(url_name, total_ms, stats.queries, sql_ms, template_ms, stats.duplicates)
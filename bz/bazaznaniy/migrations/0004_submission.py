@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0003_tip'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Submission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answers', models.JSONField(default=dict, verbose_name='Ответы')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Проверяется'), ('done', 'Проверен'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('score', models.IntegerField(default=0, verbose_name='Набрано баллов')),
+                ('total_points', models.IntegerField(default=0, verbose_name='Всего баллов')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата отправки')),
+                ('graded_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата проверки')),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='bazaznaniy.topic', verbose_name='Тема')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Отправленный тест',
+                'verbose_name_plural': 'Отправленные тесты',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'id'], name='bazaznaniy__status_59a9d8_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0004_submission'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LanguageProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_topics', models.IntegerField(default=0, verbose_name='Пройдено тем')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('language', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_rollups', to='bazaznaniy.language', verbose_name='Язык программирования')),
+                ('sector', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='bazaznaniy.sector', verbose_name='Отрасль')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='language_progress', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Прогресс по языку',
+                'verbose_name_plural': 'Прогресс по языкам',
+                'indexes': [models.Index(fields=['user', 'sector'], name='bazaznaniy__user_id_f4cb45_idx')],
+                'unique_together': {('user', 'language')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SectorProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_topics', models.IntegerField(default=0, verbose_name='Пройдено тем')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('sector', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_rollups', to='bazaznaniy.sector', verbose_name='Отрасль')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sector_progress', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Прогресс по отрасли',
+                'verbose_name_plural': 'Прогресс по отраслям',
+                'unique_together': {('user', 'sector')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:49
+
+from django.db import migrations, models
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat
+
+
+def fill_codes(apps, schema_editor):
+    Question = apps.get_model('bazaznaniy', 'Question')
+    Question.objects.filter(code='').update(
+        code=Concat(Value('q'), Cast(F('id'), CharField()), output_field=CharField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0006_search_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='code',
+            field=models.CharField(blank=True, help_text='Уникальный в теме ключ для импорта; заполняется автоматически', max_length=64, verbose_name='Код'),
+        ),
+        migrations.RunPython(fill_codes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='question',
+            unique_together={('topic', 'code')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0007_question_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='seed',
+            field=models.BigIntegerField(blank=True, help_text='Зерно выборки вопросов, если тема берёт их из пула', null=True, verbose_name='Вариант'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='questions_per_test',
+            field=models.PositiveIntegerField(default=0, help_text='Сколько вопросов случайно выбирать из пула для каждой попытки (ответы тоже перемешиваются); 0 — все активные вопросы', verbose_name='Вопросов в тесте'),
+        ),
+    ]
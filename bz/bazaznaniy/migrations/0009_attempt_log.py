@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0008_topic_question_pool'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='bazaznaniy.question', verbose_name='Вопрос')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Ответов')),
+                ('correct', models.IntegerField(default=0, verbose_name='Верных ответов')),
+                ('score_sum', models.FloatField(default=0, verbose_name='Сумма долей попыток')),
+                ('score_sq_sum', models.FloatField(default=0, verbose_name='Сумма квадратов долей попыток')),
+                ('correct_score_sum', models.FloatField(default=0, verbose_name='Сумма долей попыток с верным ответом')),
+            ],
+            options={
+                'verbose_name': 'Статистика вопроса',
+                'verbose_name_plural': 'Статистика вопросов',
+            },
+        ),
+        migrations.CreateModel(
+            name='Attempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seed', models.BigIntegerField(blank=True, null=True, verbose_name='Вариант')),
+                ('score', models.IntegerField(default=0, verbose_name='Набрано баллов')),
+                ('total_points', models.IntegerField(default=0, verbose_name='Всего баллов')),
+                ('answers', models.BinaryField(default=bytes, verbose_name='Ответы (упакованные)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата попытки')),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='bazaznaniy.topic', verbose_name='Тема')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Попытка',
+                'verbose_name_plural': 'Попытки',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'topic', 'created_at'], name='bazaznaniy__user_id_cdd314_idx'), models.Index(fields=['topic', 'created_at'], name='bazaznaniy__topic_i_9d38b3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0009_attempt_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ranking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('topic', 'Тема'), ('language', 'Язык'), ('sector', 'Отрасль')], max_length=10, verbose_name='Уровень')),
+                ('scope_id', models.IntegerField(verbose_name='ID темы, языка или отрасли')),
+                ('points', models.IntegerField(default=0, verbose_name='Баллы')),
+                ('reached_at', models.DateTimeField(verbose_name='Когда набраны баллы')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Строка рейтинга',
+                'verbose_name_plural': 'Рейтинг',
+                'indexes': [models.Index(fields=['scope', 'scope_id', '-points', 'reached_at'], name='ranking_order_idx')],
+                'unique_together': {('scope', 'scope_id', 'user')},
+            },
+        ),
+    ]
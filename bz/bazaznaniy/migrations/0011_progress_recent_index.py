@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0010_ranking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=models.Index(fields=['user', '-last_attempt_at', '-id'], name='progress_recent_idx'),
+        ),
+    ]
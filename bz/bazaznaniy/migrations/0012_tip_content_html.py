@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:00
+
+from django.db import migrations, models
+
+from bazaznaniy.markup import content_hash, render_markdown
+
+
+def render_tips(apps, schema_editor):
+    Tip = apps.get_model('bazaznaniy', 'Tip')
+    tips = list(Tip.objects.only('id', 'content'))
+    for tip in tips:
+        tip.content_html = render_markdown(tip.content)
+        tip.content_hash = content_hash(tip.content)
+    Tip.objects.bulk_update(tips, ['content_html', 'content_hash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0011_progress_recent_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tip',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хэш текста'),
+        ),
+        migrations.AddField(
+            model_name='tip',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML совета'),
+        ),
+        migrations.AlterField(
+            model_name='tip',
+            name='content',
+            field=models.TextField(help_text='Основной текст совета в формате Markdown; код — в блоках ``` с указанием языка', verbose_name='Содержание совета'),
+        ),
+        migrations.RunPython(render_tips, migrations.RunPython.noop),
+    ]
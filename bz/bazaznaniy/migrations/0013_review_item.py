@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0012_tip_content_html'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('easiness', models.FloatField(default=2.5, verbose_name='Лёгкость (EF)')),
+                ('interval', models.IntegerField(default=0, verbose_name='Интервал, дней')),
+                ('repetitions', models.IntegerField(default=0, verbose_name='Верных ответов подряд')),
+                ('due_at', models.DateTimeField(verbose_name='Повторить после')),
+                ('reviewed_at', models.DateTimeField(verbose_name='Последний ответ')),
+                ('last_attempt_id', models.BigIntegerField(default=0, verbose_name='Последняя учтённая попытка')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_items', to='bazaznaniy.question', verbose_name='Вопрос')),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_items', to='bazaznaniy.topic', verbose_name='Тема')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_items', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Повторение вопроса',
+                'verbose_name_plural': 'Повторение вопросов',
+                'indexes': [models.Index(fields=['user', 'due_at'], name='review_due_idx')],
+                'unique_together': {('user', 'question')},
+            },
+        ),
+    ]
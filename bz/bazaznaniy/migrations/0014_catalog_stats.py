@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_stats(apps, schema_editor):
+    Topic = apps.get_model('bazaznaniy', 'Topic')
+    Question = apps.get_model('bazaznaniy', 'Question')
+    UserProgress = apps.get_model('bazaznaniy', 'UserProgress')
+    TopicStats = apps.get_model('bazaznaniy', 'TopicStats')
+    LanguageStats = apps.get_model('bazaznaniy', 'LanguageStats')
+
+    stats = {
+        topic_id: TopicStats(topic_id=topic_id)
+        for topic_id in Topic.objects.values_list('pk', flat=True)
+    }
+    content = (
+        Question.objects.filter(is_active=True).order_by().values('topic_id')
+        .annotate(n=Count('pk'), points=Sum('points')).values_list('topic_id', 'n', 'points')
+    )
+    for topic_id, count, points in content:
+        stats[topic_id].question_count = count
+        stats[topic_id].max_score = points or 0
+    rows = UserProgress.objects.values_list('topic_id', 'score', 'max_score', 'is_completed')
+    for topic_id, score, max_score, is_completed in rows.iterator(chunk_size=2000):
+        row = stats[topic_id]
+        row.results += 1
+        row.completed += int(is_completed)
+        row.percentage_sum += score / max_score * 100 if max_score > 0 else 0.0
+    TopicStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+    languages = {}
+    active = Topic.objects.filter(is_active=True).values_list('pk', 'lang_id')
+    for topic_id, lang_id in active:
+        row = stats[topic_id]
+        language = languages.setdefault(lang_id, LanguageStats(language_id=lang_id))
+        language.topic_count += 1
+        for field in ['question_count', 'max_score', 'results', 'completed', 'percentage_sum']:
+            setattr(language, field, getattr(language, field) + getattr(row, field))
+    LanguageStats.objects.bulk_create(languages.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0013_review_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LanguageStats',
+            fields=[
+                ('language', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='bazaznaniy.language', verbose_name='Язык программирования')),
+                ('topic_count', models.IntegerField(default=0, verbose_name='Активных тем')),
+                ('question_count', models.IntegerField(default=0, verbose_name='Активных вопросов')),
+                ('max_score', models.IntegerField(default=0, verbose_name='Сумма баллов вопросов')),
+                ('results', models.IntegerField(default=0, verbose_name='Результатов пользователей')),
+                ('completed', models.IntegerField(default=0, verbose_name='Пройдено тем')),
+                ('percentage_sum', models.FloatField(default=0, verbose_name='Сумма процентов результатов')),
+            ],
+            options={
+                'verbose_name': 'Статистика языка',
+                'verbose_name_plural': 'Статистика языков',
+            },
+        ),
+        migrations.CreateModel(
+            name='TopicStats',
+            fields=[
+                ('topic', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='bazaznaniy.topic', verbose_name='Тема')),
+                ('question_count', models.IntegerField(default=0, verbose_name='Активных вопросов')),
+                ('max_score', models.IntegerField(default=0, verbose_name='Сумма баллов вопросов')),
+                ('results', models.IntegerField(default=0, verbose_name='Результатов пользователей')),
+                ('completed', models.IntegerField(default=0, verbose_name='Прошли тему')),
+                ('percentage_sum', models.FloatField(default=0, verbose_name='Сумма процентов результатов')),
+            ],
+            options={
+                'verbose_name': 'Статистика темы',
+                'verbose_name_plural': 'Статистика тем',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
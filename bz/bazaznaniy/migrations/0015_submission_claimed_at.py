@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0014_catalog_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, help_text='Задачу в статусе «Проверяется» дольше GRADING_LEASE_SECONDS заберёт другой обработчик', null=True, verbose_name='Взят обработчиком'),
+        ),
+    ]
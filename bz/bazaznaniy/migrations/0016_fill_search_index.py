@@ -0,0 +1,53 @@
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+FTS_TABLE = 'bazaznaniy_search_fts'
+CHUNK_SIZE = 2000
+
+
+def fill_index(apps, schema_editor):
+    """Заполняет индекс поиска контентом, созданным до 0006_search_entry.
+
+    Сигналы индексируют только новые правки, поэтому без этого шага поиск
+    по уже существующим темам, вопросам и советам ничего не находит.
+    """
+    db = schema_editor.connection.alias
+    SearchEntry = apps.get_model('bazaznaniy', 'SearchEntry')
+    sources = [
+        (apps.get_model('bazaznaniy', 'Topic').objects.using(db).filter(is_active=True),
+         'topic', lambda topic: (topic.pk, topic.name, topic.description)),
+        (apps.get_model('bazaznaniy', 'Question').objects.using(db).filter(is_active=True, topic__is_active=True),
+         'question', lambda question: (question.topic_id, question.text, '')),
+        (apps.get_model('bazaznaniy', 'Tip').objects.using(db).filter(is_active=True, topic__is_active=True),
+         'tip', lambda tip: (tip.topic_id, tip.title, tip.content)),
+    ]
+    SearchEntry.objects.using(db).all().delete()
+    for queryset, kind, fields in sources:
+        chunk = []
+        for obj in queryset.order_by('pk').iterator(chunk_size=CHUNK_SIZE):
+            topic_id, title, body = fields(obj)
+            chunk.append(SearchEntry(kind=kind, object_id=obj.pk, topic_id=topic_id, title=title[:300], body=body))
+            if len(chunk) >= CHUNK_SIZE:
+                SearchEntry.objects.using(db).bulk_create(chunk)
+                chunk = []
+        SearchEntry.objects.using(db).bulk_create(chunk)
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        SearchEntry.objects.using(db).update(search_vector=(
+            SearchVector('title', weight='A', config='russian')
+            + SearchVector('body', weight='B', config='russian')
+        ))
+    elif vendor == 'sqlite':
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0015_submission_claimed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
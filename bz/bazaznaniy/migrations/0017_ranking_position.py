@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0016_fill_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ranking',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, help_text='Обновляется командой refresh_rankings', null=True, verbose_name='Место при последнем пересчёте'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bazaznaniy', '0017_ranking_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='question_ids',
+            field=models.JSONField(blank=True, help_text='id выданных вопросов в порядке выдачи', null=True, verbose_name='Вопросы варианта'),
+        ),
+    ]
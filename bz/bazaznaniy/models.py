@@ -1,8 +1,13 @@
+import uuid
+
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils.text import slugify
 
+from .markup import content_hash, render_markdown
+
 class Sector(models.Model):
     name = models.CharField('Название', max_length=200)
     slug = models.SlugField('URL', unique=True, max_length=200, blank=True)
@@ -65,6 +70,10 @@ class Topic(models.Model):
     icon = models.CharField('Иконка', max_length=50, blank=True,
                             help_text='Название иконки или emoji')
     order = models.IntegerField('Порядок отображения', default=0)
+    questions_per_test = models.PositiveIntegerField(
+        'Вопросов в тесте', default=0,
+        help_text='Сколько вопросов случайно выбирать из пула для каждой попытки '
+                  '(ответы тоже перемешиваются); 0 — все активные вопросы')
     is_active = models.BooleanField('Активен', default=True)
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     
@@ -98,6 +107,8 @@ class Question(models.Model):
     
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, 
                              related_name='questions', verbose_name='Тема')
+    code = models.CharField('Код', max_length=64, blank=True,
+                            help_text='Уникальный в теме ключ для импорта; заполняется автоматически')
     text = models.TextField('Текст вопроса')
     question_type = models.CharField('Тип вопроса', max_length=20, 
                                     choices=QUESTION_TYPES, default='single')
@@ -109,10 +120,16 @@ class Question(models.Model):
         verbose_name = 'Вопрос'
         verbose_name_plural = 'Вопросы'
         ordering = ['topic', 'order']
+        unique_together = ['topic', 'code']
     
     def __str__(self):
         return f"Вопрос {self.order}: {self.text[:50]}"
 
+    def save(self, *args, **kwargs):
+        if not self.code:
+            self.code = uuid.uuid4().hex[:12]
+        super().save(*args, **kwargs)
+
 class Answer(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, 
                                 related_name='answers', verbose_name='Вопрос')
@@ -146,6 +163,9 @@ class UserProgress(models.Model):
         verbose_name_plural = 'Прогресс пользователей'
         unique_together = ['user', 'topic']
         ordering = ['-last_attempt_at']
+        indexes = [
+            models.Index(fields=['user', '-last_attempt_at', '-id'], name='progress_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.topic.name}"
@@ -163,7 +183,10 @@ class Tip(models.Model):
                             related_name='tips', verbose_name='Тема')
     title = models.CharField('Заголовок совета', max_length=200)
     content = models.TextField('Содержание совета',
-                             help_text='Основной текст совета с форматированием')
+                             help_text='Основной текст совета в формате Markdown; '
+                                       'код — в блоках ``` с указанием языка')
+    content_html = models.TextField('HTML совета', blank=True, editable=False)
+    content_hash = models.CharField('Хэш текста', max_length=64, blank=True, editable=False)
     order = models.IntegerField('Порядок отображения', default=0,
                               help_text='Чем меньше число, тем выше в списке')
     is_active = models.BooleanField('Активен', default=True)
@@ -179,4 +202,351 @@ class Tip(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.title} ({self.topic.name})"
\ No newline at end of file
+        return f"{self.title} ({self.topic.name})"
+
+    def render_content(self, force=False):
+        """Перерисовывает content_html, если текст или отрисовщик изменились."""
+        digest = content_hash(self.content)
+        if force or digest != self.content_hash:
+            self.content_html = render_markdown(self.content)
+            self.content_hash = digest
+            return True
+        return False
+
+    def save(self, *args, **kwargs):
+        if self.render_content() and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'content_html', 'content_hash'}
+        super().save(*args, **kwargs)
+
+class Submission(models.Model):
+    """Отправленный тест, ожидающий проверки фоновым обработчиком."""
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUSES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_PROCESSING, 'Проверяется'),
+        (STATUS_DONE, 'Проверен'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='submissions', verbose_name='Пользователь')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE,
+                              related_name='submissions', verbose_name='Тема')
+    answers = models.JSONField('Ответы', default=dict)
+    seed = models.BigIntegerField('Вариант', null=True, blank=True,
+                                  help_text='Зерно выборки вопросов, если тема берёт их из пула')
+    question_ids = models.JSONField('Вопросы варианта', null=True, blank=True,
+                                    help_text='id выданных вопросов в порядке выдачи')
+    status = models.CharField('Статус', max_length=20, choices=STATUSES, default=STATUS_PENDING)
+    score = models.IntegerField('Набрано баллов', default=0)
+    total_points = models.IntegerField('Всего баллов', default=0)
+    error = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Дата отправки', auto_now_add=True)
+    claimed_at = models.DateTimeField('Взят обработчиком', null=True, blank=True,
+                                      help_text='Задачу в статусе «Проверяется» дольше '
+                                                'GRADING_LEASE_SECONDS заберёт другой обработчик')
+    graded_at = models.DateTimeField('Дата проверки', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Отправленный тест'
+        verbose_name_plural = 'Отправленные тесты'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.topic.name} ({self.get_status_display()})"
+
+    @property
+    def percentage(self):
+        if self.total_points > 0:
+            return self.score / self.total_points * 100
+        return 0
+
+
+class LanguageProgress(models.Model):
+    """Сводный прогресс пользователя по языку: число пройденных тем.
+
+    Денормализация UserProgress, обновляется при изменении прогресса
+    (см. progress.py). Процент считается по числу активных тем языка.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='language_progress', verbose_name='Пользователь')
+    sector = models.ForeignKey(Sector, on_delete=models.CASCADE,
+                               related_name='+', verbose_name='Отрасль')
+    language = models.ForeignKey(Language, on_delete=models.CASCADE,
+                                 related_name='user_rollups', verbose_name='Язык программирования')
+    completed_topics = models.IntegerField('Пройдено тем', default=0)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Прогресс по языку'
+        verbose_name_plural = 'Прогресс по языкам'
+        unique_together = ['user', 'language']
+        indexes = [
+            models.Index(fields=['user', 'sector']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.language.name}"
+
+
+class SectorProgress(models.Model):
+    """Сводный прогресс пользователя по отрасли: число пройденных тем."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='sector_progress', verbose_name='Пользователь')
+    sector = models.ForeignKey(Sector, on_delete=models.CASCADE,
+                               related_name='user_rollups', verbose_name='Отрасль')
+    completed_topics = models.IntegerField('Пройдено тем', default=0)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Прогресс по отрасли'
+        verbose_name_plural = 'Прогресс по отраслям'
+        unique_together = ['user', 'sector']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.sector.name}"
+
+
+
+class SearchEntry(models.Model):
+    """Запись поискового индекса по темам, вопросам и советам.
+
+    На PostgreSQL ищется по search_vector (GIN-индекс, русская морфология),
+    на SQLite — по FTS5-таблице bazaznaniy_search_fts (см. search.py).
+    """
+    KIND_TOPIC = 'topic'
+    KIND_QUESTION = 'question'
+    KIND_TIP = 'tip'
+    KINDS = [
+        (KIND_TOPIC, 'Тема'),
+        (KIND_QUESTION, 'Вопрос'),
+        (KIND_TIP, 'Совет'),
+    ]
+
+    kind = models.CharField('Тип', max_length=20, choices=KINDS)
+    object_id = models.BigIntegerField('ID объекта')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE,
+                              related_name='+', verbose_name='Тема')
+    title = models.CharField('Заголовок', max_length=300)
+    body = models.TextField('Текст', blank=True)
+    search_vector = SearchVectorField(null=True)
+
+    class Meta:
+        verbose_name = 'Запись поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+        unique_together = ['kind', 'object_id']
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
+
+
+class Attempt(models.Model):
+    """Одна попытка прохождения теста; журнал только пополняется.
+
+    Выбранные ответы хранятся одной упакованной строкой байтов на попытку
+    (формат — в attempts.py), а не строкой на каждый ответ.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='attempts', verbose_name='Пользователь')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE,
+                              related_name='attempts', verbose_name='Тема')
+    seed = models.BigIntegerField('Вариант', null=True, blank=True)
+    score = models.IntegerField('Набрано баллов', default=0)
+    total_points = models.IntegerField('Всего баллов', default=0)
+    answers = models.BinaryField('Ответы (упакованные)', default=bytes)
+    created_at = models.DateTimeField('Дата попытки', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Попытка'
+        verbose_name_plural = 'Попытки'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'topic', 'created_at']),
+            models.Index(fields=['topic', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.topic.name} ({self.score}/{self.total_points})"
+
+    @property
+    def percentage(self):
+        if self.total_points > 0:
+            return self.score / self.total_points * 100
+        return 0
+
+
+class QuestionStats(models.Model):
+    """Накопительные счётчики по вопросу для анализа теста.
+
+    Обновляются прибавлением при записи каждой пачки попыток (attempts.py),
+    поэтому трудность и дискриминативность считаются без чтения журнала.
+    Доля попытки — score / total_points всей попытки, от 0 до 1.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='stats', verbose_name='Вопрос')
+    attempts = models.IntegerField('Ответов', default=0)
+    correct = models.IntegerField('Верных ответов', default=0)
+    score_sum = models.FloatField('Сумма долей попыток', default=0)
+    score_sq_sum = models.FloatField('Сумма квадратов долей попыток', default=0)
+    correct_score_sum = models.FloatField('Сумма долей попыток с верным ответом', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика вопроса'
+        verbose_name_plural = 'Статистика вопросов'
+
+    def __str__(self):
+        return str(self.question)
+
+    @property
+    def difficulty(self):
+        """Доля верных ответов (p): чем меньше, тем труднее вопрос."""
+        if self.attempts == 0:
+            return None
+        return self.correct / self.attempts
+
+    @property
+    def discrimination(self):
+        """Точечно-бисериальная корреляция верного ответа с результатом попытки."""
+        n, n1 = self.attempts, self.correct
+        if n1 == 0 or n1 == n:
+            return None
+        mean = self.score_sum / n
+        variance = self.score_sq_sum / n - mean ** 2
+        if variance <= 1e-12:
+            return None
+        mean_correct = self.correct_score_sum / n1
+        mean_wrong = (self.score_sum - self.correct_score_sum) / (n - n1)
+        p = n1 / n
+        return (mean_correct - mean_wrong) / variance ** 0.5 * (p * (1 - p)) ** 0.5
+
+
+class TopicStats(models.Model):
+    """Готовые цифры темы для списков: вопросы, баллы, средний результат.
+
+    Число вопросов и баллы пересчитываются при изменении вопросов темы,
+    счётчики результатов прибавляются при записи каждой пачки результатов
+    (см. catalog_stats.py). Процент результата — score / max_score строки
+    UserProgress.
+    """
+    topic = models.OneToOneField(Topic, on_delete=models.CASCADE, primary_key=True,
+                                 related_name='stats', verbose_name='Тема')
+    question_count = models.IntegerField('Активных вопросов', default=0)
+    max_score = models.IntegerField('Сумма баллов вопросов', default=0)
+    results = models.IntegerField('Результатов пользователей', default=0)
+    completed = models.IntegerField('Прошли тему', default=0)
+    percentage_sum = models.FloatField('Сумма процентов результатов', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика темы'
+        verbose_name_plural = 'Статистика тем'
+
+    def __str__(self):
+        return str(self.topic)
+
+    @property
+    def average_percentage(self):
+        if self.results == 0:
+            return None
+        return self.percentage_sum / self.results
+
+
+class LanguageStats(models.Model):
+    """Сумма TopicStats по активным темам языка — для страницы отрасли."""
+    language = models.OneToOneField(Language, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='stats', verbose_name='Язык программирования')
+    topic_count = models.IntegerField('Активных тем', default=0)
+    question_count = models.IntegerField('Активных вопросов', default=0)
+    max_score = models.IntegerField('Сумма баллов вопросов', default=0)
+    results = models.IntegerField('Результатов пользователей', default=0)
+    completed = models.IntegerField('Пройдено тем', default=0)
+    percentage_sum = models.FloatField('Сумма процентов результатов', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика языка'
+        verbose_name_plural = 'Статистика языков'
+
+    def __str__(self):
+        return str(self.language)
+
+    @property
+    def average_percentage(self):
+        if self.results == 0:
+            return None
+        return self.percentage_sum / self.results
+
+
+class Ranking(models.Model):
+    """Строка рейтинга: лучшие баллы пользователя в теме, языке или отрасли.
+
+    Для темы — лучший результат попытки, для языка и отрасли — сумма
+    лучших результатов по их темам. Таблица поддерживается при проверке
+    тестов (см. leaderboard.py), место считается по индексу
+    (scope, scope_id, -points, reached_at), а далеко от вершины берётся из
+    position, которую периодически пересчитывает refresh_rankings.
+    """
+    SCOPE_TOPIC = 'topic'
+    SCOPE_LANGUAGE = 'language'
+    SCOPE_SECTOR = 'sector'
+    SCOPES = [
+        (SCOPE_TOPIC, 'Тема'),
+        (SCOPE_LANGUAGE, 'Язык'),
+        (SCOPE_SECTOR, 'Отрасль'),
+    ]
+
+    scope = models.CharField('Уровень', max_length=10, choices=SCOPES)
+    scope_id = models.IntegerField('ID темы, языка или отрасли')
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='rankings', verbose_name='Пользователь')
+    points = models.IntegerField('Баллы', default=0)
+    reached_at = models.DateTimeField('Когда набраны баллы')
+    position = models.PositiveIntegerField('Место при последнем пересчёте', null=True, blank=True,
+                                           help_text='Обновляется командой refresh_rankings')
+
+    class Meta:
+        verbose_name = 'Строка рейтинга'
+        verbose_name_plural = 'Рейтинг'
+        unique_together = ['scope', 'scope_id', 'user']
+        indexes = [
+            models.Index(fields=['scope', 'scope_id', '-points', 'reached_at'], name='ranking_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_scope_display()} #{self.scope_id}: {self.user.username} — {self.points}"
+
+
+class ReviewItem(models.Model):
+    """Расписание повторения вопроса пользователем по алгоритму SM-2.
+
+    Пересчитывается ночной командой schedule_reviews по журналу попыток
+    и сразу после ответа в режиме повторения (см. review.py). Вопросы
+    «к повторению» — диапазон по индексу (user, due_at).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='review_items', verbose_name='Пользователь')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE,
+                                 related_name='review_items', verbose_name='Вопрос')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE,
+                              related_name='review_items', verbose_name='Тема')
+    easiness = models.FloatField('Лёгкость (EF)', default=2.5)
+    interval = models.IntegerField('Интервал, дней', default=0)
+    repetitions = models.IntegerField('Верных ответов подряд', default=0)
+    due_at = models.DateTimeField('Повторить после')
+    reviewed_at = models.DateTimeField('Последний ответ')
+    last_attempt_id = models.BigIntegerField('Последняя учтённая попытка', default=0)
+
+    class Meta:
+        verbose_name = 'Повторение вопроса'
+        verbose_name_plural = 'Повторение вопросов'
+        unique_together = ['user', 'question']
+        indexes = [
+            models.Index(fields=['user', 'due_at'], name='review_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - вопрос #{self.question_id} ({self.due_at:%d.%m.%Y})"
@@ -0,0 +1,150 @@
+"""Прохождение тестов без сети и пакетная синхронизация ответов.
+
+Страница теста в режиме без сети — лёгкая оболочка: в ней только список
+вопросов варианта и подписанный токен варианта (пользователь, тема,
+зерно, id вопросов). Сами вопросы браузер берёт из пакета темы (api.topic_bundle),
+который вместе с оболочкой хранит service worker. Ответы копятся в
+localStorage и уходят одним POST на /api/sync/, где проверяются одним
+вызовом grade_submissions (или одной вставкой в очередь при
+ASYNC_GRADING).
+
+Зерно варианта лежит в подписанном токене, а не в сессии, поэтому
+оболочка из кэша остаётся рабочей и после синхронизации. Повторная
+отправка той же попытки отсекается ключом идемпотентности, частота —
+тем же token bucket, что и у обычной формы (см. throttling.py).
+
+Очередь ответов в браузере своя у каждого пользователя (id в атрибуте
+data-user оболочки). Попытка с вариантом другого пользователя получает
+статус foreign, а не invalid: браузер не удаляет её, а отправит, когда
+войдёт её владелец.
+"""
+import math
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+from . import throttling
+from .catalog import get_catalog
+from .grading import StaleVariant, SubmittedAnswers, get_answer_key, grade_submissions
+from .grading_queue import enqueue_many
+
+VARIANT_SALT = 'bazaznaniy.offline.variant'
+VARIANT_MAX_AGE = 7 * 24 * 3600
+MAX_BATCH = 50
+MAX_VALUES = 20
+
+
+class SyncError(Exception):
+    pass
+
+
+class ForeignVariant(SyncError):
+    """Вариант выдан другому пользователю."""
+
+
+def sign_variant(user_id, topic_id, seed, key):
+    """Токен варианта `key` (см. AnswerKey.draw): вопросы проверяются ровно те, что выданы."""
+    return signing.dumps({'u': user_id, 't': topic_id, 's': seed, 'q': [question.id for question in key.questions]},
+                         salt=VARIANT_SALT, compress=True)
+
+
+def unsign_variant(token, user_id):
+    """(topic_id, seed, question_ids) из токена варианта; SyncError, если токен чужой или испорчен.
+
+    question_ids — None у токенов, выданных до подписи id вопросов.
+    """
+    try:
+        data = signing.loads(token, salt=VARIANT_SALT, max_age=VARIANT_MAX_AGE)
+    except (signing.BadSignature, TypeError):
+        raise SyncError('Неверный вариант теста')
+    if data.get('u') != user_id:
+        raise ForeignVariant('Вариант выдан другому пользователю')
+    return data['t'], data['s'], data.get('q')
+
+
+def _answers(key, raw):
+    """Ответы на вопросы варианта из JSON {"question_id": [значения]}."""
+    if not isinstance(raw, dict):
+        raise SyncError('Неверный формат ответов')
+    answers = {}
+    for question in key.questions:
+        values = raw.get(str(question.id), [])
+        if not isinstance(values, list):
+            values = [values]
+        answers[question.id] = [str(value) for value in values[:MAX_VALUES]]
+    return answers
+
+
+def _result(stored):
+    if 'submission_id' in stored:
+        return {'status': 'queued',
+                'result_url': reverse('submission_result', args=[stored['submission_id']])}
+    return {'status': 'graded', **stored}
+
+
+def sync_submissions(user_id, items):
+    """Проверяет пачку попыток из режима без сети.
+
+    items — список {"variant", "attempt_key", "answers"}. Возвращает
+    список результатов в том же порядке; попытки со статусом throttled
+    или pending клиент отправляет ещё раз позже, foreign — когда войдёт
+    владелец варианта.
+    """
+    if not isinstance(items, list) or len(items) > MAX_BATCH:
+        raise SyncError(f'Нужен список не длиннее {MAX_BATCH} попыток')
+
+    catalog = get_catalog()
+    results = [None] * len(items)
+    claimed = []
+    for index, item in enumerate(items):
+        attempt_key = item.get('attempt_key') if isinstance(item, dict) else None
+        if not throttling.valid_idempotency_key(attempt_key):
+            results[index] = {'attempt_key': attempt_key, 'status': 'invalid', 'error': 'Нет ключа попытки'}
+            continue
+        try:
+            topic_id, seed, question_ids = unsign_variant(item.get('variant'), user_id)
+            if catalog.topic_by_id(topic_id) is None:
+                raise SyncError('Тема недоступна')
+            answers = _answers(get_answer_key(topic_id).variant(seed, question_ids), item.get('answers'))
+        except ForeignVariant as exc:
+            results[index] = {'attempt_key': attempt_key, 'status': 'foreign', 'error': str(exc)}
+            continue
+        except (SyncError, StaleVariant) as exc:
+            results[index] = {'attempt_key': attempt_key, 'status': 'invalid', 'error': str(exc)}
+            continue
+
+        stored = throttling.claim(user_id, attempt_key)
+        if stored == throttling.PENDING:
+            results[index] = {'attempt_key': attempt_key, 'status': 'pending'}
+            continue
+        if stored is not None:
+            results[index] = {'attempt_key': attempt_key, **_result(stored)}
+            continue
+        retry_after = throttling.take_token(user_id, topic_id)
+        if retry_after:
+            throttling.release(user_id, attempt_key)
+            results[index] = {'attempt_key': attempt_key, 'status': 'throttled',
+                              'retry_after': math.ceil(retry_after)}
+            continue
+        claimed.append((index, attempt_key, SubmittedAnswers(user_id, topic_id, answers, seed, question_ids)))
+
+    if not claimed:
+        return results
+    submissions = [submission for _, _, submission in claimed]
+    try:
+        if settings.ASYNC_GRADING:
+            stored = [{'submission_id': submission.pk} for submission in enqueue_many(submissions)]
+        else:
+            stored = [
+                {'score': result.score, 'total_points': result.total_points, 'percentage': result.percentage}
+                for result in grade_submissions(submissions)
+            ]
+    except Exception:
+        for _, attempt_key, _ in claimed:
+            throttling.release(user_id, attempt_key)
+        raise
+    for (index, attempt_key, _), value in zip(claimed, stored):
+        throttling.store_result(user_id, attempt_key, value)
+        results[index] = {'attempt_key': attempt_key, **_result(value)}
+    return results
@@ -0,0 +1,78 @@
+"""Кэш целых страниц каталога для анонимных посетителей.
+
+Ключ страницы и ETag строятся из версии каталога (см. catalog.py), так
+что изменение Sector/Language/Topic сразу делает устаревшими все
+сохранённые страницы. Страницы со статистикой тем и языков добавляют
+версию статистики (catalog_stats.STATS_VERSION) через `versions`, а
+счётчики результатов, которые растут с каждой попыткой и версий не
+сдвигают, — номер интервала через `refresh`.
+Условные GET-запросы получают 304 без рендеринга. Авторизованные
+пользователи получают страницу, собранную из кэшированных фрагментов
+шаблона ({% cache %} с теми же версиями).
+"""
+import hashlib
+import time
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .catalog import CATALOG_VERSION
+from .versions import get_version
+
+
+def _page_key(request, state):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'bz:page:{state}:{path}'
+
+
+def _set_validators(response, etag, last_modified):
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def cache_anonymous_page(view=None, versions=(CATALOG_VERSION,), refresh=None):
+    """Отдаёт анонимным посетителям сохранённую страницу и поддерживает 304.
+
+    versions — имена счётчиков версий, от которых зависит страница;
+    refresh — если задан, страница к тому же устаревает раз в столько секунд.
+    """
+    if view is None:
+        return partial(cache_anonymous_page, versions=versions, refresh=refresh)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        current = [get_version(name) for name in versions]
+        last_modified = max(current) // 1000
+        if refresh:
+            epoch = int(time.time()) // refresh
+            current.append(epoch)
+            last_modified = max(last_modified, epoch * refresh)
+        state = '-'.join(f'{version:x}' for version in current)
+        etag = quote_etag(state)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return _set_validators(not_modified, etag, last_modified)
+
+        key = _page_key(request, state)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return _set_validators(HttpResponse(content, content_type=content_type), etag, last_modified)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            timeout = min(settings.PAGE_CACHE_TIMEOUT, refresh) if refresh else settings.PAGE_CACHE_TIMEOUT
+            cache.set(key, (response.content, response['Content-Type']), timeout)
+            _set_validators(response, etag, last_modified)
+        return response
+    return wrapper
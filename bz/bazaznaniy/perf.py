@@ -0,0 +1,80 @@
+"""Сбор метрик запросов по именам URL.
+
+Каждый процесс держит кольцевой буфер последних замеров на каждое имя URL
+и время от времени сбрасывает его снимок в общий кэш, чтобы отчёт
+(`manage.py perf_report` или /perf/) видел все процессы сразу. Для
+perf_report нужен общий для процессов кэш (file, redis, memcached).
+"""
+import os
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+PIDS_KEY = 'bz:perf:pids'
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+_buffers = defaultdict(lambda: deque(maxlen=settings.PERF_BUFFER_SIZE))
+_lock = threading.Lock()
+_recorded = 0
+
+
+def record(url_name, total_ms, queries, sql_ms, template_ms, duplicates):
+    """Добавляет замер одного запроса в буфер процесса."""
+    global _recorded
+    with _lock:
+        _buffers[url_name or '<unresolved>'].append(
+            (round(total_ms, 3), queries, round(sql_ms, 3), round(template_ms, 3), duplicates)
+        )
+        _recorded += 1
+        flush = _recorded % settings.PERF_FLUSH_EVERY == 0
+    if flush:
+        flush_snapshot()
+
+
+def _snapshot():
+    with _lock:
+        return {name: list(samples) for name, samples in _buffers.items()}
+
+
+def flush_snapshot():
+    """Сохраняет буфер процесса в общий кэш."""
+    pid = os.getpid()
+    cache.set(f'bz:perf:{pid}', _snapshot(), SNAPSHOT_TIMEOUT)
+    pids = set(cache.get(PIDS_KEY) or ())
+    if pid not in pids:
+        pids.add(pid)
+        cache.set(PIDS_KEY, sorted(pids), SNAPSHOT_TIMEOUT)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def report():
+    """Сводка по всем процессам: на каждое имя URL — задержки, запросы, повторы SQL."""
+    own_pid = os.getpid()
+    other_pids = [pid for pid in cache.get(PIDS_KEY) or () if pid != own_pid]
+    snapshots = cache.get_many([f'bz:perf:{pid}' for pid in other_pids]).values()
+
+    samples = defaultdict(list)
+    for snapshot in [*snapshots, _snapshot()]:
+        for name, rows in snapshot.items():
+            samples[name].extend(rows)
+
+    result = {}
+    for name, rows in sorted(samples.items()):
+        totals = sorted(row[0] for row in rows)
+        count = len(rows)
+        result[name] = {
+            'requests': count,
+            'p50_ms': _percentile(totals, 0.5),
+            'p95_ms': _percentile(totals, 0.95),
+            'avg_queries': round(sum(row[1] for row in rows) / count, 1),
+            'max_queries': max(row[1] for row in rows),
+            'avg_sql_ms': round(sum(row[2] for row in rows) / count, 3),
+            'avg_template_ms': round(sum(row[3] for row in rows) / count, 3),
+            'duplicate_queries': sum(row[4] for row in rows),
+        }
+    return result
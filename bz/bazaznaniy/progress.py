@@ -0,0 +1,213 @@
+"""Сводный прогресс пользователей по языкам и отраслям.
+
+LanguageProgress и SectorProgress хранят число пройденных активных тем.
+Строки пересчитываются только для затронутых пар (пользователь, язык)
+в момент, когда тема впервые становится пройденной, поэтому страница
+отрасли читает все кольца прогресса одним индексным запросом.
+
+Скрытие или открытие темы (admin_tools.set_active, импорт) меняет число
+пройденных активных тем сразу у всех, кто её прошёл: для этого есть
+refresh_topic_rollups().
+
+Сводка для шапки личного кабинета (пройдено тем, средний процент)
+кэшируется по пользователю и сбрасывается сдвигом его версии при каждой
+записи прогресса. Ключи старых версий никто больше не читает, поэтому
+у записей конечный срок SUMMARY_TIMEOUT: иначе сводки ушедших
+пользователей и прошлых версий копились бы в кэше.
+"""
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Avg, Case, Count, DateTimeField, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Greatest
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .models import Language, LanguageProgress, SectorProgress, Topic, UserProgress
+from .versions import bump_version_on_commit, get_version
+
+CHUNK_SIZE = 2000
+SUMMARY_TIMEOUT = 24 * 60 * 60
+
+
+def percentage(completed, total):
+    if total > 0:
+        return min(100, round(completed / total * 100))
+    return 0
+
+
+def _completed_counts(group_by, **filters):
+    return (
+        UserProgress.objects
+        .filter(is_completed=True, topic__is_active=True, **filters)
+        .values('user_id', *group_by)
+        .annotate(completed=Count('id'))
+        .order_by()
+    )
+
+
+def refresh_rollups(pairs):
+    """Пересчитывает сводки для пар (user_id, topic_id)."""
+    catalog = get_catalog()
+    languages = set()
+    sectors = set()
+    for user_id, topic_id in pairs:
+        topic = catalog.topic_by_id(topic_id)
+        if topic is not None:
+            languages.add((user_id, topic.lang_id, topic.sector_id))
+            sectors.add((user_id, topic.sector_id))
+    _write_rollups(languages, sectors)
+
+
+def _write_rollups(languages, sectors):
+    """Пересчитывает строки (user_id, lang_id, sector_id) и (user_id, sector_id)."""
+    if not languages:
+        return
+
+    user_ids = {user_id for user_id, _ in sectors}
+    by_language = {
+        (row['user_id'], row['topic__lang_id']): row['completed']
+        for row in _completed_counts(['topic__lang_id'], user_id__in=user_ids,
+                                     topic__lang_id__in={lang_id for _, lang_id, _ in languages})
+    }
+    by_sector = {
+        (row['user_id'], row['topic__lang__sector_id']): row['completed']
+        for row in _completed_counts(['topic__lang__sector_id'], user_id__in=user_ids,
+                                     topic__lang__sector_id__in={sector_id for _, sector_id in sectors})
+    }
+    with transaction.atomic():
+        LanguageProgress.objects.bulk_create(
+            [
+                LanguageProgress(user_id=user_id, sector_id=sector_id, language_id=lang_id,
+                                 completed_topics=by_language.get((user_id, lang_id), 0))
+                for user_id, lang_id, sector_id in languages
+            ],
+            update_conflicts=True, unique_fields=['user', 'language'],
+            update_fields=['sector', 'completed_topics', 'updated_at'],
+        )
+        SectorProgress.objects.bulk_create(
+            [
+                SectorProgress(user_id=user_id, sector_id=sector_id,
+                               completed_topics=by_sector.get((user_id, sector_id), 0))
+                for user_id, sector_id in sectors
+            ],
+            update_conflicts=True, unique_fields=['user', 'sector'],
+            update_fields=['completed_topics', 'updated_at'],
+        )
+
+
+def refresh_topic_rollups(topic_ids):
+    """Пересчитывает сводки всех, кто прошёл темы `topic_ids`, и сбрасывает их сводки.
+
+    Язык и отрасль темы берутся из БД, а не из каталога: скрытой темы в
+    каталоге нет, а версия каталога сдвигается только после коммита.
+    """
+    topics = dict(Topic.objects.filter(pk__in=set(topic_ids)).values_list('pk', 'lang_id'))
+    if not topics:
+        return
+    lang_sectors = dict(Language.objects.filter(pk__in=set(topics.values())).values_list('pk', 'sector_id'))
+    pairs = list(
+        UserProgress.objects.filter(topic_id__in=topics, is_completed=True)
+        .order_by('user_id').values_list('user_id', 'topic_id').distinct()
+    )
+    for start in range(0, len(pairs), CHUNK_SIZE):
+        chunk = pairs[start:start + CHUNK_SIZE]
+        _write_rollups(
+            {(user_id, topics[topic_id], lang_sectors[topics[topic_id]]) for user_id, topic_id in chunk},
+            {(user_id, lang_sectors[topics[topic_id]]) for user_id, topic_id in chunk},
+        )
+        invalidate_summaries({user_id for user_id, _ in chunk})
+
+
+def discount_completed_topic(user_id, topic_id):
+    """Уменьшает сводки после удаления пройденной темы.
+
+    Только UPDATE: при каскадном удалении пользователя или темы строки
+    сводок удаляются вместе с ними, и вставлять ничего нельзя.
+    """
+    topic = get_catalog().topic_by_id(topic_id)
+    if topic is None:
+        return
+    decrement = Greatest(F('completed_topics') - 1, 0)
+    LanguageProgress.objects.filter(user_id=user_id, language_id=topic.lang_id).update(
+        completed_topics=decrement)
+    SectorProgress.objects.filter(user_id=user_id, sector_id=topic.sector_id).update(
+        completed_topics=decrement)
+
+
+def _insert_select(model, columns, queryset):
+    """INSERT INTO model (columns) SELECT ...: строки собирает и пишет сама база."""
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in columns)
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({names}) {sql}', params)
+        return cursor.rowcount
+
+
+def rebuild_rollups():
+    """Полностью пересобирает сводки: по одному INSERT ... SELECT ... GROUP BY на таблицу."""
+    now = Value(timezone.now(), output_field=DateTimeField())
+    with transaction.atomic():
+        LanguageProgress.objects.all().delete()
+        SectorProgress.objects.all().delete()
+        languages = _insert_select(
+            LanguageProgress, ['user', 'language', 'sector', 'completed_topics', 'updated_at'],
+            _completed_counts(['topic__lang_id', 'topic__lang__sector_id']).annotate(now=now),
+        )
+        sectors = _insert_select(
+            SectorProgress, ['user', 'sector', 'completed_topics', 'updated_at'],
+            _completed_counts(['topic__lang__sector_id']).annotate(now=now),
+        )
+    return languages, sectors
+
+
+def language_rings(user, sector):
+    """Пары (язык, процент) для страницы отрасли — один запрос к LanguageProgress."""
+    completed = {}
+    if user.is_authenticated:
+        completed = dict(
+            LanguageProgress.objects
+            .filter(user=user, sector_id=sector.id)
+            .values_list('language_id', 'completed_topics')
+        )
+    return [
+        (lang, percentage(completed.get(lang.id, 0), len(lang.topics)))
+        for lang in sector.languages
+    ]
+
+
+class ProgressSummary(NamedTuple):
+    completed_topics: int
+    attempted_topics: int
+    attempts: int
+    average_percentage: float
+
+
+def summary_version_name(user_id):
+    return f'progress:{user_id}'
+
+
+def invalidate_summaries(user_ids):
+    """Сбрасывает сводки после коммита, чтобы их не пересобрали по старым данным."""
+    bump_version_on_commit(*{summary_version_name(user_id) for user_id in user_ids})
+
+
+def progress_summary(user_id):
+    """Сводка прогресса пользователя: из кэша или одним агрегирующим запросом."""
+    version = get_version(summary_version_name(user_id))
+    cache_key = f'bz:progress_summary:{user_id}:{version}'
+    summary = cache.get(cache_key)
+    if summary is None:
+        row = UserProgress.objects.filter(user_id=user_id).aggregate(
+            completed=Count('id', filter=Q(is_completed=True)),
+            attempted=Count('id'),
+            attempts=Sum('attempts'),
+            average=Avg(Case(When(max_score__gt=0,
+                                  then=Cast('score', FloatField()) * 100 / F('max_score')))),
+        )
+        summary = ProgressSummary(row['completed'], row['attempted'], row['attempts'] or 0,
+                                  round(row['average'] or 0, 1))
+        cache.set(cache_key, summary, SUMMARY_TIMEOUT)
+    return summary
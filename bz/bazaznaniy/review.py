@@ -0,0 +1,190 @@
+"""Режим повторения: расписание вопросов по алгоритму SM-2.
+
+Для каждой пары (пользователь, вопрос), на которую пользователь отвечал,
+в ReviewItem хранится состояние SM-2 — лёгкость, интервал, число верных
+ответов подряд — и срок следующего повторения. «Следующие 20 к
+повторению» — один запрос по диапазону индекса (user, due_at).
+
+Расписание обновляется:
+- раз в сутки командой `manage.py schedule_reviews`: журнал Attempt
+  читается с последней учтённой попытки кусками по CHUNK_SIZE, на кусок
+  приходится одно чтение существующих строк и один upsert;
+- сразу после ответа в режиме повторения (record_reviews).
+
+Ответ в режиме повторения в журнал не пишется, поэтому ночной пересчёт
+не применяет к строке попытки старше её reviewed_at: иначе он затёр бы
+состояние, которое record_reviews уже сдвинул более поздним ответом.
+Обе записи блокируют строки расписания до конца транзакции.
+
+Время ответа в журнале не хранится, поэтому оценка по шкале SM-2 (0–5)
+только двух видов: верный ответ — GOOD, неверный — FAIL.
+"""
+from datetime import timedelta
+from itertools import islice
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .attempts import unpack_answers
+from .grading import get_answer_key, is_correct
+from .models import Attempt, Question, ReviewItem
+
+GOOD = 4
+FAIL = 1
+MIN_EASINESS = 1.3
+DUE_LIMIT = 20
+CHUNK_SIZE = 2000
+STATE_FIELDS = ['easiness', 'interval', 'repetitions', 'due_at', 'reviewed_at', 'last_attempt_id']
+
+
+class Schedule(NamedTuple):
+    easiness: float = 2.5
+    interval: int = 0
+    repetitions: int = 0
+
+
+def next_schedule(schedule, quality):
+    """Состояние SM-2 после ответа с оценкой `quality` (0–5)."""
+    if quality >= 3:
+        if schedule.repetitions == 0:
+            interval = 1
+        elif schedule.repetitions == 1:
+            interval = 6
+        else:
+            interval = round(schedule.interval * schedule.easiness)
+        repetitions = schedule.repetitions + 1
+    else:
+        interval, repetitions = 1, 0
+    penalty = 5 - quality
+    easiness = max(MIN_EASINESS, schedule.easiness + 0.1 - penalty * (0.08 + penalty * 0.02))
+    return Schedule(easiness, interval, repetitions)
+
+
+def _review(item, correct, when):
+    schedule = next_schedule(Schedule(item.easiness, item.interval, item.repetitions),
+                             GOOD if correct else FAIL)
+    item.easiness, item.interval, item.repetitions = schedule
+    item.reviewed_at = when
+    item.due_at = when + timedelta(days=schedule.interval)
+
+
+def _schedule_chunk(attempts):
+    """Учитывает кусок попыток (в порядке id) одним чтением и одним upsert'ом."""
+    entries = [
+        (attempt_id, user_id, topic_id, created_at, unpack_answers(answers))
+        for attempt_id, user_id, topic_id, answers, created_at in attempts
+    ]
+    question_ids = {record.question_id for *_, records in entries for record in records}
+    # В журнале могут остаться id удалённых вопросов
+    question_ids = set(Question.objects.filter(pk__in=question_ids).values_list('pk', flat=True))
+    items = {
+        (item.user_id, item.question_id): item
+        for item in ReviewItem.objects.select_for_update().filter(
+            user_id__in={entry[1] for entry in entries}, question_id__in=question_ids,
+        ).order_by('pk')
+    }
+    reviewed = {pair: item.reviewed_at for pair, item in items.items()}
+    touched = {}
+    for attempt_id, user_id, topic_id, created_at, records in entries:
+        for record in records:
+            if record.question_id not in question_ids:
+                continue
+            pair = (user_id, record.question_id)
+            item = items.get(pair)
+            if item is None:
+                item = items[pair] = ReviewItem(user_id=user_id, question_id=record.question_id,
+                                                topic_id=topic_id)
+            if attempt_id <= item.last_attempt_id:
+                continue
+            if pair in reviewed and created_at < reviewed[pair]:
+                # Строку уже сдвинул более поздний ответ в режиме повторения
+                continue
+            _review(item, record.is_correct, created_at)
+            item.last_attempt_id = attempt_id
+            touched[pair] = item
+    ReviewItem.objects.bulk_create(
+        touched.values(), update_conflicts=True,
+        unique_fields=['user', 'question'], update_fields=STATE_FIELDS,
+    )
+    return len(touched)
+
+
+def schedule_from_attempts(since=None):
+    """Пересчитывает расписание по попыткам с id больше `since`.
+
+    По умолчанию — с последней попытки, уже учтённой в расписании.
+    Возвращает (число попыток, число обновлённых строк расписания).
+    """
+    if since is None:
+        since = ReviewItem.objects.aggregate(last=Max('last_attempt_id'))['last'] or 0
+    rows = (
+        Attempt.objects.filter(pk__gt=since).order_by('pk')
+        .values_list('pk', 'user_id', 'topic_id', 'answers', 'created_at')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    attempts = updated = 0
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return attempts, updated
+        with transaction.atomic():
+            updated += _schedule_chunk(chunk)
+        attempts += len(chunk)
+
+
+def rebuild():
+    """Строит расписание заново по всему журналу попыток."""
+    with transaction.atomic():
+        ReviewItem.objects.all().delete()
+        return schedule_from_attempts(since=0)
+
+
+def _due(user_id, now):
+    return ReviewItem.objects.filter(
+        user_id=user_id, due_at__lte=now, question__is_active=True, topic__is_active=True,
+    )
+
+
+def due_questions(user_id, limit=DUE_LIMIT, now=None):
+    """Пары (question_id, topic_id), которые пора повторить, самые давние первыми."""
+    return list(_due(user_id, now or timezone.now()).order_by('due_at')
+                .values_list('question_id', 'topic_id')[:limit])
+
+
+def due_count(user_id, now=None):
+    return _due(user_id, now or timezone.now()).count()
+
+
+def next_due_at(user_id):
+    return (
+        ReviewItem.objects.filter(user_id=user_id).order_by('due_at')
+        .values_list('due_at', flat=True).first()
+    )
+
+
+def record_reviews(user_id, answers, now=None):
+    """Проверяет ответы режима повторения и сдвигает расписание.
+
+    answers — {question_id: [значения]}; учитываются только вопросы из
+    расписания пользователя. Возвращает {question_id: верно ли}.
+    """
+    now = now or timezone.now()
+    keys = {}
+    results = {}
+    with transaction.atomic():
+        items = list(ReviewItem.objects.select_for_update().filter(user_id=user_id, question_id__in=answers)
+                     .order_by('pk'))
+        for item in items:
+            if item.topic_id not in keys:
+                keys[item.topic_id] = {question.id: question
+                                       for question in get_answer_key(item.topic_id).questions}
+            question = keys[item.topic_id].get(item.question_id)
+            if question is None:
+                continue
+            results[item.question_id] = correct = is_correct(question, answers[item.question_id])
+            _review(item, correct, now)
+        ReviewItem.objects.bulk_update([item for item in items if item.question_id in results],
+                                       STATE_FIELDS, batch_size=CHUNK_SIZE)
+    return results
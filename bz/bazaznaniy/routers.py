@@ -0,0 +1,99 @@
+"""Маршрутизация запросов к БД: запись в default, чтение с реплик.
+
+Чтение уходит на реплики только внутри безопасных HTTP-запросов
+(GET/HEAD), которые ReplicaRoutingMiddleware отметил как допустимые:
+каталог, API, отчёты в админке. Всё остальное читает с основной базы:
+POST (в том числе отправка теста), запросы в течение
+REPLICA_PIN_SECONDS после собственной записи пользователя (метка в
+cookie), фоновые обработчики, команды управления и миграции. Сессии и
+пользователи всегда читаются с основной базы, чтобы вход сразу после
+регистрации не зависел от отставания реплики.
+
+Две оговорки:
+- код, который собирает кэш под текущей версией (ключ ответов, дерево
+  каталога, куски страницы теста, статистика каталога), читает с default
+  явно через .using('default'): отставшая реплика сохранила бы под новой
+  версией старые данные до следующей правки;
+- тело StreamingHttpResponse читается уже после выхода из middleware,
+  когда метка запроса сброшена. Генераторы, которые ходят в БД во время
+  отдачи, оборачиваются в route_stream().
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PIN_COOKIE = 'bz_primary_until'
+PRIMARY_APPS = {'sessions', 'auth', 'contenttypes'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_reads = ContextVar('bz_replica_reads', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != 'default']
+
+
+def route_stream(chunks):
+    """Итератор `chunks`, который читает с тех же баз, что и создавший его запрос."""
+    # Метку запоминаем сейчас, в самом представлении, а не при первом next()
+    replica_reads = _replica_reads.get()
+    chunks = iter(chunks)
+
+    def routed():
+        while True:
+            token = _replica_reads.set(replica_reads)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                _replica_reads.reset(token)
+            yield chunk
+    return routed()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS or not _replica_reads.get():
+            return 'default'
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На всех базах одни и те же данные
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    """Разрешает чтение с реплик для безопасных запросов без недавней записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _pinned(self, request):
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        token = _replica_reads.set(safe and bool(replica_aliases()) and not self._pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        if not safe and settings.REPLICA_PIN_SECONDS > 0:
+            # Следующие запросы пользователя читают с основной базы,
+            # пока реплики не догонят его запись
+            response.set_cookie(PIN_COOKIE, str(time.time() + settings.REPLICA_PIN_SECONDS),
+                                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,224 @@
+"""Полнотекстовый поиск по темам, вопросам и советам.
+
+Индекс — таблица SearchEntry, которая обновляется сигналами при
+сохранении и удалении Topic/Question/Tip (см. signals.py).
+
+PostgreSQL: колонка search_vector с GIN-индексом и конфигурацией
+'russian' (стемминг), запрос — префиксный tsquery, ранжирование ts_rank.
+SQLite: внешняя FTS5-таблица bazaznaniy_search_fts, которую поддерживают
+триггеры из миграции, запрос — префиксный MATCH, ранжирование bm25.
+
+В индексе лежат записи активных тем, но язык или отрасль темы могут быть
+скрыты: такие записи отсекаются в самом запросе, до подсчёта total.
+"""
+import re
+from typing import NamedTuple
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import F
+from django.urls import reverse
+
+from .catalog import get_catalog
+from .models import Language, Question, SearchEntry, Sector, Tip, Topic
+
+FTS_TABLE = 'bazaznaniy_search_fts'
+MIN_QUERY_LENGTH = 2
+MAX_TERMS = 8
+CHUNK_SIZE = 2000
+
+SEARCH_VECTOR = (
+    SearchVector('title', weight='A', config='russian')
+    + SearchVector('body', weight='B', config='russian')
+)
+
+
+class SearchResult(NamedTuple):
+    kind: str
+    label: str
+    title: str
+    snippet: str
+    url: str
+
+
+class SearchPage(NamedTuple):
+    query: str
+    page: int
+    per_page: int
+    total: int
+    results: list
+
+    @property
+    def has_next(self):
+        return self.page * self.per_page < self.total
+
+
+def _is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def _entry(kind, obj, topic_id, title, body):
+    return SearchEntry(kind=kind, object_id=obj.pk, topic_id=topic_id, title=title[:300], body=body)
+
+
+def _topic_entry(topic):
+    return _entry(SearchEntry.KIND_TOPIC, topic, topic.pk, topic.name, topic.description)
+
+
+def _question_entry(question):
+    return _entry(SearchEntry.KIND_QUESTION, question, question.topic_id, question.text, '')
+
+
+def _tip_entry(tip):
+    return _entry(SearchEntry.KIND_TIP, tip, tip.topic_id, tip.title, tip.content)
+
+
+def _save(entries):
+    """Записывает записи индекса upsert'ом и обновляет search_vector на PostgreSQL."""
+    if not entries:
+        return
+    SearchEntry.objects.bulk_create(
+        entries, update_conflicts=True, unique_fields=['kind', 'object_id'],
+        update_fields=['topic', 'title', 'body'],
+    )
+    if _is_postgres():
+        SearchEntry.objects.filter(
+            kind=entries[0].kind, object_id__in=[entry.object_id for entry in entries],
+        ).update(search_vector=SEARCH_VECTOR)
+
+
+def remove(kind, object_id):
+    SearchEntry.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def index_topic(topic):
+    """Индексирует тему; неактивная тема убирается из индекса вместе с вопросами и советами."""
+    if not topic.is_active:
+        SearchEntry.objects.filter(topic_id=topic.pk).delete()
+        return
+    reactivated = not SearchEntry.objects.filter(kind=SearchEntry.KIND_TOPIC, object_id=topic.pk).exists()
+    _save([_topic_entry(topic)])
+    if reactivated:
+        _save([_question_entry(q) for q in Question.objects.filter(topic=topic, is_active=True)])
+        _save([_tip_entry(t) for t in Tip.objects.filter(topic=topic, is_active=True)])
+
+
+def index_question(question):
+    if question.is_active:
+        _save([_question_entry(question)])
+    else:
+        remove(SearchEntry.KIND_QUESTION, question.pk)
+
+
+def index_tip(tip):
+    if tip.is_active:
+        _save([_tip_entry(tip)])
+    else:
+        remove(SearchEntry.KIND_TIP, tip.pk)
+
+
+def reindex_topics(topic_ids):
+    """Переиндексирует темы целиком — после массового импорта в обход сигналов."""
+    topic_ids = list(topic_ids)
+    with transaction.atomic():
+        SearchEntry.objects.filter(topic_id__in=topic_ids).delete()
+        _save([_topic_entry(t) for t in Topic.objects.filter(pk__in=topic_ids, is_active=True)])
+        _save([_question_entry(q) for q in Question.objects.filter(
+            topic_id__in=topic_ids, topic__is_active=True, is_active=True)])
+        _save([_tip_entry(t) for t in Tip.objects.filter(
+            topic_id__in=topic_ids, topic__is_active=True, is_active=True)])
+
+
+def rebuild():
+    """Полностью пересобирает индекс по активному контенту."""
+    sources = [
+        (Topic.objects.filter(is_active=True), _topic_entry),
+        (Question.objects.filter(is_active=True, topic__is_active=True), _question_entry),
+        (Tip.objects.filter(is_active=True, topic__is_active=True), _tip_entry),
+    ]
+    with transaction.atomic():
+        SearchEntry.objects.all().delete()
+        for queryset, build in sources:
+            chunk = []
+            for obj in queryset.order_by('pk').iterator(chunk_size=CHUNK_SIZE):
+                chunk.append(build(obj))
+                if len(chunk) >= CHUNK_SIZE:
+                    SearchEntry.objects.bulk_create(chunk)
+                    chunk = []
+            SearchEntry.objects.bulk_create(chunk)
+        if _is_postgres():
+            SearchEntry.objects.update(search_vector=SEARCH_VECTOR)
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return SearchEntry.objects.count()
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _postgres_search(terms, offset, limit):
+    tsquery = SearchQuery(' & '.join(f'{term}:*' for term in terms),
+                          search_type='raw', config='russian')
+    queryset = SearchEntry.objects.filter(
+        search_vector=tsquery, topic__is_active=True,
+        topic__lang__is_active=True, topic__lang__sector__is_active=True,
+    )
+    total = queryset.count()
+    rows = (
+        queryset.annotate(rank=SearchRank(F('search_vector'), tsquery))
+        .order_by('-rank', 'pk')
+        .values_list('kind', 'topic_id', 'title', 'body')[offset:offset + limit]
+    )
+    return total, list(rows)
+
+
+def _sqlite_search(terms, offset, limit):
+    match = ' '.join('"{}"*'.format(term.replace('"', '')) for term in terms)
+    matched = (
+        f'FROM {FTS_TABLE} f JOIN {SearchEntry._meta.db_table} e ON e.id = f.rowid '
+        f'JOIN {Topic._meta.db_table} t ON t.id = e.topic_id '
+        f'JOIN {Language._meta.db_table} l ON l.id = t.lang_id '
+        f'JOIN {Sector._meta.db_table} s ON s.id = l.sector_id '
+        f'WHERE {FTS_TABLE} MATCH %s AND t.is_active AND l.is_active AND s.is_active'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) {matched}', [match])
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f'SELECT e.kind, e.topic_id, e.title, e.body {matched} '
+            f'ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), e.id LIMIT %s OFFSET %s',
+            [match, limit, offset],
+        )
+        rows = cursor.fetchall()
+    return total, rows
+
+
+def search(query, page=1, per_page=20):
+    """Ищет по индексу с префиксным совпадением каждого слова запроса."""
+    query = query.strip()
+    terms = _terms(query)
+    page = max(1, page)
+    if len(query) < MIN_QUERY_LENGTH or not terms:
+        return SearchPage(query, page, per_page, 0, [])
+
+    offset = (page - 1) * per_page
+    if _is_postgres():
+        total, rows = _postgres_search(terms, offset, per_page)
+    else:
+        total, rows = _sqlite_search(terms, offset, per_page)
+
+    catalog = get_catalog()
+    labels = dict(SearchEntry.KINDS)
+    results = []
+    for kind, topic_id, title, body in rows:
+        topic = catalog.topic_by_id(topic_id)
+        if topic is None:
+            continue
+        url = reverse('topic_detail', kwargs={
+            'sector_slug': topic.sector_slug, 'lang_slug': topic.lang_slug, 'topic_slug': topic.slug,
+        })
+        snippet = body[:200] + ('…' if len(body) > 200 else '')
+        results.append(SearchResult(kind, labels[kind], title, snippet, url))
+    return SearchPage(query, page, per_page, total, results)
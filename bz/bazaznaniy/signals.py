@@ -0,0 +1,103 @@
+"""Сброс кэшей при изменении контента.
+
+Версии сдвигаются после коммита транзакции, см. versions.py.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .api import CONTENT_VERSION
+from .catalog import CATALOG_VERSION
+from .grading import answer_key_version_name
+from . import catalog_stats, search
+from .models import Answer, Language, Question, SearchEntry, Sector, Tip, Topic, UserProgress
+from .progress import discount_completed_topic, invalidate_summaries, refresh_rollups
+from .versions import bump_version_on_commit
+
+
+@receiver([post_save, post_delete], sender=Sector)
+@receiver([post_save, post_delete], sender=Language)
+@receiver([post_save, post_delete], sender=Topic)
+def catalog_changed(sender, **kwargs):
+    bump_version_on_commit(CATALOG_VERSION)
+
+
+@receiver(post_save, sender=Topic)
+def topic_changed(sender, instance, **kwargs):
+    # В ключе ответов хранится questions_per_test темы
+    bump_version_on_commit(answer_key_version_name(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=Answer)
+@receiver([post_save, post_delete], sender=Tip)
+def content_changed(sender, **kwargs):
+    bump_version_on_commit(CONTENT_VERSION)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    bump_version_on_commit(answer_key_version_name(instance.topic_id))
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+    topic_id = (
+        Question.objects.filter(pk=instance.question_id)
+        .values_list('topic_id', flat=True).first()
+    )
+    if topic_id is not None:
+        bump_version_on_commit(answer_key_version_name(topic_id))
+
+
+@receiver(post_save, sender=UserProgress)
+def progress_saved(sender, instance, **kwargs):
+    # bulk_create в grading.save_results сигналов не вызывает и обновляет
+    # сводки сам; сюда попадают правки из админки.
+    refresh_rollups([(instance.user_id, instance.topic_id)])
+    invalidate_summaries([instance.user_id])
+
+
+@receiver(post_delete, sender=UserProgress)
+def progress_deleted(sender, instance, **kwargs):
+    if instance.is_completed:
+        discount_completed_topic(instance.user_id, instance.topic_id)
+    invalidate_summaries([instance.user_id])
+
+
+@receiver(post_save, sender=Topic)
+def topic_saved(sender, instance, **kwargs):
+    search.index_topic(instance)
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    search.index_question(instance)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    search.remove(SearchEntry.KIND_QUESTION, instance.pk)
+
+
+@receiver(post_save, sender=Tip)
+def tip_saved(sender, instance, **kwargs):
+    search.index_tip(instance)
+
+
+@receiver(post_delete, sender=Tip)
+def tip_deleted(sender, instance, **kwargs):
+    search.remove(SearchEntry.KIND_TIP, instance.pk)
+
+
+# Статистику пересчитываем после коммита: при каскадном удалении темы
+# строка TopicStats удаляется вместе с ней и не должна вставляться заново.
+@receiver([post_save, post_delete], sender=Question)
+@receiver(post_save, sender=Topic)
+@receiver([post_save, post_delete], sender=UserProgress)
+def stats_changed(sender, instance, **kwargs):
+    catalog_stats.refresh_on_commit(topic_ids=[instance.pk if sender is Topic else instance.topic_id])
+
+
+@receiver(post_delete, sender=Topic)
+def topic_deleted(sender, instance, **kwargs):
+    catalog_stats.refresh_on_commit(lang_ids=[instance.lang_id])
@@ -0,0 +1,166 @@
+"""Подготовка воркера к первому запросу и замер времени запуска.
+
+Воркер gunicorn импортирует mysite.wsgi (или mysite.asgi) и сразу
+начинает принимать запросы. Без подготовки первый запрос каждого нового
+воркера платит за импорт URLconf и представлений, компиляцию шаблонов и
+соединение с БД — на пике экзамена это и есть медленный холодный старт.
+warm_up() делает всё это заранее; её вызывают wsgi.py и asgi.py, если
+включён WARM_UP_ON_START.
+
+profile_startup() замеряет время и прирост памяти по этапам запуска в
+чистом процессе, её запускает `manage.py startup_profile`. Поэтому
+модуль на верхнем уровне импортирует только стандартную библиотеку:
+импорт Django должен попасть в замер этапов.
+"""
+import logging
+import os
+import sys
+import time
+from importlib import import_module
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+
+def load_urlconf():
+    """Импортирует URLconf (а с ним и представления) и строит таблицы reverse()."""
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+
+
+def compile_templates():
+    """Компилирует шаблоны проекта в кэш загрузчика. Возвращает их число.
+
+    Загрузчик django.template.loaders.cached.Loader включён по умолчанию
+    (TEMPLATES без 'loaders'), шаблоны Django и admin не трогаем.
+    """
+    from django.template.autoreload import get_template_directories
+    from django.template.loader import get_template
+
+    names = set()
+    for directory in get_template_directories():
+        names.update(path.relative_to(directory).as_posix() for path in directory.rglob('*.html'))
+    for name in sorted(names):
+        get_template(name)
+    return len(names)
+
+
+def connect_databases():
+    """Открывает соединения со всеми базами, включая реплики."""
+    from django.db import DatabaseError, connections
+
+    for connection in connections.all():
+        try:
+            connection.ensure_connection()
+        except DatabaseError as exc:
+            # Воркер всё равно должен подняться: соединение откроет первый запрос
+            logger.warning('Не удалось открыть соединение %s при запуске: %s', connection.alias, exc)
+
+
+def warm_up(connect_db=True):
+    """Готовит процесс к первому запросу: URLconf, шаблоны, соединение с БД."""
+    started = time.perf_counter()
+    load_urlconf()
+    templates = compile_templates()
+    if connect_db:
+        connect_databases()
+    logger.info('Воркер подготовлен за %.0f мс: шаблонов %d',
+                (time.perf_counter() - started) * 1000, templates)
+
+
+def _rss_kb():
+    """Текущий RSS процесса; без /proc (macOS) — пиковый."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        import resource  # только Unix; нужен лишь для замеров
+
+        # ru_maxrss — в байтах на macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+class _Stages:
+    def __init__(self):
+        self.rows = []
+
+    def measure(self, name, func, *args, **kwargs):
+        rss = _rss_kb()
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.add(name, (time.perf_counter() - started) * 1000, _rss_kb() - rss)
+        return result
+
+    def add(self, name, ms, rss_kb):
+        self.rows.append({'stage': name, 'ms': round(ms, 2), 'rss_kb': rss_kb})
+
+
+def _request(handler, path):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }
+    statuses = []
+    response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return statuses[0]
+
+
+def profile_startup(warm=True, path='/'):
+    """Этапы запуска воркера в текущем (чистом) процессе.
+
+    Возвращает {'stages': [{'stage', 'ms', 'rss_kb'}], 'ready_ms',
+    'ready_rss_kb', 'modules', 'status'}: rss_kb — прирост RSS на этапе,
+    ready_* и modules — к моменту готовности принимать запросы, до первого
+    запроса. Без warm первый запрос сам платит за URLconf, шаблоны
+    и соединение с БД, как воркер без warm_up().
+    """
+    stages = _Stages()
+
+    # Автопоиск admin.py идёт внутри django.setup() (AdminConfig.ready),
+    # его время вычитаем из setup и показываем отдельно.
+    from django.utils import module_loading
+
+    autodiscover_modules = module_loading.autodiscover_modules
+    discovered = _Stages()
+
+    def timed_autodiscover(*args, **kwargs):
+        return discovered.measure('admin autodiscover', autodiscover_modules, *args, **kwargs)
+
+    module_loading.autodiscover_modules = timed_autodiscover
+    try:
+        import django
+
+        stages.measure('django.setup()', django.setup)
+    finally:
+        module_loading.autodiscover_modules = autodiscover_modules
+    for row in discovered.rows:
+        stages.rows[0]['ms'] = round(stages.rows[0]['ms'] - row['ms'], 2)
+        stages.rows[0]['rss_kb'] -= row['rss_kb']
+        stages.rows.append(row)
+
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = stages.measure('WSGIHandler (middleware)', WSGIHandler)
+    if warm:
+        stages.measure('bazaznaniy/urls.py', import_module, 'bazaznaniy.urls')
+        stages.measure('mysite/urls.py', import_module, settings.ROOT_URLCONF)
+        stages.measure('URL resolver', load_urlconf)
+        stages.measure('templates', compile_templates)
+        stages.measure('DB connection', connect_databases)
+    ready_ms = round(sum(row['ms'] for row in stages.rows), 2)
+    ready_rss_kb = _rss_kb()
+    modules = len(sys.modules)
+    status = stages.measure(f'first GET {path}', _request, handler, path)
+    stages.measure(f'second GET {path}', _request, handler, path)
+    return {'stages': stages.rows, 'ready_ms': ready_ms, 'ready_rss_kb': ready_rss_kb,
+            'modules': modules, 'status': status}
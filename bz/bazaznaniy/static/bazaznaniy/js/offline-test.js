@@ -0,0 +1,183 @@
+// Тест в режиме без сети: вопросы из пакета темы, ответы копятся в
+// localStorage и отправляются одной пачкой на /api/sync/. Очередь своя
+// у каждого пользователя: после входа другого аккаунта на том же
+// устройстве чужие ответы не уходят под его сессией и не теряются.
+(function () {
+    const LEGACY_OUTBOX = 'bz:outbox';
+    const RETRY_DELAY = 30000;
+    const form = document.getElementById('offline-test');
+    const OUTBOX = `bz:outbox:${form.dataset.user}`;
+    const container = form.querySelector('.offline-questions');
+    const status = document.getElementById('offline-status');
+    const mine = new Set();
+    let syncing = false;
+
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register(form.dataset.sw, {scope: '/'}).catch(() => {});
+    }
+
+    function readOutbox() {
+        try {
+            return JSON.parse(localStorage.getItem(OUTBOX)) || [];
+        } catch (error) {
+            return [];
+        }
+    }
+
+    function writeOutbox(items) {
+        localStorage.setItem(OUTBOX, JSON.stringify(items));
+    }
+
+    // Общая очередь прежних версий переходит к пользователю, открывшему тест;
+    // чужие попытки сервер вернёт со статусом foreign, и они останутся в очереди
+    const legacy = localStorage.getItem(LEGACY_OUTBOX);
+    if (legacy !== null) {
+        try {
+            writeOutbox([...readOutbox(), ...(JSON.parse(legacy) || [])]);
+        } catch (error) {
+            // Испорченную очередь переносить нечего
+        }
+        localStorage.removeItem(LEGACY_OUTBOX);
+    }
+
+    function newAttemptKey() {
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        return Array.from(bytes, (byte) => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    function csrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? match[1] : form.querySelector('[name=csrfmiddlewaretoken]').value;
+    }
+
+    function renderQuestion(question, number) {
+        const block = document.createElement('div');
+        block.className = 'question';
+        const title = document.createElement('h3');
+        title.textContent = `${number}. ${question.text}`;
+        block.appendChild(title);
+        const name = `question_${question.id}`;
+        if (question.type === 'text') {
+            const input = document.createElement('textarea');
+            input.name = name;
+            input.rows = 4;
+            input.cols = 50;
+            input.placeholder = 'Введите ваш ответ...';
+            input.required = true;
+            block.appendChild(input);
+            return block;
+        }
+        question.answers.forEach((answer) => {
+            const label = document.createElement('label');
+            const input = document.createElement('input');
+            input.type = question.type === 'single' ? 'radio' : 'checkbox';
+            input.name = name;
+            input.value = answer.id;
+            input.required = question.type === 'single';
+            label.append(input, ` ${answer.text}`);
+            block.append(label, document.createElement('br'));
+        });
+        return block;
+    }
+
+    async function loadQuestions() {
+        const response = await fetch(form.dataset.bundle, {credentials: 'same-origin'});
+        const bundle = await response.json();
+        const byId = new Map(bundle.questions.map((question) => [question.id, question]));
+        const ids = form.dataset.questions.split(',').filter(Boolean).map(Number);
+        container.replaceChildren(...ids.filter((id) => byId.has(id))
+            .map((id, index) => renderQuestion(byId.get(id), index + 1)));
+    }
+
+    function collectAnswers() {
+        const answers = {};
+        new FormData(form).forEach((value, name) => {
+            if (!name.startsWith('question_')) {
+                return;
+            }
+            const id = name.slice('question_'.length);
+            (answers[id] = answers[id] || []).push(value);
+        });
+        return answers;
+    }
+
+    function show(result) {
+        if (result.status === 'graded') {
+            status.textContent = `Результат: ${result.score} из ${result.total_points} (${Math.round(result.percentage)}%)`;
+        } else if (result.status === 'queued') {
+            status.innerHTML = '';
+            const link = document.createElement('a');
+            link.href = result.result_url;
+            link.textContent = 'Ответы приняты, результат будет по ссылке';
+            status.appendChild(link);
+        } else if (result.status === 'invalid') {
+            status.textContent = `Ответы не приняты: ${result.error}`;
+        }
+    }
+
+    async function flush() {
+        const items = readOutbox();
+        if (syncing || !items.length || !navigator.onLine) {
+            return;
+        }
+        syncing = true;
+        let retry = false;
+        try {
+            const response = await fetch(form.dataset.sync, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+                body: JSON.stringify({submissions: items}),
+            });
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            const {results} = await response.json();
+            const done = new Set();
+            results.forEach((result) => {
+                if (result.status === 'throttled' || result.status === 'pending') {
+                    retry = true;
+                    return;
+                }
+                if (result.status === 'foreign') {
+                    // Ждёт входа владельца варианта
+                    return;
+                }
+                done.add(result.attempt_key);
+                if (mine.has(result.attempt_key)) {
+                    show(result);
+                }
+            });
+            // Пока шёл запрос, в очередь могли добавиться новые попытки
+            writeOutbox(readOutbox().filter((item) => !done.has(item.attempt_key)));
+        } catch (error) {
+            retry = true;
+            status.textContent = 'Нет связи с сервером. Ответы сохранены и будут отправлены позже.';
+        } finally {
+            syncing = false;
+        }
+        if (retry && readOutbox().length) {
+            setTimeout(flush, RETRY_DELAY);
+        }
+    }
+
+    form.addEventListener('submit', (event) => {
+        event.preventDefault();
+        const attemptKey = newAttemptKey();
+        mine.add(attemptKey);
+        writeOutbox([...readOutbox(), {
+            attempt_key: attemptKey,
+            variant: form.dataset.variant,
+            answers: collectAnswers(),
+        }]);
+        form.reset();
+        status.textContent = 'Ответы сохранены на устройстве и отправляются…';
+        flush();
+    });
+
+    window.addEventListener('online', flush);
+    loadQuestions().catch(() => {
+        container.textContent = 'Не удалось загрузить вопросы. Откройте тест, когда появится сеть.';
+    });
+    flush();
+})();
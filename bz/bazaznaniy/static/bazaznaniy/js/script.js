@@ -21,11 +21,9 @@ function animateProgress(circle, targetProgress) {
     }, 16);
 }
 
-// Использование
-const progressCircle = document.querySelector('.circular-progress');
-const targetProgress = parseInt(progressCircle.getAttribute('data-progress'));
-
-// Запуск анимации при загрузке страницы
+// Запуск анимации всех колец прогресса при загрузке страницы
 window.addEventListener('load', () => {
-    animateProgress(progressCircle, targetProgress);
+    document.querySelectorAll('.circular-progress').forEach((circle) => {
+        animateProgress(circle, parseInt(circle.getAttribute('data-progress')) || 0);
+    });
 });
\ No newline at end of file
@@ -0,0 +1,69 @@
+// Service worker режима без сети. Отдаётся из корня сайта (/sw.js).
+//  - пакеты тем (/bundle/?v=...): из кэша, сеть — только при промахе;
+//  - страницы теста без сети и статика: из сети, без неё — сохранённая копия.
+const CACHE = 'bz-offline-v1';
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then((names) => Promise.all(names.filter((name) => name !== CACHE).map((name) => caches.delete(name))))
+            .then(() => self.clients.claim())
+    );
+});
+
+async function dropOtherVersions(cache, url) {
+    // Пакет с новой меткой версии заменяет старые пакеты той же темы
+    const keys = await cache.keys();
+    await Promise.all(keys
+        .filter((request) => {
+            const cached = new URL(request.url);
+            return cached.pathname === url.pathname && cached.search !== url.search;
+        })
+        .map((request) => cache.delete(request)));
+}
+
+async function cacheFirst(request, url) {
+    const cache = await caches.open(CACHE);
+    const cached = await cache.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok) {
+        await dropOtherVersions(cache, url);
+        await cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function networkFirst(request) {
+    const cache = await caches.open(CACHE);
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            await cache.put(request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await cache.match(request);
+        if (cached) {
+            return cached;
+        }
+        throw error;
+    }
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin) {
+        return;
+    }
+    if (url.pathname.endsWith('/bundle/') && url.searchParams.has('v')) {
+        event.respondWith(cacheFirst(request, url));
+    } else if (url.pathname.endsWith('/test/offline/') || url.pathname.startsWith('/static/')) {
+        event.respondWith(networkFirst(request));
+    }
+});
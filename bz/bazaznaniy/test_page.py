@@ -0,0 +1,113 @@
+"""Страница теста: готовые куски HTML из кэша и потоковая отдача.
+
+Вопросы темы с вариантами ответов читаются одним запросом (вопросы
+LEFT JOIN ответы) и сразу превращаются в куски HTML: заголовок вопроса,
+по куску на каждый вариант и поле ввода для текстового вопроса. Куски
+кэшируются по версии ключа ответов темы (см. grading.py), которую
+сигналы сдвигают при любой правке вопросов и ответов, поэтому отдельного
+сброса не нужно.
+
+На запрос остаётся только собрать вариант: пронумеровать вопросы и
+расставить варианты в порядке зерна попытки. Шапка страницы с
+CSRF-токеном рендерится шаблоном, вопросы уходят через
+StreamingHttpResponse пачками по CHUNK_QUESTIONS.
+"""
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from .grading import shuffle_answers
+from .models import Question
+
+# Увеличить при изменении разметки вопросов ниже
+MARKUP_VERSION = 1
+CHUNK_QUESTIONS = 20
+QUESTIONS_SLOT = mark_safe('<!--bz:questions-->')
+
+CHOICE_INPUTS = {
+    'single': '<label>\n<input type="radio" name="question_{}" value="{}" required>\n{}\n</label><br>\n',
+    'multiple': '<label>\n<input type="checkbox" name="question_{}" value="{}">\n{}\n</label><br>\n',
+}
+TEXT_INPUT = ('<textarea name="question_{}" rows="4" cols="50" '
+              'placeholder="Введите ваш ответ..." required></textarea>\n')
+
+
+class QuestionBlock(NamedTuple):
+    id: int
+    title: str
+    choices: tuple
+    text_input: str = ''
+
+
+def build_blocks(topic_id):
+    """Куски HTML вопросов темы: {question_id: QuestionBlock}."""
+    rows = (
+        Question.objects.using('default')
+        .filter(topic_id=topic_id, is_active=True)
+        .order_by('order', 'id', 'answers__order', 'answers__id')
+        .values_list('id', 'question_type', 'text', 'answers__id', 'answers__text')
+    )
+    questions = {}
+    for question_id, question_type, text, answer_id, answer_text in rows:
+        title, choices, text_input = questions.setdefault(question_id, (
+            format_html('{}', text), [],
+            '' if question_type in CHOICE_INPUTS else format_html(TEXT_INPUT, question_id),
+        ))
+        if answer_id is not None and question_type in CHOICE_INPUTS:
+            choices.append(format_html(CHOICE_INPUTS[question_type], question_id, answer_id, answer_text))
+    return {
+        question_id: QuestionBlock(question_id, title, tuple(choices), text_input)
+        for question_id, (title, choices, text_input) in questions.items()
+    }
+
+
+def get_blocks(topic_id, version):
+    """Куски HTML вопросов для версии ключа ответов `version`."""
+    cache_key = f'bz:test_blocks:{topic_id}:{version}:{MARKUP_VERSION}'
+    blocks = cache.get(cache_key)
+    if blocks is None:
+        blocks = build_blocks(topic_id)
+        cache.set(cache_key, blocks, timeout=None)
+    return blocks
+
+
+def question_html(number, block, seed):
+    return ''.join([
+        f'<div class="question">\n<h3>{number}. {block.title}</h3>\n',
+        *shuffle_answers(block.choices, seed, block.id),
+        block.text_input,
+        '</div>\n',
+    ])
+
+
+def _stream(head, blocks, seed, tail):
+    yield head
+    chunk = []
+    for number, block in enumerate(blocks, 1):
+        chunk.append(question_html(number, block, seed))
+        if len(chunk) == CHUNK_QUESTIONS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+    yield tail
+
+
+def render_test(request, template_name, context, key, seed):
+    """Страница теста для варианта `key` потоком.
+
+    Шаблон рендерится сразу (в нём CSRF-токен и ключ формы), на месте
+    QUESTIONS_SLOT в поток подставляются вопросы.
+    """
+    by_id = get_blocks(key.topic_id, key.version)
+    blocks = [by_id[question.id] for question in key.questions if question.id in by_id]
+    page = render_to_string(template_name, {
+        **context, 'has_questions': bool(blocks), 'questions_slot': QUESTIONS_SLOT,
+    }, request)
+    head, _, tail = page.partition(QUESTIONS_SLOT)
+    # Всё из БД прочитано выше: генератор только собирает готовые куски
+    return StreamingHttpResponse(_stream(head, blocks, seed, tail), content_type='text/html; charset=utf-8')
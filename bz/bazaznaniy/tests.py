@@ -1 +1,1007 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import re
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished
+from django.db import close_old_connections, transaction
+from django.template import engines
+from django.template.autoreload import get_template_directories
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+
+from . import (admin_tools, api, attempts, catalog, catalog_stats, grading, grading_queue, leaderboard, offline,
+               perf, progress, review, routers, search, startup, test_page, throttling, views)
+from .attempts import AnswerRecord
+from .content_io import ContentError, export_documents, import_documents, read_documents
+from .markup import render_markdown
+from .grading import GradeResult, SubmittedAnswers, answer_key_version_name, get_answer_key, grade_submissions
+from .models import (Answer, Attempt, Language, LanguageProgress, Question, QuestionStats, Ranking, ReviewItem,
+                     Sector, SectorProgress, Submission, Topic, UserProgress)
+from .versions import bump_version, get_version
+
+
+class CatalogTestCase(TestCase):
+    """Тема с тремя вопросами разных типов и пользователь.
+
+    Кэш и ключи в памяти процесса сбрасываются перед каждым тестом: id
+    строк после отката транзакции теста могут повториться.
+    """
+
+    def setUp(self):
+        cache.clear()
+        grading._local_keys.clear()
+        catalog._local_catalog = None
+
+        self.sector = Sector.objects.create(name='Программирование', slug='prog')
+        self.lang = Language.objects.create(sector=self.sector, name='Python', slug='python')
+        self.topic = Topic.objects.create(lang=self.lang, name='Основы', slug='basics')
+        self.single = Question.objects.create(topic=self.topic, code='q1', text='2 + 2?',
+                                              question_type='single', order=1, points=2)
+        self.right = Answer.objects.create(question=self.single, text='4', is_correct=True, order=1)
+        self.wrong = Answer.objects.create(question=self.single, text='5', order=2)
+        self.multiple = Question.objects.create(topic=self.topic, code='q2', text='Чётные?',
+                                                question_type='multiple', order=2)
+        self.even_2 = Answer.objects.create(question=self.multiple, text='2', is_correct=True, order=1)
+        self.even_4 = Answer.objects.create(question=self.multiple, text='4', is_correct=True, order=2)
+        self.odd_3 = Answer.objects.create(question=self.multiple, text='3', order=3)
+        self.text = Question.objects.create(topic=self.topic, code='q3', text='Язык?',
+                                            question_type='text', order=3)
+        Answer.objects.create(question=self.text, text='Python', is_correct=True, order=1)
+        self.user = User.objects.create_user('student', password='pw12345!')
+
+    def all_correct(self):
+        return {
+            self.single.id: [str(self.right.id)],
+            self.multiple.id: [str(self.even_2.id), str(self.even_4.id)],
+            self.text.id: ['  python '],
+        }
+
+
+class GradingTests(CatalogTestCase):
+    def test_all_correct(self):
+        [result] = grade_submissions([SubmittedAnswers(self.user.id, self.topic.id, self.all_correct())])
+        self.assertEqual((result.score, result.total_points), (4, 4))
+        progress = UserProgress.objects.get(user=self.user, topic=self.topic)
+        self.assertEqual((progress.score, progress.max_score, progress.attempts), (4, 4, 1))
+        self.assertTrue(progress.is_completed)
+
+    def test_partial_multiple_is_wrong(self):
+        answers = self.all_correct()
+        answers[self.multiple.id] = [str(self.even_2.id)]
+        [result] = grade_submissions([SubmittedAnswers(self.user.id, self.topic.id, answers)])
+        self.assertEqual(result.score, 3)
+
+    def test_batch_of_one_user_merges_into_one_row(self):
+        wrong = {self.single.id: [str(self.wrong.id)]}
+        grade_submissions([
+            SubmittedAnswers(self.user.id, self.topic.id, wrong),
+            SubmittedAnswers(self.user.id, self.topic.id, self.all_correct()),
+        ])
+        progress = UserProgress.objects.get(user=self.user, topic=self.topic)
+        self.assertEqual((progress.score, progress.attempts), (4, 2))
+
+    def test_pooled_variant_is_stable_for_seed(self):
+        Topic.objects.filter(pk=self.topic.pk).update(questions_per_test=2)
+        key = grading.build_answer_key(self.topic.id)
+        first = [question.id for question in key.draw(7).questions]
+        self.assertEqual(len(first), 2)
+        self.assertEqual(first, [question.id for question in key.draw(7).questions])
+
+
+class VersionInvalidationTests(CatalogTestCase):
+    """Версии сдвигаются только после коммита правки."""
+
+    def test_answer_key_version_moves_after_commit(self):
+        name = answer_key_version_name(self.topic.id)
+        before = get_version(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.wrong.is_correct = True
+                self.wrong.save()
+                # Параллельный запрос до коммита видит прежнюю версию
+                self.assertEqual(get_version(name), before)
+        self.assertGreater(get_version(name), before)
+
+    def test_rolled_back_edit_keeps_version(self):
+        name = answer_key_version_name(self.topic.id)
+        before = get_version(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.single.points = 10
+                    self.single.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(get_version(name), before)
+
+    def test_grading_uses_new_key_after_commit(self):
+        self.assertEqual(get_answer_key(self.topic.id).total_points, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.single.points = 5
+            self.single.save()
+        self.assertEqual(get_answer_key(self.topic.id).total_points, 7)
+
+    def test_catalog_version_moves_after_commit(self):
+        before = get_version(catalog.CATALOG_VERSION)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Topic.objects.create(lang=self.lang, name='Функции', slug='functions')
+                self.assertEqual(get_version(catalog.CATALOG_VERSION), before)
+        self.assertGreater(get_version(catalog.CATALOG_VERSION), before)
+        self.assertIsNotNone(catalog.get_catalog().topic('prog', 'python', 'functions'))
+
+
+class CatalogTreeTests(CatalogTestCase):
+    """Правки через update() не шлют сигналов: версия каталога сдвигается вручную."""
+
+    def hide(self, model, pk):
+        self.assertIsNotNone(catalog.get_catalog().topic_by_id(self.topic.pk))
+        model.objects.filter(pk=pk).update(is_active=False)
+        bump_version(catalog.CATALOG_VERSION)
+
+    def test_inactive_topic_is_missing(self):
+        self.hide(Topic, self.topic.pk)
+        tree = catalog.get_catalog()
+        self.assertIsNone(tree.topic('prog', 'python', 'basics'))
+        self.assertIsNone(tree.topic_by_id(self.topic.pk))
+        self.assertEqual(tree.language('prog', 'python').topics, ())
+
+    def test_inactive_language_hides_its_topics(self):
+        self.hide(Language, self.lang.pk)
+        tree = catalog.get_catalog()
+        self.assertIsNone(tree.language('prog', 'python'))
+        self.assertIsNone(tree.topic('prog', 'python', 'basics'))
+        self.assertIsNone(tree.topic_by_id(self.topic.pk))
+        self.assertIsNotNone(tree.sector('prog'))
+
+    def test_inactive_sector_hides_everything_below(self):
+        self.hide(Sector, self.sector.pk)
+        tree = catalog.get_catalog()
+        self.assertIsNone(tree.sector('prog'))
+        self.assertIsNone(tree.language('prog', 'python'))
+        self.assertIsNone(tree.topic_by_id(self.topic.pk))
+
+    def test_tree_is_rebuilt_only_after_version_bump(self):
+        first = catalog.get_catalog()
+        Topic.objects.filter(pk=self.topic.pk).update(name='Основы Python')
+        with self.assertNumQueries(0):
+            self.assertIs(catalog.get_catalog(), first)
+        bump_version(catalog.CATALOG_VERSION)
+        with self.assertNumQueries(3):
+            tree = catalog.get_catalog()
+        self.assertGreater(tree.version, first.version)
+        self.assertEqual(tree.topic_by_id(self.topic.pk).name, 'Основы Python')
+        # Другой процесс с той же версией берёт дерево из общего кэша, без запросов
+        catalog._local_catalog = None
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.get_catalog().topic_by_id(self.topic.pk).name, 'Основы Python')
+
+
+class PageCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('topic_detail', kwargs={'sector_slug': 'prog', 'lang_slug': 'python',
+                                                   'topic_slug': 'basics'})
+
+    def get(self, **headers):
+        with mock.patch.object(views, 'render', wraps=views.render) as render:
+            response = self.client.get(self.url, **headers)
+        return response, render.call_count
+
+    def test_anonymous_miss_then_hit(self):
+        first, rendered = self.get()
+        self.assertEqual((first.status_code, rendered), (200, 1))
+        self.assertIn('Cookie', first['Vary'])
+        second, rendered = self.get()
+        self.assertEqual((second.status_code, rendered), (200, 0))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_conditional_requests(self):
+        first, _ = self.get()
+        response, rendered = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual((response.status_code, rendered), (304, 0))
+        self.assertIn('Cookie', response['Vary'])
+        response, rendered = self.get(HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual((response.status_code, rendered), (304, 0))
+
+    def test_catalog_edit_changes_page(self):
+        first, _ = self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.topic.name = 'Основы языка'
+            self.topic.save()
+        response, rendered = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual((response.status_code, rendered), (200, 1))
+        self.assertContains(response, 'Основы языка')
+
+    def test_logged_in_user_bypasses_page_cache(self):
+        self.get()
+        self.client.force_login(self.user)
+        for _ in range(2):
+            response, rendered = self.get()
+            self.assertEqual((response.status_code, rendered), (200, 1))
+            self.assertNotIn('ETag', response)
+
+
+@override_settings(GRADING_LEASE_SECONDS=60)
+class GradingQueueTests(CatalogTestCase):
+    def enqueue(self):
+        answers = {str(question_id): ids for question_id, ids in self.all_correct().items()}
+        return grading_queue.enqueue(self.user.id, self.topic.id, answers)
+
+    def test_batch_is_graded_with_status(self):
+        submission = self.enqueue()
+        self.assertEqual(grading_queue.process_batch(grading_queue.claim_batch(10)), 1)
+        submission.refresh_from_db()
+        self.assertEqual((submission.status, submission.score), (Submission.STATUS_DONE, 4))
+        self.assertEqual(UserProgress.objects.get(user=self.user, topic=self.topic).attempts, 1)
+
+    def test_stale_claim_is_reclaimed(self):
+        submission = self.enqueue()
+        self.assertEqual(len(grading_queue.claim_batch(10)), 1)
+        # Свежую задачу другого обработчика не трогаем
+        self.assertEqual(grading_queue.claim_batch(10), [])
+        Submission.objects.filter(pk=submission.pk).update(
+            claimed_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual([s.pk for s in grading_queue.claim_batch(10)], [submission.pk])
+
+    def test_lost_claim_is_not_graded_twice(self):
+        self.enqueue()
+        [stale] = grading_queue.claim_batch(10)
+        Submission.objects.filter(pk=stale.pk).update(
+            claimed_at=timezone.now() - timedelta(seconds=61))
+        fresh = grading_queue.claim_batch(10)
+        self.assertEqual(grading_queue.process_batch(fresh), 1)
+        # Первый обработчик проснулся, но задача уже не его
+        self.assertEqual(grading_queue.process_batch([stale]), 0)
+        self.assertEqual(UserProgress.objects.get(user=self.user, topic=self.topic).attempts, 1)
+
+
+class ImportTests(CatalogTestCase):
+    def document(self):
+        [document] = export_documents(Topic.objects.filter(pk=self.topic.pk))
+        return document
+
+    def answer_ids(self):
+        return list(Answer.objects.order_by('id').values_list('id', flat=True))
+
+    def test_reimport_keeps_answer_ids(self):
+        before = self.answer_ids()
+        stats = import_documents([self.document()])
+        self.assertEqual(self.answer_ids(), before)
+        self.assertEqual(stats['Ответы: без изменений'], len(before))
+        self.assertFalse(stats['Ответы: создано'] or stats['Ответы: изменено'] or stats['Ответы: удалено'])
+
+    def test_only_changed_and_missing_answers_are_written(self):
+        document = self.document()
+        single = document['questions'][0]
+        single['answers'][1]['text'] = '6'
+        document['questions'][1]['answers'].pop()
+        stats = import_documents([document])
+        self.assertEqual((stats['Ответы: изменено'], stats['Ответы: удалено']), (1, 1))
+        self.wrong.refresh_from_db()
+        self.assertEqual(self.wrong.text, '6')
+        self.assertFalse(Answer.objects.filter(pk=self.odd_3.pk).exists())
+        self.assertTrue(Answer.objects.filter(pk=self.right.pk).exists())
+
+    def test_dry_run_reports_changes_without_writing(self):
+        document = self.document()
+        document['questions'][0]['answers'][1]['text'] = '6'
+        stats = import_documents([document], dry_run=True)
+        self.assertEqual(stats['Ответы: изменено'], 1)
+        self.wrong.refresh_from_db()
+        self.assertEqual(self.wrong.text, '5')
+
+
+    def test_failed_chunk_leaves_earlier_chunks_fresh(self):
+        version = get_version(answer_key_version_name(self.topic.id))
+        document = self.document()
+        document['questions'][0]['answers'][1]['correct'] = True
+        with self.assertRaises(ContentError):
+            with self.captureOnCommitCallbacks(execute=True):
+                import_documents([document, {'sector': {'slug': 'prog'}}], chunk_size=1)
+        # Первая пачка закоммичена, и проверка уже видит её ответы
+        self.assertGreater(get_version(answer_key_version_name(self.topic.id)), version)
+        [single, *_] = get_answer_key(self.topic.id).questions
+        self.assertIn(self.wrong.id, single.correct_ids)
+
+    def test_broken_yaml_is_content_error(self):
+        with self.assertRaises(ContentError):
+            list(read_documents(io.StringIO('topic: [unclosed'), 'yaml'))
+
+
+class ReplicaRoutingTests(TestCase):
+    def test_stream_keeps_request_routing(self):
+        def chunks():
+            yield routers._replica_reads.get()
+            yield routers._replica_reads.get()
+
+        token = routers._replica_reads.set(True)
+        try:
+            stream = routers.route_stream(chunks())
+        finally:
+            routers._replica_reads.reset(token)
+        # Тело читается после выхода из middleware, но с разметкой запроса
+        self.assertEqual(list(stream), [True, True])
+        self.assertFalse(routers._replica_reads.get())
+
+
+class CatalogStatsTests(CatalogTestCase):
+    def test_one_refresh_per_transaction(self):
+        # Пересчёт после setUp отложен до коммита внешней транзакции теста
+        transaction.get_connection().bz_pending_stats = None
+        with mock.patch.object(catalog_stats, 'refresh_topics') as refresh_topics:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for order in range(4, 7):
+                        Question.objects.create(topic=self.topic, code=f'q{order}', text='?', order=order)
+        refresh_topics.assert_called_once_with({self.topic.id})
+
+    def test_results_keep_page_version_until_refresh(self):
+        url = reverse('lang_detail', kwargs={'sector_slug': 'prog', 'lang_slug': 'python'})
+        with self.captureOnCommitCallbacks(execute=True):
+            catalog_stats.refresh_topics([self.topic.id])
+        etag = self.client.get(url)['ETag']
+        version = get_version(catalog_stats.STATS_VERSION)
+        with self.captureOnCommitCallbacks(execute=True):
+            grade_submissions([SubmittedAnswers(self.user.id, self.topic.id, self.all_correct())])
+        # Попытка не сбрасывает страницы всех посетителей
+        self.assertEqual(get_version(catalog_stats.STATS_VERSION), version)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        later = time.time() + catalog_stats.RESULTS_TTL
+        with mock.patch('time.time', return_value=later):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Средний результат: 100%')
+
+
+class SubmitTestCase(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse('topic_test', kwargs={'sector_slug': 'prog', 'lang_slug': 'python',
+                                                 'topic_slug': 'basics'})
+
+    def post(self, attempt_key, **extra):
+        data = {f'question_{question_id}': value for question_id, value in self.all_correct().items()}
+        if attempt_key is not None:
+            data['attempt_key'] = attempt_key
+        return self.client.post(self.url, {**data, **extra})
+
+    def attempts(self):
+        return UserProgress.objects.filter(user=self.user, topic=self.topic).values_list('attempts', flat=True).first()
+
+
+@override_settings(TEST_SUBMIT_BURST=2, TEST_SUBMIT_PER_MINUTE=1, ASYNC_GRADING=False)
+class SubmitTests(SubmitTestCase):
+    def test_resubmit_returns_stored_result(self):
+        attempt_key = throttling.new_idempotency_key()
+        self.assertContains(self.post(attempt_key), '4')
+        self.assertEqual(self.post(attempt_key).status_code, 200)
+        self.assertEqual(self.attempts(), 1)
+
+    def test_resubmit_while_grading_does_not_wait(self):
+        attempt_key = throttling.new_idempotency_key()
+        self.assertIsNone(throttling.claim(self.user.id, attempt_key))
+        response = self.post(attempt_key)
+        self.assertEqual(response.status_code, 202)
+        self.assertIsNone(self.attempts())
+
+    def test_missing_or_invalid_key_is_rejected(self):
+        self.assertEqual(self.post(None).status_code, 400)
+        self.assertEqual(self.post('not-a-key').status_code, 400)
+        self.assertIsNone(self.attempts())
+
+    def test_burst_limit(self):
+        for _ in range(2):
+            self.assertEqual(self.post(throttling.new_idempotency_key()).status_code, 200)
+        response = self.post(throttling.new_idempotency_key())
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.attempts(), 2)
+
+
+class MarkdownTests(TestCase):
+    def test_unsafe_link_schemes_are_dropped(self):
+        html = render_markdown('[a](javascript:alert(1)) [b](JAVA\tSCRIPT:alert(1)) '
+                               '![c](data:image/svg+xml,x) [d](vbscript:x)')
+        self.assertNotIn('href', html)
+        self.assertNotIn('src', html)
+        self.assertIn('<span>a</span>', html)
+        self.assertIn('<span>c</span>', html)
+
+    def test_safe_links_are_kept(self):
+        html = render_markdown('[a](https://example.com) [b](mailto:x@example.com) [c](/tips/) [d](#top)')
+        for href in ('https://example.com', 'mailto:x@example.com', '/tips/', '#top'):
+            self.assertIn(f'href="{href}"', html)
+
+    def test_raw_html_is_escaped(self):
+        self.assertNotIn('<script>', render_markdown('<script>alert(1)</script>'))
+
+
+class SearchTests(CatalogTestCase):
+    def test_hidden_language_is_not_counted(self):
+        self.assertEqual(search.search('чётные').total, 1)
+        Language.objects.filter(pk=self.lang.pk).update(is_active=False)
+        page = search.search('чётные')
+        self.assertEqual((page.total, page.results), (0, []))
+
+    def test_hidden_sector_is_not_counted(self):
+        self.assertEqual(search.search('язык').total, 1)
+        Sector.objects.filter(pk=self.sector.pk).update(is_active=False)
+        self.assertEqual(search.search('язык').total, 0)
+
+
+@override_settings(TEST_SUBMIT_BURST=0, ASYNC_GRADING=False)
+class PooledFormTests(SubmitTestCase):
+    def setUp(self):
+        super().setUp()
+        Topic.objects.filter(pk=self.topic.pk).update(questions_per_test=2)
+
+    def form_variant(self):
+        response = self.client.get(self.url)
+        b''.join(response.streaming_content)
+        return response.context['variant']
+
+    def test_each_tab_keeps_its_variant(self):
+        first, second = self.form_variant(), self.form_variant()
+        for variant in (first, second, first):
+            response = self.post(throttling.new_idempotency_key(), variant=variant)
+            self.assertEqual(response.status_code, 200)
+        seeds = list(Attempt.objects.order_by('id').values_list('seed', flat=True))
+        self.assertEqual(seeds, [offline.unsign_variant(v, self.user.id)[1] for v in (first, second, first)])
+
+    def test_missing_or_foreign_variant_reopens_test(self):
+        self.assertEqual(self.post(throttling.new_idempotency_key()).status_code, 302)
+        foreign = offline.sign_variant(self.user.id + 1, self.topic.id, 7, get_answer_key(self.topic.id).draw(7))
+        self.assertEqual(self.post(throttling.new_idempotency_key(), variant=foreign).status_code, 302)
+        self.assertIsNone(self.attempts())
+
+    def test_removed_question_makes_variant_stale(self):
+        variant = self.form_variant()
+        _, _, drawn = offline.unsign_variant(variant, self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.get(pk=drawn[0]).delete()
+        response = self.post(throttling.new_idempotency_key(), variant=variant)
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, 'Откройте тест заново', status_code=409)
+        self.assertIsNone(self.attempts())
+
+    def test_added_question_keeps_drawn_variant(self):
+        variant = self.form_variant()
+        _, _, drawn = offline.unsign_variant(variant, self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(topic=self.topic, code='q4', text='Новый', question_type='text', order=4)
+        self.assertEqual(self.post(throttling.new_idempotency_key(), variant=variant).status_code, 200)
+        records = attempts.unpack_answers(Attempt.objects.get(user=self.user).answers)
+        self.assertEqual([record.question_id for record in records], drawn)
+
+
+class RollupTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        grade_submissions([SubmittedAnswers(self.user.id, self.topic.id, self.all_correct())])
+
+    def completed(self):
+        return (LanguageProgress.objects.get(user=self.user, language=self.lang).completed_topics,
+                SectorProgress.objects.get(user=self.user, sector=self.sector).completed_topics)
+
+    def test_set_active_refreshes_rollups(self):
+        self.assertEqual(self.completed(), (1, 1))
+        admin_tools.set_active(Topic.objects.filter(pk=self.topic.pk), False)
+        self.assertEqual(self.completed(), (0, 0))
+        admin_tools.set_active(Topic.objects.filter(pk=self.topic.pk), True)
+        self.assertEqual(self.completed(), (1, 1))
+
+    def test_import_hiding_topic_refreshes_rollups(self):
+        [document] = export_documents(Topic.objects.filter(pk=self.topic.pk))
+        document['topic']['is_active'] = False
+        import_documents([document])
+        self.assertEqual(self.completed(), (0, 0))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        other = Topic.objects.create(lang=self.lang, name='Функции', slug='functions', is_active=False)
+        UserProgress.objects.create(user=self.user, topic=other, is_completed=True)
+        LanguageProgress.objects.update(completed_topics=7)
+        SectorProgress.objects.all().delete()
+        self.assertEqual(progress.rebuild_rollups(), (1, 1))
+        self.assertEqual(self.completed(), (1, 1))
+        self.assertIsNotNone(SectorProgress.objects.get(user=self.user).updated_at)
+
+
+class LeaderboardTests(CatalogTestCase):
+    def points(self, scope, scope_id, user=None):
+        return Ranking.objects.get(scope=scope, scope_id=scope_id, user=user or self.user).points
+
+    def test_concurrent_first_result_is_counted_once(self):
+        # Параллельная первая отправка успела вставить строку темы до блокировки
+        leaderboard.record_results([GradeResult(self.user.id, self.topic.id, 3, 4)])
+        leaderboard.record_results([GradeResult(self.user.id, self.topic.id, 3, 4)])
+        leaderboard.record_results([GradeResult(self.user.id, self.topic.id, 4, 4)])
+        self.assertEqual(self.points(Ranking.SCOPE_TOPIC, self.topic.id), 4)
+        self.assertEqual(self.points(Ranking.SCOPE_LANGUAGE, self.lang.id), 4)
+        self.assertEqual(self.points(Ranking.SCOPE_SECTOR, self.sector.id), 4)
+
+    def test_rank_is_exact_near_top_and_stored_below_limit(self):
+        others = [User.objects.create_user(f'rival{index}') for index in range(3)]
+        leaderboard.record_results([GradeResult(user.id, self.topic.id, 4, 4) for user in others])
+        leaderboard.record_results([GradeResult(self.user.id, self.topic.id, 2, 4)])
+        board = leaderboard.get_leaderboard(Ranking.SCOPE_TOPIC, self.topic.id, self.user, 1)
+        self.assertEqual((board.me.rank, board.me.approximate), (4, False))
+
+        with mock.patch.object(leaderboard, 'EXACT_RANK_LIMIT', 2):
+            # До пересчёта — место за соседом с теми же или большими баллами
+            me = leaderboard.rank_of(Ranking.SCOPE_TOPIC, self.topic.id, self.user)
+            self.assertEqual((me.rank, me.approximate), (3, True))
+            leaderboard.refresh_positions()
+            me = leaderboard.rank_of(Ranking.SCOPE_TOPIC, self.topic.id, self.user)
+            self.assertEqual((me.rank, me.approximate), (4, True))
+        self.assertEqual(leaderboard.refresh_positions(), 0)
+
+    def test_points_of_hidden_topic_reach_language_and_sector(self):
+        Topic.objects.filter(pk=self.topic.pk).update(is_active=False)
+        catalog._local_catalog = None
+        # Задача из очереди проверена, пока тема скрыта
+        leaderboard.record_results([GradeResult(self.user.id, self.topic.id, 3, 4)])
+        Topic.objects.filter(pk=self.topic.pk).update(is_active=True)
+        catalog._local_catalog = None
+        leaderboard.record_results([GradeResult(self.user.id, self.topic.id, 4, 4)])
+        self.assertEqual(self.points(Ranking.SCOPE_LANGUAGE, self.lang.id), 4)
+        self.assertEqual(self.points(Ranking.SCOPE_SECTOR, self.sector.id), 4)
+        UserProgress.objects.create(user=self.user, topic=self.topic, score=4, max_score=4)
+        leaderboard.rebuild()
+        self.assertEqual(self.points(Ranking.SCOPE_LANGUAGE, self.lang.id), 4)
+
+
+class ReviewScheduleTests(CatalogTestCase):
+    def grade(self):
+        grade_submissions([SubmittedAnswers(self.user.id, self.topic.id, self.all_correct())])
+
+    def item(self):
+        return ReviewItem.objects.get(user=self.user, question=self.single)
+
+    def test_nightly_replay_keeps_newer_review_answer(self):
+        self.grade()
+        review.schedule_from_attempts()
+        self.grade()
+        answered_at = timezone.now() + timedelta(hours=1)
+        review.record_reviews(self.user.id, {self.single.id: [str(self.wrong.id)]}, now=answered_at)
+
+        # Верная попытка из журнала старше ответа в режиме повторения
+        review.schedule_from_attempts()
+        item = self.item()
+        self.assertEqual((item.repetitions, item.reviewed_at), (0, answered_at))
+
+        self.grade()
+        Attempt.objects.filter(pk=Attempt.objects.latest('pk').pk).update(
+            created_at=answered_at + timedelta(hours=1))
+        review.schedule_from_attempts()
+        self.assertEqual(self.item().repetitions, 1)
+
+
+@override_settings(TEST_SUBMIT_BURST=1, TEST_SUBMIT_PER_MINUTE=1, ASYNC_GRADING=False)
+class OfflineSyncTests(CatalogTestCase):
+    def item(self, attempt_key=None, user_id=None, **extra):
+        return {
+            'attempt_key': attempt_key or throttling.new_idempotency_key(),
+            'variant': offline.sign_variant(user_id or self.user.id, self.topic.id, None,
+                                            get_answer_key(self.topic.id)),
+            'answers': {str(question_id): value for question_id, value in self.all_correct().items()},
+            **extra,
+        }
+
+    def statuses(self, items):
+        return [result['status'] for result in offline.sync_submissions(self.user.id, items)]
+
+    def test_batch_statuses(self):
+        pending = throttling.new_idempotency_key()
+        throttling.claim(self.user.id, pending)
+        items = [
+            self.item(),
+            self.item(),
+            self.item(attempt_key='not-a-key'),
+            self.item(variant='broken'),
+            self.item(user_id=self.user.id + 1),
+            self.item(attempt_key=pending),
+        ]
+        self.assertEqual(self.statuses(items),
+                         ['graded', 'throttled', 'invalid', 'invalid', 'foreign', 'pending'])
+        self.assertEqual(UserProgress.objects.get(user=self.user, topic=self.topic).attempts, 1)
+        # Отклонённая по частоте попытка не держит свой ключ
+        self.assertIsNone(throttling.claim(self.user.id, items[1]['attempt_key']))
+
+    def test_replayed_key_returns_stored_result(self):
+        item = self.item()
+        [first] = offline.sync_submissions(self.user.id, [item])
+        [again] = offline.sync_submissions(self.user.id, [item])
+        self.assertEqual((again['status'], again['score']), ('graded', first['score']))
+        self.assertEqual(UserProgress.objects.get(user=self.user, topic=self.topic).attempts, 1)
+
+    def test_hidden_question_makes_variant_stale(self):
+        item = self.item()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.text.is_active = False
+            self.text.save()
+        [result] = offline.sync_submissions(self.user.id, [item])
+        self.assertEqual(result['status'], 'invalid')
+        self.assertIn('откройте тест заново', result['error'])
+        self.assertFalse(UserProgress.objects.filter(user=self.user, topic=self.topic).exists())
+
+    def test_batch_size_limit(self):
+        with self.assertRaises(offline.SyncError):
+            offline.sync_submissions(self.user.id, [self.item() for _ in range(offline.MAX_BATCH + 1)])
+
+    def test_keys_released_when_grading_fails(self):
+        item = self.item()
+        with mock.patch.object(offline, 'grade_submissions', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                offline.sync_submissions(self.user.id, [item])
+        self.assertIsNone(throttling.claim(self.user.id, item['attempt_key']))
+
+    def test_api_sync(self):
+        url = reverse('api_sync')
+        self.assertEqual(self.client.post(url, '{}', content_type='application/json').status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(url, 'nonsense', content_type='application/json').status_code, 400)
+        response = self.client.post(url, {'submissions': [self.item()]}, content_type='application/json')
+        self.assertEqual(response.json()['results'][0]['status'], 'graded')
+
+    def test_shell_names_outbox_owner(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('topic_test_offline', kwargs={
+            'sector_slug': 'prog', 'lang_slug': 'python', 'topic_slug': 'basics'}))
+        self.assertContains(response, f'data-user="{self.user.id}"')
+
+
+class JsonApiTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse('api_questions', kwargs={'sector_slug': 'prog', 'lang_slug': 'python',
+                                                    'topic_slug': 'basics'})
+
+    def test_not_modified_until_content_edit(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.single.text = '3 + 3?'
+            self.single.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['questions'][0]['text'], '3 + 3?')
+
+    def test_etag_depends_on_encoding(self):
+        plain = self.client.get(self.url)
+        packed = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotEqual(plain['ETag'], packed['ETag'])
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(packed.content), plain.content)
+
+    def test_bundle_redirects_to_immutable_address(self):
+        url = reverse('api_topic_bundle', kwargs={'sector_slug': 'prog', 'lang_slug': 'python',
+                                                  'topic_slug': 'basics'})
+        redirect = self.client.get(url)
+        self.assertEqual(redirect.status_code, 302)
+        self.assertTrue(redirect['Location'].startswith(f'{url}?v='))
+        response = self.client.get(redirect['Location'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(f'{url}?v=stale').status_code, 302)
+
+    def test_streamed_dump(self):
+        response = self.client.get(reverse('api_dump'))
+        self.assertTrue(response.streaming)
+        [topic] = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([question['code'] for question in topic['questions']], ['q1', 'q2', 'q3'])
+        # Варианты текстового вопроса — это правильные ответы
+        self.assertEqual(topic['questions'][2]['answers'], [])
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_dump')).status_code, 401)
+
+
+class TestPageTests(SubmitTestCase):
+    def page(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        return [chunk.decode() for chunk in response.streaming_content]
+
+    def test_stream_has_every_drawn_question_escaped(self):
+        for order in range(4, 9):
+            Question.objects.create(topic=self.topic, code=f'q{order}', text=f'<b>{order}</b> & ?',
+                                    question_type='text', order=order)
+        Topic.objects.filter(pk=self.topic.pk).update(questions_per_test=5)
+        catalog._local_catalog = None
+        with mock.patch.object(test_page, 'CHUNK_QUESTIONS', 2):
+            chunks = self.page()
+        # Шапка, три пачки вопросов по две и хвост страницы
+        self.assertEqual(len(chunks), 5)
+        html = ''.join(chunks)
+        variant = re.search(r'name="variant" value="([^"]+)"', html).group(1)
+        _, seed, drawn = offline.unsign_variant(variant, self.user.id)
+        self.assertEqual(drawn, [question.id for question in get_answer_key(self.topic.id).draw(seed).questions])
+        self.assertEqual(html.count('class="question"'), 5)
+        for question_id, text in Question.objects.filter(pk__in=drawn).values_list('id', 'text'):
+            self.assertIn(f'name="question_{question_id}"', html)
+            self.assertIn(escape(text), html)
+        self.assertNotIn('<b>', html)
+
+    def test_answer_edit_shows_in_next_render(self):
+        self.assertIn('>\n5\n</label>', ''.join(self.page()))
+        name = answer_key_version_name(self.topic.id)
+        before = get_version(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wrong.text = 'пять'
+            self.wrong.save()
+        self.assertGreater(get_version(name), before)
+        html = ''.join(self.page())
+        self.assertIn('пять', html)
+        self.assertNotIn('>\n5\n</label>', html)
+
+
+class AttemptLogTests(CatalogTestCase):
+    def test_pack_round_trip(self):
+        records = [
+            AnswerRecord(1, True, (2, 3)),
+            AnswerRecord(2 ** 32 - 1, False, (2 ** 31 + 5,)),
+            AnswerRecord(70000, True, ()),
+        ]
+        packed = attempts.pack_answers(records)
+        self.assertEqual(len(packed), 4 * (2 + 2 + 2 + 1 + 2))
+        self.assertEqual(attempts.unpack_answers(memoryview(packed)), records)
+        self.assertEqual(attempts.unpack_answers(b''), [])
+
+    def log(self, shares):
+        """Попытки разных пользователей: (доля попытки, верен ли ответ на q1)."""
+        entries = []
+        for share, correct in shares:
+            user = User.objects.create_user(f'user{User.objects.count()}')
+            entries.append((
+                Attempt(user=user, topic=self.topic, score=round(share * 4), total_points=4),
+                [AnswerRecord(self.single.id, correct, (self.right.id if correct else self.wrong.id,))],
+            ))
+        attempts.log_attempts(entries)
+
+    def test_counters_and_discrimination(self):
+        shares = [(1.0, True), (0.75, True), (0.5, False), (0.25, True), (0.0, False)]
+        self.log(shares[:2])
+        self.log(shares[2:])
+        stats = QuestionStats.objects.get(question=self.single)
+        self.assertEqual((stats.attempts, stats.correct), (5, 3))
+        self.assertAlmostEqual(stats.difficulty, 0.6)
+        expected = statistics.correlation([share for share, _ in shares],
+                                          [float(correct) for _, correct in shares])
+        self.assertAlmostEqual(stats.discrimination, expected)
+
+        self.assertEqual(attempts.rebuild_question_stats(), 1)
+        rebuilt = QuestionStats.objects.get(question=self.single)
+        self.assertEqual((rebuilt.attempts, rebuilt.correct), (5, 3))
+        self.assertAlmostEqual(rebuilt.discrimination, expected)
+
+    def test_discrimination_needs_both_outcomes(self):
+        self.log([(1.0, True), (0.5, True)])
+        self.assertIsNone(QuestionStats.objects.get(question=self.single).discrimination)
+
+
+class AdminToolsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', password='pw12345!')
+        self.client.force_login(self.admin)
+        self.changelist = reverse('admin:bazaznaniy_question_changelist')
+
+    def test_changelist_with_input_filters(self):
+        other = Topic.objects.create(lang=self.lang, name='Функции', slug='functions')
+        Question.objects.create(topic=other, code='f1', text='Что такое def?', order=1)
+        for value in (str(self.topic.id), 'Осн'):
+            response = self.client.get(self.changelist, {'topic': value})
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, '2 + 2?')
+            self.assertNotContains(response, 'Что такое def?')
+        # На SQLite оценки нет — точный COUNT
+        self.assertIsNone(admin_tools.estimate_count(Question.objects.all()))
+        self.assertEqual(admin_tools.EstimatedCountPaginator(Question.objects.order_by('pk'), 2).count, 4)
+
+    def test_reorder_numbers_within_topic(self):
+        Question.objects.filter(pk__in=[self.single.pk, self.multiple.pk]).update(order=5)
+        Question.objects.filter(pk=self.text.pk).update(order=1)
+        version = get_version(answer_key_version_name(self.topic.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.changelist, {
+                'action': 'renumber',
+                '_selected_action': [self.single.pk, self.multiple.pk, self.text.pk],
+            })
+        self.assertEqual(response.status_code, 302)
+        orders = dict(Question.objects.filter(topic=self.topic).values_list('pk', 'order'))
+        self.assertEqual(orders, {self.text.pk: 10, self.single.pk: 20, self.multiple.pk: 30})
+        self.assertGreater(get_version(answer_key_version_name(self.topic.id)), version)
+
+    @override_settings(TEST_PASS_PERCENTAGE=70)
+    def test_recompute_progress_uses_attempt_log(self):
+        progress = UserProgress.objects.create(user=self.user, topic=self.topic, score=2, max_score=4,
+                                               attempts=2, last_attempt_at=timezone.now())
+        Attempt.objects.create(user=self.user, topic=self.topic, score=3, total_points=4, answers=b'')
+        self.assertEqual(admin_tools.recompute_progress(UserProgress.objects.all()), 1)
+        progress.refresh_from_db()
+        self.assertTrue(progress.is_completed)
+        self.assertEqual(LanguageProgress.objects.get(user=self.user, language=self.lang).completed_topics, 1)
+        # Повторный пересчёт ничего не меняет
+        self.assertEqual(admin_tools.recompute_progress(UserProgress.objects.all()), 0)
+
+
+class PerformanceMiddlewareTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def header_queries(self, response):
+        return int(re.search(r'desc="(\d+) queries', response['Server-Timing']).group(1))
+
+    def test_plain_response_is_recorded_at_once(self):
+        with mock.patch.object(perf, 'record') as record:
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('before body', response['Server-Timing'])
+        [call] = record.call_args_list
+        self.assertEqual(call.args[0], 'profile')
+        self.assertEqual(call.args[2], self.header_queries(response))
+
+    def test_stream_queries_are_counted_to_the_end(self):
+        with mock.patch.object(perf, 'record') as record:
+            response = self.client.get(reverse('api_dump'))
+            self.assertIn('before body', response['Server-Timing'])
+            record.assert_not_called()
+            b''.join(response.streaming_content)
+        [call] = record.call_args_list
+        self.assertEqual(call.args[0], 'api_dump')
+        # Вопросы и советы читаются уже во время потока
+        self.assertGreater(call.args[2], self.header_queries(response))
+
+
+class SeedCatalogTests(TestCase):
+    def seed(self, *args):
+        call_command('seed_catalog', '--sectors=1', '--languages=1', '--topics=2', '--questions=2',
+                     '--users=2', '--progress=1', *args, stdout=io.StringIO())
+
+    def test_second_run_needs_clear(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.seed('--clear')
+        self.assertEqual(Topic.objects.count(), 2)
+        # Поиск по сгенерированному каталогу не пустой
+        self.assertGreater(search.search('Вопрос').total, 0)
+
+
+class ReplaySubmissionsTests(CatalogTestCase):
+    def replay(self, *records):
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / 'replay.jsonl'
+        path.write_text('\n'.join(records), encoding='utf-8')
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('replay_submissions', str(path), '--batch-size=2', stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def record(self, **fields):
+        return json.dumps({'user_id': self.user.id, 'topic_id': self.topic.id,
+                           'answers': {str(key): value for key, value in self.all_correct().items()},
+                           **fields})
+
+    def test_invalid_lines_are_skipped_with_line_numbers(self):
+        stdout, stderr = self.replay(
+            self.record(),
+            self.record(answers={'abc': ['1']}),
+            '{"topic_id": 1}',
+            self.record(user_id=self.user.id + 100),
+            self.record(topic_id=self.topic.id + 100),
+            'not json',
+            self.record(seed='x'),
+        )
+        self.assertIn('Проверено 1 тестов', stdout)
+        self.assertIn('Пропущено строк: 6', stdout)
+        for line_no in range(2, 8):
+            self.assertIn(f'Строка {line_no}:', stderr)
+        self.assertEqual(UserProgress.objects.get(user=self.user, topic=self.topic).score, 4)
+
+    def test_missing_file_is_command_error(self):
+        with self.assertRaises(CommandError):
+            call_command('replay_submissions', '/nonexistent/replay.jsonl', stdout=io.StringIO())
+
+    def test_grading_ignores_non_integer_question_ids(self):
+        answers = {**self.all_correct(), 'abc': ['1']}
+        [result] = grade_submissions([SubmittedAnswers(self.user.id, self.topic.id, answers)])
+        self.assertEqual(result.score, 4)
+
+
+class ProfileProgressTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        topics = Topic.objects.bulk_create([
+            Topic(lang=self.lang, name=f'Тема {number}', slug=f'topic-{number}') for number in range(24)
+        ])
+        UserProgress.objects.bulk_create([
+            UserProgress(user=self.user, topic=topic, score=number % 5, max_score=4, attempts=1,
+                         is_completed=number % 5 >= 3)
+            for number, topic in enumerate([self.topic, *topics])
+        ])
+        self.client.force_login(self.user)
+
+    def items(self, page):
+        return [item.topic_slug for group in page.groups for item in group.items]
+
+    def test_profile_shows_first_page_and_summary(self):
+        response = self.client.get(reverse('profile'))
+        progress = response.context['progress']
+        self.assertEqual(len(self.items(progress)), api.PAGE_SIZE)
+        self.assertContains(response, f'data-cursor="{progress.next_cursor}"')
+        self.assertContains(response, 'Пройдено тем: 10 из 25')
+
+    def test_api_pages_cover_every_row_once(self):
+        slugs = []
+        cursor = ''
+        while True:
+            response = self.client.get(reverse('api_progress'), {'cursor': cursor, 'limit': 7})
+            data = response.json()
+            slugs += [item['topic_slug'] for group in data['groups'] for item in group['items']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(sorted(slugs), sorted(Topic.objects.values_list('slug', flat=True)))
+        self.assertEqual(data['summary']['completed_topics'], 10)
+        self.assertEqual(data['summary']['attempted_topics'], 25)
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get(reverse('api_progress'), {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_summary_cache_is_finite_and_follows_results(self):
+        with mock.patch.object(progress.cache, 'set', wraps=progress.cache.set) as cache_set:
+            self.assertEqual(progress.progress_summary(self.user.id).attempts, 25)
+        self.assertEqual(cache_set.call_args.args[2], progress.SUMMARY_TIMEOUT)
+        with self.captureOnCommitCallbacks(execute=True):
+            grade_submissions([SubmittedAnswers(self.user.id, self.topic.id, self.all_correct())])
+        self.assertEqual(progress.progress_summary(self.user.id).attempts, 26)
+
+
+class StartupTests(TestCase):
+    def test_warm_up_compiles_project_templates_without_db(self):
+        [loader] = engines['django'].engine.template_loaders
+        loader.reset()
+        with mock.patch.object(startup, 'connect_databases') as connect, \
+                self.assertLogs('bazaznaniy.startup', 'INFO') as logs:
+            startup.warm_up(connect_db=False)
+        connect.assert_not_called()
+        project = {path.relative_to(directory).as_posix()
+                   for directory in get_template_directories() for path in directory.rglob('*.html')}
+        self.assertIn('bazaznaniy/topic_test.html', project)
+        self.assertIn(f'шаблонов {len(project)}', logs.output[0])
+        self.assertLessEqual(project, set(loader.get_template_cache))
+
+    def test_profile_startup_reports_stages(self):
+        # Как тестовый клиент: конец запроса не должен закрывать соединение внутри транзакции теста
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        result = startup.profile_startup(warm=True, path='/')
+        self.assertEqual([row['stage'] for row in result['stages']], [
+            'django.setup()', 'WSGIHandler (middleware)', 'bazaznaniy/urls.py', 'mysite/urls.py',
+            'URL resolver', 'templates', 'DB connection', 'first GET /', 'second GET /',
+        ])
+        self.assertEqual(result['status'], '200 OK')
+        self.assertGreater(result['modules'], 0)
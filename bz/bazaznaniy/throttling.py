@@ -0,0 +1,89 @@
+"""Защита отправки теста от лишней нагрузки и повторов.
+
+Ограничение частоты — token bucket на пару (пользователь, тема) в общем
+кэше: в корзине до TEST_SUBMIT_BURST жетонов, они пополняются со
+скоростью TEST_SUBMIT_PER_MINUTE в минуту, каждая проверка теста
+забирает один жетон. Корзина читается и пишется без блокировки, поэтому
+при гонке параллельных запросов может пропустить лишнюю отправку — это
+допустимо, цель лимита в том, чтобы не пускать поток повторов в базу.
+
+Повторы одной и той же формы (двойной щелчок, повторная отправка после
+обрыва связи) отсекаются ключом идемпотентности: он выдаётся вместе с
+формой теста, а первый POST с этим ключом занимает его через cache.add.
+Результат проверки сохраняется под ключом, и повторный POST получает
+его без новой проверки и без новой попытки в журнале. Пока первый запрос
+проверяет тест, повторный не ждёт его, а сразу получает ответ «проверяется»:
+иначе каждый повтор держал бы воркер. Отправка без ключа или с чужим
+ключом отклоняется — без ключа повторы не отличить от новых попыток.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+PENDING = 'pending'
+
+
+def _bucket_key(user_id, topic_id):
+    return f'bz:ratelimit:{user_id}:{topic_id}'
+
+
+def _idempotency_key(user_id, key):
+    return f'bz:idempotency:{user_id}:{key}'
+
+
+def take_token(user_id, topic_id):
+    """Забирает жетон на проверку теста.
+
+    Возвращает 0, если жетон выдан, иначе — через сколько секунд
+    появится следующий.
+    """
+    capacity = settings.TEST_SUBMIT_BURST
+    rate = settings.TEST_SUBMIT_PER_MINUTE / 60
+    if capacity <= 0 or rate <= 0:
+        return 0
+
+    now = time.time()
+    bucket = _bucket_key(user_id, topic_id)
+    tokens, updated_at = cache.get(bucket) or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+    # Полная корзина не отличается от отсутствующей, дольше её хранить незачем
+    timeout = int(capacity / rate) + 1
+    if tokens < 1:
+        cache.set(bucket, (tokens, now), timeout)
+        return (1 - tokens) / rate
+    cache.set(bucket, (tokens - 1, now), timeout)
+    return 0
+
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def valid_idempotency_key(key):
+    try:
+        return uuid.UUID(hex=key).hex == key
+    except (TypeError, ValueError):
+        return False
+
+
+def claim(user_id, key):
+    """Занимает ключ идемпотентности.
+
+    Возвращает None, если ключ занят этим запросом и тест нужно
+    проверять, иначе — сохранённый результат (или PENDING, если первый
+    запрос с этим ключом ещё не закончил проверку).
+    """
+    name = _idempotency_key(user_id, key)
+    if cache.add(name, PENDING, settings.TEST_IDEMPOTENCY_TIMEOUT):
+        return None
+    return cache.get(name, PENDING)
+
+
+def store_result(user_id, key, result):
+    cache.set(_idempotency_key(user_id, key), result, settings.TEST_IDEMPOTENCY_TIMEOUT)
+
+
+def release(user_id, key):
+    cache.delete(_idempotency_key(user_id, key))
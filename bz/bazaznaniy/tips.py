@@ -0,0 +1,51 @@
+"""Полезные советы: выборки для страниц и пакетная перерисовка HTML.
+
+Страницы читают только готовый content_html. Списки берутся по индексу
+(topic, is_active, order): фильтр по теме (или списку тем языка) и
+активности, сортировка по порядку внутри темы.
+"""
+from django.db import transaction
+
+from .models import Tip
+
+CHUNK_SIZE = 500
+
+
+def _active(topic_ids):
+    return (
+        Tip.objects.filter(topic_id__in=topic_ids, is_active=True)
+        .order_by('topic_id', 'order')
+        .only('id', 'topic_id', 'title', 'content_html')
+    )
+
+
+def topic_tips(topic):
+    return list(_active([topic.id]))
+
+
+def language_tips(lang):
+    """Пары (тема, советы) в порядке тем каталога; темы без советов пропускаются."""
+    by_topic = {}
+    for tip in _active([topic.id for topic in lang.topics]):
+        by_topic.setdefault(tip.topic_id, []).append(tip)
+    return [(topic, by_topic[topic.id]) for topic in lang.topics if topic.id in by_topic]
+
+
+def rerender(force=False):
+    """Перерисовывает устаревшие советы пачками. Возвращает (проверено, перерисовано)."""
+    checked = rendered = 0
+    last_id = 0
+    while True:
+        chunk = list(
+            Tip.objects.filter(pk__gt=last_id).order_by('pk')
+            .only('id', 'content', 'content_html', 'content_hash')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            return checked, rendered
+        last_id = chunk[-1].pk
+        changed = [tip for tip in chunk if tip.render_content(force=force)]
+        if changed:
+            with transaction.atomic():
+                Tip.objects.bulk_update(changed, ['content_html', 'content_hash'])
+        checked += len(chunk)
+        rendered += len(changed)
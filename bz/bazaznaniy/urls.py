@@ -6,7 +6,29 @@ urlpatterns = [
     path('sector/<slug:slug>/', views.sector_detail, name='sector_detail'),
     path('sector/<slug:sector_slug>/lang/<slug:lang_slug>/', views.lang_detail, name='lang_detail'),
     path('sector/<slug:sector_slug>/lang/<slug:lang_slug>/topic/<slug:topic_slug>/', views.topic_detail, name='topic_detail'),
+    path('sector/<slug:sector_slug>/lang/<slug:lang_slug>/tips/', views.lang_tips, name='lang_tips'),
+    path('sector/<slug:sector_slug>/lang/<slug:lang_slug>/topic/<slug:topic_slug>/tips/', views.topic_tips, name='topic_tips'),
     path('sector/<slug:sector_slug>/lang/<slug:lang_slug>/topic/<slug:topic_slug>/test/', views.topic_test, name='topic_test'),
+    path('sector/<slug:sector_slug>/lang/<slug:lang_slug>/topic/<slug:topic_slug>/test/offline/', views.topic_test_offline, name='topic_test_offline'),
+    path('sector/<slug:slug>/leaderboard/', views.sector_leaderboard, name='sector_leaderboard'),
+    path('sector/<slug:sector_slug>/lang/<slug:lang_slug>/leaderboard/', views.lang_leaderboard, name='lang_leaderboard'),
+    path('sector/<slug:sector_slug>/lang/<slug:lang_slug>/topic/<slug:topic_slug>/leaderboard/', views.topic_leaderboard, name='topic_leaderboard'),
+    path('review/', views.review_questions, name='review'),
+    path('submission/<int:pk>/status/', views.submission_status, name='submission_status'),
+    path('submission/<int:pk>/', views.submission_result, name='submission_result'),
+    path('search/', views.search, name='search'),
+    path('search.json', views.search_json, name='search_json'),
+    path('perf/', views.perf_report, name='perf_report'),
     path('register/', views.register, name='register'),
     path('profile/', views.profile, name='profile'),
+    path('api/progress/', views.api_progress, name='api_progress'),
+    path('api/sectors/', views.api_sectors, name='api_sectors'),
+    path('api/sectors/<slug:sector_slug>/', views.api_sector, name='api_sector'),
+    path('api/sectors/<slug:sector_slug>/<slug:lang_slug>/', views.api_language, name='api_language'),
+    path('api/sectors/<slug:sector_slug>/<slug:lang_slug>/<slug:topic_slug>/', views.api_topic, name='api_topic'),
+    path('api/sectors/<slug:sector_slug>/<slug:lang_slug>/<slug:topic_slug>/questions/', views.api_questions, name='api_questions'),
+    path('api/sectors/<slug:sector_slug>/<slug:lang_slug>/<slug:topic_slug>/bundle/', views.api_topic_bundle, name='api_topic_bundle'),
+    path('api/sync/', views.api_sync, name='api_sync'),
+    path('api/dump/', views.api_dump, name='api_dump'),
+    path('sw.js', views.service_worker, name='service_worker'),
 ]
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""Счётчики версий контента в общем кэше.
+
+Версия — это метка времени в миллисекундах, которая только растёт.
+Кэшированные структуры хранят версию, с которой они были построены,
+и перестраиваются, как только версия в кэше изменилась.
+
+Версию сдвигают только после коммита (bump_version_on_commit): иначе
+параллельный запрос увидит новую версию раньше новых строк, соберёт кэш
+по старым и сохранит его под новой версией до следующей правки.
+
+Версии видны другим процессам только через общий кэш (Redis, memcached).
+С locmem у каждого процесса свои версии, и правка, сделанная в одном
+воркере, не сбрасывает кэши остальных — поэтому несколько процессов с
+locmem не запускаются (см. is_shared_cache()).
+"""
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+def _key(name):
+    return f'bz:version:{name}'
+
+
+def is_shared_cache():
+    """Виден ли кэш (а с ним и версии) другим процессам."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def get_version(name):
+    """Текущая версия `name`; если её ещё нет в кэше — создаёт."""
+    version = cache.get(_key(name))
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(_key(name), version, timeout=None):
+            version = cache.get(_key(name), version)
+    return version
+
+
+def bump_version(name):
+    """Сдвигает версию `name`, делая устаревшими все кэши, построенные на ней."""
+    current = cache.get(_key(name)) or 0
+    version = max(int(time.time() * 1000), current + 1)
+    cache.set(_key(name), version, timeout=None)
+    return version
+
+
+def bump_version_on_commit(*names):
+    """Сдвигает версии `names` после коммита текущей транзакции (или сразу вне неё)."""
+    def bump():
+        for name in names:
+            bump_version(name)
+    transaction.on_commit(bump)
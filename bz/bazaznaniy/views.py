@@ -1,69 +1,244 @@
+import functools
+import json
+import math
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import HttpResponse, JsonResponse
+from django.utils.functional import SimpleLazyObject
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_POST
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import login, logout
-from .models import Sector, Language, Topic, Question, Answer, UserProgress
+from .models import Sector, Language, Topic, Question, Answer, UserProgress, Submission, Ranking
+from .grading import (StaleVariant, SubmittedAnswers, answer_key_version_name, answers_from_post,
+                      get_answer_key, grade_submissions, new_seed)
+from .grading_queue import enqueue
+from .catalog import CATALOG_VERSION, get_catalog, get_or_404
+from .progress import language_rings, progress_summary
+from .page_cache import cache_anonymous_page
+from .versions import get_version
+from . import api, catalog_stats, leaderboard, offline, perf, review, test_page, throttling, tips, search as search_index
 
+@cache_anonymous_page
 def index(request):
-    sectors = Sector.objects.filter(is_active=True).order_by('order', 'name')
-    print("Sectors:", list(sectors))  # Отладочный вывод
-    return render(request, 'bazaznaniy/index.html', {'sectors': sectors})
+    catalog = get_catalog()
+    return render(request, 'bazaznaniy/index.html', {'sectors': catalog.sectors, 'catalog_version': catalog.version})
 
+@cache_anonymous_page(versions=(CATALOG_VERSION, catalog_stats.STATS_VERSION), refresh=catalog_stats.RESULTS_TTL)
 def sector_detail(request, slug):
-    sector = get_object_or_404(Sector, slug=slug)
-    return render(request, 'bazaznaniy/sector_detail.html', {'sector': sector})
+    sector = get_or_404(get_catalog().sector(slug))
+    stats = catalog_stats.language_stats(lang.id for lang in sector.languages)
+    return render(request, 'bazaznaniy/sector_detail.html', {
+        'sector': sector,
+        'languages': [
+            (lang, progress, stats.get(lang.id))
+            for lang, progress in language_rings(request.user, sector)
+        ],
+    })
 
+@cache_anonymous_page(versions=(CATALOG_VERSION, catalog_stats.STATS_VERSION), refresh=catalog_stats.RESULTS_TTL)
 def lang_detail(request, sector_slug, lang_slug):
-    lang = get_object_or_404(Language, sector__slug=sector_slug, slug=lang_slug)
-    return render(request, 'bazaznaniy/lang_detail.html', {'lang': lang})
+    catalog = get_catalog()
+    lang = get_or_404(catalog.language(sector_slug, lang_slug))
+    return render(request, 'bazaznaniy/lang_detail.html', {
+        'lang': lang,
+        'catalog_version': catalog.version,
+        'stats_version': get_version(catalog_stats.STATS_VERSION),
+        'results_epoch': catalog_stats.results_epoch(),
+        'results_ttl': catalog_stats.RESULTS_TTL,
+        # Читается, только если фрагмент списка тем не взят из кэша
+        'topics': SimpleLazyObject(lambda: _with_stats(lang.topics)),
+    })
 
+@cache_anonymous_page
 def topic_detail(request, sector_slug, lang_slug, topic_slug):
-    topic = get_object_or_404(Topic, lang__sector__slug=sector_slug, lang__slug=lang_slug, slug=topic_slug)
-    return render(request, 'bazaznaniy/topic_detail.html', {'topic': topic})
+    catalog = get_catalog()
+    topic = get_or_404(catalog.topic(sector_slug, lang_slug, topic_slug))
+    return render(request, 'bazaznaniy/topic_detail.html', {'topic': topic, 'catalog_version': catalog.version})
+
+def _with_stats(topics):
+    stats = catalog_stats.topic_stats(topic.id for topic in topics)
+    return [(topic, stats.get(topic.id)) for topic in topics]
+
+def lang_tips(request, sector_slug, lang_slug):
+    lang = get_or_404(get_catalog().language(sector_slug, lang_slug))
+    return render(request, 'bazaznaniy/tips.html', {
+        'title': lang.name, 'lang': lang, 'groups': tips.language_tips(lang),
+    })
+
+def topic_tips(request, sector_slug, lang_slug, topic_slug):
+    topic = get_or_404(get_catalog().topic(sector_slug, lang_slug, topic_slug))
+    return render(request, 'bazaznaniy/tips.html', {
+        'title': topic.name, 'topic': topic, 'groups': [(topic, tips.topic_tips(topic))],
+    })
 
 @login_required
 def topic_test(request, sector_slug, lang_slug, topic_slug):
-    topic = get_object_or_404(Topic, lang__sector__slug=sector_slug, lang__slug=lang_slug, slug=topic_slug)
-    questions = topic.questions.filter(is_active=True).order_by('order')
+    topic = get_or_404(get_catalog().topic(sector_slug, lang_slug, topic_slug))
+    key = get_answer_key(topic.id)
 
     if request.method == 'POST':
-        score = 0
-        total_points = 0
-        for question in questions:
-            total_points += question.points
-            if question.question_type == 'single':
-                selected_answer_id = request.POST.get(f'question_{question.id}')
-                if selected_answer_id:
-                    selected_answer = Answer.objects.get(id=selected_answer_id)
-                    if selected_answer.is_correct:
-                        score += question.points
-            elif question.question_type == 'multiple':
-                selected_answer_ids = request.POST.getlist(f'question_{question.id}')
-                correct_answers = question.answers.filter(is_correct=True).count()
-                correct_selected = sum(1 for ans_id in selected_answer_ids if Answer.objects.get(id=ans_id).is_correct)
-                incorrect_selected = len(selected_answer_ids) - correct_selected
-                if correct_selected == correct_answers and incorrect_selected == 0:
-                    score += question.points
-            else:  # text
-                user_answer = request.POST.get(f'question_{question.id}', '').strip()
-                correct_answer = question.correct_answer_text.strip()
-                if user_answer.lower() == correct_answer.lower():
-                    score += question.points
-
-        # Сохраняем прогресс пользователя
-        UserProgress.objects.update_or_create(
-            user=request.user,
-            topic=topic,
-            defaults={'score': score, 'total_points': total_points}
-        )
-        return render(request, 'bazaznaniy/test_result.html', {
-            'topic': topic,
-            'score': score,
-            'total_points': total_points,
-            'percentage': (score / total_points * 100) if total_points > 0 else 0
+        attempt_key = request.POST.get('attempt_key', '')
+        if not throttling.valid_idempotency_key(attempt_key):
+            # Форма без ключа (устаревшая или собранная вручную): повтор не отличить от новой попытки
+            return render(request, 'bazaznaniy/test_throttled.html', {'topic': topic, 'stale_form': True},
+                          status=400)
+        stored = throttling.claim(request.user.id, attempt_key)
+        if stored is not None:
+            return _submitted_response(request, topic, stored)
+
+        retry_after = throttling.take_token(request.user.id, topic.id)
+        if retry_after:
+            throttling.release(request.user.id, attempt_key)
+            response = render(request, 'bazaznaniy/test_throttled.html', {
+                'topic': topic, 'retry_after': math.ceil(retry_after),
+            }, status=429)
+            response['Retry-After'] = str(math.ceil(retry_after))
+            return response
+
+        try:
+            # Зерно и вопросы варианта приходят подписанными в самой форме (как в режиме
+            # без сети), поэтому вторая вкладка и повторная отправка не теряют свой вариант
+            seed, question_ids = _form_variant(request, topic)
+            if key.is_pooled and seed is None and question_ids is None:
+                throttling.release(request.user.id, attempt_key)
+                return redirect('topic_test', sector_slug=sector_slug, lang_slug=lang_slug, topic_slug=topic_slug)
+            try:
+                variant = key.variant(seed, question_ids)
+            except StaleVariant:
+                # Вопрос удалили или скрыли, пока тест был открыт: по другому набору не проверяем
+                throttling.release(request.user.id, attempt_key)
+                return render(request, 'bazaznaniy/test_throttled.html', {'topic': topic, 'stale_variant': True},
+                              status=409)
+            answers = answers_from_post(variant, request.POST)
+            if settings.ASYNC_GRADING:
+                submission = enqueue(request.user.id, topic.id, answers, seed, question_ids)
+                stored = {'submission_id': submission.pk}
+            else:
+                result = grade_submissions([
+                    SubmittedAnswers(request.user.id, topic.id, answers, seed, question_ids),
+                ])[0]
+                stored = {
+                    'score': result.score,
+                    'total_points': result.total_points,
+                    'percentage': result.percentage,
+                }
+        except Exception:
+            throttling.release(request.user.id, attempt_key)
+            raise
+        throttling.store_result(request.user.id, attempt_key, stored)
+        return _submitted_response(request, topic, stored)
+
+    seed = new_seed() if key.is_pooled else None
+    variant = key.draw(seed)
+    return test_page.render_test(request, 'bazaznaniy/topic_test.html', {
+        'topic': topic,
+        'attempt_key': throttling.new_idempotency_key(),
+        'variant': offline.sign_variant(request.user.id, topic.id, seed, variant),
+    }, variant, seed)
+
+def _form_variant(request, topic):
+    """(seed, question_ids) из подписанного варианта формы; (None, None), если вариант чужой или испорчен."""
+    try:
+        topic_id, seed, question_ids = offline.unsign_variant(request.POST.get('variant'), request.user.id)
+    except offline.SyncError:
+        return None, None
+    return (seed, question_ids) if topic_id == topic.id else (None, None)
+
+def _submitted_response(request, topic, stored):
+    """Ответ на отправку теста по сохранённому результату."""
+    if stored == throttling.PENDING:
+        # Первая отправка с этим ключом всё ещё проверяется: не ждём её, повтор
+        # той же формы позже получит сохранённый результат
+        response = render(request, 'bazaznaniy/test_throttled.html', {'topic': topic, 'in_progress': True},
+                          status=202)
+        response['Retry-After'] = '2'
+        return response
+    if 'submission_id' in stored:
+        return redirect('submission_result', pk=stored['submission_id'])
+    return render(request, 'bazaznaniy/test_result.html', {'topic': topic, **stored})
+
+@login_required
+def topic_test_offline(request, sector_slug, lang_slug, topic_slug):
+    topic = get_or_404(get_catalog().topic(sector_slug, lang_slug, topic_slug))
+    key = get_answer_key(topic.id)
+    seed = new_seed() if key.is_pooled else None
+    variant = key.draw(seed)
+    return render(request, 'bazaznaniy/topic_test_offline.html', {
+        'topic': topic,
+        'question_ids': ','.join(str(question.id) for question in variant.questions),
+        'variant': offline.sign_variant(request.user.id, topic.id, seed, variant),
+        'bundle_url': '{}?v={}'.format(
+            reverse('api_topic_bundle', args=[sector_slug, lang_slug, topic_slug]),
+            api.version_tag(_topic_versions(sector_slug, lang_slug, topic_slug)),
+        ),
+    })
+
+def service_worker(request):
+    # Отдаётся из корня сайта, чтобы область действия охватывала страницы тестов
+    response = HttpResponse(_service_worker_source(), content_type='application/javascript; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@functools.lru_cache(maxsize=1)
+def _service_worker_source():
+    with open(finders.find('bazaznaniy/js/sw.js'), 'rb') as source:
+        return source.read()
+
+@login_required
+def review_questions(request):
+    results = None
+    if request.method == 'POST':
+        question_ids = [int(value) for value in request.POST.getlist('question_ids') if value.isdigit()]
+        results = review.record_reviews(request.user.id, {
+            question_id: request.POST.getlist(f'question_{question_id}') for question_id in question_ids
         })
 
-    return render(request, 'bazaznaniy/topic_test.html', {'topic': topic, 'questions': questions})
+    due = review.due_questions(request.user.id)
+    keys = {topic_id: get_answer_key(topic_id) for topic_id in {topic_id for _, topic_id in due}}
+    blocks = {}
+    for topic_id, key in keys.items():
+        blocks.update(test_page.get_blocks(topic_id, key.version))
+    questions = [blocks[question_id] for question_id, _ in due if question_id in blocks]
+    return render(request, 'bazaznaniy/review.html', {
+        'results': results,
+        'correct': sum(results.values()) if results else 0,
+        'question_ids': [block.id for block in questions],
+        'questions_html': mark_safe(''.join(
+            test_page.question_html(number, block, None) for number, block in enumerate(questions, 1)
+        )),
+        'due_count': review.due_count(request.user.id) if questions else 0,
+        'next_due_at': None if questions else review.next_due_at(request.user.id),
+    })
+
+@login_required
+def submission_status(request, pk):
+    submission = get_object_or_404(Submission, pk=pk, user=request.user)
+    return JsonResponse({
+        'status': submission.status,
+        'score': submission.score,
+        'total_points': submission.total_points,
+        'percentage': round(submission.percentage, 1),
+        'result_url': reverse('submission_result', args=[submission.pk]),
+    })
+
+@login_required
+def submission_result(request, pk):
+    submission = get_object_or_404(Submission, pk=pk, user=request.user)
+    topic = get_or_404(get_catalog().topic_by_id(submission.topic_id))
+    if submission.status != Submission.STATUS_DONE:
+        return render(request, 'bazaznaniy/grading.html', {'topic': topic, 'submission': submission})
+    return render(request, 'bazaznaniy/test_result.html', {
+        'topic': topic,
+        'score': submission.score,
+        'total_points': submission.total_points,
+        'percentage': submission.percentage,
+    })
 
 def register(request):
     if request.method == 'POST':
@@ -94,11 +269,127 @@ def profile(request):
     # Форма регистрации для неавторизованных пользователей
     register_form = UserCreationForm()
 
-    # Получаем прогресс пользователя, если он авторизован
-    progress = UserProgress.objects.filter(user=request.user) if request.user.is_authenticated else None
+    # Сводка и первая страница прогресса; следующие страницы подгружает api_progress
+    summary = progress = review_due = None
+    if request.user.is_authenticated:
+        summary = progress_summary(request.user.id)
+        progress = api.progress_page(request.user.id)
+        review_due = review.due_count(request.user.id)
 
     return render(request, 'bazaznaniy/profile.html', {
         'login_form': login_form,
         'register_form': register_form,
+        'summary': summary,
         'progress': progress,
-    })
\ No newline at end of file
+        'review_due': review_due,
+    })
+
+@login_required
+def api_progress(request):
+    try:
+        limit = min(max(int(request.GET.get('limit', api.PAGE_SIZE)), 1), api.MAX_PAGE_SIZE)
+        page = api.progress_page(request.user.id, request.GET.get('cursor'), limit)
+    except ValueError:
+        return JsonResponse({'error': 'Неверные параметры запроса'}, status=400)
+    return JsonResponse({
+        'summary': progress_summary(request.user.id)._asdict(),
+        **page.as_json(),
+    }, json_dumps_params={'ensure_ascii': False})
+
+@staff_member_required
+def perf_report(request):
+    return JsonResponse(perf.report(), json_dumps_params={'ensure_ascii': False})
+
+
+def _leaderboard(request, scope, node, title):
+    board = leaderboard.get_leaderboard(scope, node.id, request.user, settings.LEADERBOARD_SIZE)
+    return render(request, 'bazaznaniy/leaderboard.html', {'board': board, 'node': node, 'title': title})
+
+def sector_leaderboard(request, slug):
+    sector = get_or_404(get_catalog().sector(slug))
+    return _leaderboard(request, Ranking.SCOPE_SECTOR, sector, f'Отрасль «{sector.name}»')
+
+def lang_leaderboard(request, sector_slug, lang_slug):
+    lang = get_or_404(get_catalog().language(sector_slug, lang_slug))
+    return _leaderboard(request, Ranking.SCOPE_LANGUAGE, lang, f'Язык «{lang.name}»')
+
+def topic_leaderboard(request, sector_slug, lang_slug, topic_slug):
+    topic = get_or_404(get_catalog().topic(sector_slug, lang_slug, topic_slug))
+    return _leaderboard(request, Ranking.SCOPE_TOPIC, topic, f'Тема «{topic.name}»')
+
+
+def _topic_versions(sector_slug, lang_slug, topic_slug):
+    topic = get_or_404(get_catalog().topic(sector_slug, lang_slug, topic_slug))
+    return [CATALOG_VERSION, answer_key_version_name(topic.id)]
+
+@api.json_api()
+def api_sectors(request):
+    fields = api.requested_fields(request, api.SECTOR_FIELDS)
+    return {'sectors': [api.pick(api.sector_json(sector), fields) for sector in get_catalog().sectors]}
+
+@api.json_api()
+def api_sector(request, sector_slug):
+    fields = api.requested_fields(request, api.SECTOR_FIELDS)
+    return api.pick(api.sector_json(get_or_404(get_catalog().sector(sector_slug))), fields)
+
+@api.json_api()
+def api_language(request, sector_slug, lang_slug):
+    fields = api.requested_fields(request, api.LANGUAGE_FIELDS)
+    return api.pick(api.language_json(get_or_404(get_catalog().language(sector_slug, lang_slug))), fields)
+
+@api.json_api(versions=lambda **kwargs: [CATALOG_VERSION, api.CONTENT_VERSION])
+def api_topic(request, sector_slug, lang_slug, topic_slug):
+    fields = api.requested_fields(request, api.TOPIC_FIELDS)
+    return api.pick(api.topic_json(get_or_404(get_catalog().topic(sector_slug, lang_slug, topic_slug))), fields)
+
+@api.json_api(versions=_topic_versions, private=True)
+def api_questions(request, sector_slug, lang_slug, topic_slug):
+    fields = api.requested_fields(request, api.QUESTION_FIELDS)
+    topic = get_or_404(get_catalog().topic(sector_slug, lang_slug, topic_slug))
+    return {
+        'topic': topic.slug,
+        'questions': [api.pick(question, fields) for question in api.topic_questions(topic.id)],
+    }
+
+@api.json_api(versions=_topic_versions, private=True, immutable=True)
+def api_topic_bundle(request, sector_slug, lang_slug, topic_slug):
+    topic = get_or_404(get_catalog().topic(sector_slug, lang_slug, topic_slug))
+    return api.topic_bundle(topic, get_answer_key(topic.id).draw_size)
+
+@require_POST
+def api_sync(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется авторизация'}, status=401)
+    try:
+        items = json.loads(request.body).get('submissions')
+        results = offline.sync_submissions(request.user.id, items)
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Неверный формат запроса'}, status=400)
+    except offline.SyncError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({'results': results}, json_dumps_params={'ensure_ascii': False})
+
+@api.json_api(versions=lambda **kwargs: [CATALOG_VERSION, api.CONTENT_VERSION], private=True, stream=True)
+def api_dump(request):
+    return api.dump_topics(api.catalog_topics(request.GET.get('sector'), request.GET.get('lang')))
+
+
+def _search_page(request):
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 1
+    return search_index.search(request.GET.get('q', ''), page=page)
+
+def search(request):
+    return render(request, 'bazaznaniy/search.html', {'result': _search_page(request)})
+
+def search_json(request):
+    result = _search_page(request)
+    return JsonResponse({
+        'query': result.query,
+        'page': result.page,
+        'total': result.total,
+        'has_next': result.has_next,
+        'results': [item._asdict() for item in result.results],
+    }, json_dumps_params={'ensure_ascii': False})
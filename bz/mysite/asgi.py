@@ -1,7 +1,15 @@
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
 application = get_asgi_application()
+
+# Соединение с БД не открываем: под ASGI синхронный код каждого запроса
+# идёт в своём потоке, а соединения Django привязаны к потоку.
+if settings.WARM_UP_ON_START:
+    from bazaznaniy.startup import warm_up
+
+    warm_up(connect_db=False)
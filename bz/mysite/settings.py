@@ -30,7 +30,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bazaznaniy.middleware.PerformanceMiddleware',
+    'bazaznaniy.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,9 +73,101 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', 'bz_password'),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # Постоянные соединения с проверкой перед повторным использованием
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Пул соединений psycopg3 вместо постоянных соединений (только PostgreSQL).
+# Для режима asgi предпочтительнее пул: постоянные соединения там не переиспользуются.
+if os.environ.get('DB_POOL', 'False') == 'True' and 'postgresql' in DATABASES['default']['ENGINE']:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+        },
+    }
+
+# Реплики только для чтения: DB_REPLICA_NAMES — имена баз через запятую
+# (для SQLite — пути к файлам-копиям), DB_REPLICA_HOSTS — хосты в том же
+# порядке (по умолчанию хост основной базы). Маршрутизация — bazaznaniy/routers.py.
+DB_REPLICA_NAMES = [name.strip() for name in os.environ.get('DB_REPLICA_NAMES', '').split(',') if name.strip()]
+DB_REPLICA_HOSTS = [host.strip() for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+for index, name in enumerate(DB_REPLICA_NAMES):
+    DATABASES[f'replica{index + 1}'] = {
+        **DATABASES['default'],
+        'NAME': name,
+        'HOST': DB_REPLICA_HOSTS[index] if index < len(DB_REPLICA_HOSTS) else DATABASES['default']['HOST'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['bazaznaniy.routers.PrimaryReplicaRouter']
+
+# Сколько секунд после своей записи пользователь читает с основной базы
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '10'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# CACHE_BACKEND: locmem (по умолчанию), file, redis, memcached или полный путь к бэкенду
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        'LOCATION': os.environ.get('CACHE_LOCATION') or (
+            '/var/tmp/bz_cache' if CACHE_BACKEND == 'file' else 'bz'
+        ),
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', '300')),
+        'OPTIONS': {'MAX_ENTRIES': 10000} if CACHE_BACKEND in ('locmem', 'file') else {},
+    }
+}
+
+# Сколько секунд хранить целые страницы каталога для анонимных посетителей
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', '600'))
+
+
+# Logging
+# Строки JSON с метриками каждого запроса пишет логгер bazaznaniy.perf
+# на уровне INFO; по умолчанию он молчит (PERF_LOG_LEVEL=INFO включает)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'bazaznaniy': {
+            'handlers': ['console'],
+            'level': os.environ.get('BZ_LOG_LEVEL', 'INFO'),
+        },
+        'bazaznaniy.perf': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# Сколько последних замеров хранить на каждое имя URL и как часто
+# (раз в сколько запросов) сбрасывать их в общий кэш для perf_report
+PERF_BUFFER_SIZE = int(os.environ.get('PERF_BUFFER_SIZE', '200'))
+PERF_FLUSH_EVERY = int(os.environ.get('PERF_FLUSH_EVERY', '50'))
+
+# Подготовка воркера при импорте mysite.wsgi/asgi: URLconf, шаблоны и
+# соединение с БД до первого запроса (см. bazaznaniy/startup.py)
+WARM_UP_ON_START = os.environ.get('WARM_UP_ON_START', 'True') == 'True'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -112,6 +207,21 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'bazaznaniy/static',
 ]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Вне режима отладки статика отдаётся WhiteNoise из STATIC_ROOT: сжатые
+# файлы с хешем в имени (нужен manage.py collectstatic)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -120,3 +230,23 @@ LOGOUT_REDIRECT_URL = 'home'
 LOGIN_REDIRECT_URL = '/profile/'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/accounts/login/'
+
+# Процент баллов, с которого тема считается пройденной
+TEST_PASS_PERCENTAGE = int(os.environ.get('TEST_PASS_PERCENTAGE', '70'))
+
+# Проверять тесты в фоне (нужен запущенный `manage.py grade_worker`)
+ASYNC_GRADING = os.environ.get('ASYNC_GRADING', 'False') == 'True'
+# Через сколько секунд задачу, взятую упавшим или остановленным
+# обработчиком, можно забрать снова
+GRADING_LEASE_SECONDS = int(os.environ.get('GRADING_LEASE_SECONDS', '300'))
+
+# Ограничение частоты проверки теста на пару (пользователь, тема):
+# запас отправок подряд и сколько отправок в минуту восстанавливается
+TEST_SUBMIT_BURST = int(os.environ.get('TEST_SUBMIT_BURST', '3'))
+TEST_SUBMIT_PER_MINUTE = int(os.environ.get('TEST_SUBMIT_PER_MINUTE', '6'))
+
+# Сколько секунд помнить результат отправки теста по ключу формы
+TEST_IDEMPOTENCY_TIMEOUT = int(os.environ.get('TEST_IDEMPOTENCY_TIMEOUT', '3600'))
+
+# Сколько строк показывать в рейтингах
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', '20'))
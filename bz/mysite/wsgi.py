@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
 application = get_wsgi_application()
+
+# Воркер gunicorn импортирует этот модуль до того, как начнёт принимать
+# запросы: готовим URLconf, шаблоны и соединение с БД здесь, а не в первом запросе.
+if settings.WARM_UP_ON_START:
+    from bazaznaniy.startup import warm_up
+
+    warm_up()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""Сравнение пропускной способности режимов веб-сервера (SERVER_MODE).
+
+Для каждого режима запускает docker/entrypoint.sh на свободном порту,
+ждёт готовности и обстреливает указанные страницы из нескольких потоков.
+Режим dev запускается как раньше: runserver, DEBUG=True и новое
+соединение с БД на каждый запрос (DB_CONN_MAX_AGE=0).
+
+    python docker/bench_serving.py --modes dev wsgi asgi --requests 2000 --concurrency 16
+
+Остальные настройки (DB_*, CACHE_*) берутся из окружения.
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+ENTRYPOINT = Path(__file__).resolve().parent / 'entrypoint.sh'
+
+MODE_ENV = {
+    'dev': {'DEBUG': 'True', 'DB_CONN_MAX_AGE': '0'},
+    'wsgi': {'DEBUG': 'False'},
+    'asgi': {'DEBUG': 'False'},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port, path, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', path)
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.3)
+    return False
+
+
+def load(port, paths, total, concurrency):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        nonlocal errors
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        for i in counter:
+            path = paths[i % len(paths)]
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors += not ok
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / duration,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'errors': errors,
+    }
+
+
+def run_mode(mode, args):
+    port = free_port()
+    env = {**os.environ, **MODE_ENV[mode], 'SERVER_MODE': mode, 'PORT': str(port),
+           'SKIP_MIGRATE': 'True', 'PERF_LOG_LEVEL': 'WARNING'}
+    server = subprocess.Popen(['sh', str(ENTRYPOINT)], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              start_new_session=True)
+    try:
+        if not wait_ready(port, args.paths[0]):
+            print(f'{mode}: сервер не запустился', file=sys.stderr)
+            return None
+        load(port, args.paths, min(args.requests, 100), args.concurrency)  # прогрев
+        return load(port, args.paths, args.requests, args.concurrency)
+    finally:
+        os.killpg(server.pid, 15)
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['dev', 'wsgi'], choices=sorted(MODE_ENV))
+    parser.add_argument('--paths', nargs='+', default=['/'])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes:
+        result = run_mode(mode, args)
+        if result is None:
+            continue
+        results[mode] = result
+        print(f'{mode:5} {result["rps"]:8.1f} запросов/с  p50 {result["p50_ms"]:7.2f} мс  '
+              f'p95 {result["p95_ms"]:7.2f} мс  ошибок {result["errors"]}')
+
+    if 'dev' in results:
+        base = results['dev']['rps']
+        for mode, result in results.items():
+            if mode != 'dev':
+                print(f'{mode} быстрее dev в {result["rps"] / base:.1f} раза')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/bin/sh
+# Запуск веб-сервера в режиме SERVER_MODE:
+#   dev  — manage.py runserver (по умолчанию)
+#   wsgi — gunicorn с синхронными воркерами поверх mysite.wsgi
+#   asgi — gunicorn с воркерами uvicorn поверх mysite.asgi
+# Число воркеров по умолчанию считается по ядрам, WEB_CONCURRENCY его переопределяет.
+# Несколько воркеров требуют общего кэша (CACHE_BACKEND=redis или memcached):
+# с locmem версии кэшей у каждого воркера свои и правки не сбрасывают чужие кэши.
+
+set -e
+
+cd "$(dirname "$0")/../bz"
+
+MODE=${SERVER_MODE:-dev}
+PORT=${PORT:-8000}
+CORES=$(nproc)
+
+require_shared_cache() {
+    if [ "${CACHE_BACKEND:-locmem}" = "locmem" ] && [ "$1" -gt 1 ]; then
+        echo "CACHE_BACKEND=locmem не подходит для $1 воркеров: задайте redis или memcached" >&2
+        exit 1
+    fi
+}
+
+if [ "${SKIP_MIGRATE:-False}" != "True" ]; then
+    python manage.py migrate --noinput
+fi
+
+case "$MODE" in
+    dev)
+        exec python manage.py runserver "0.0.0.0:$PORT"
+        ;;
+    wsgi)
+        WORKERS=${WEB_CONCURRENCY:-$((CORES * 2 + 1))}
+        require_shared_cache "$WORKERS"
+        python manage.py collectstatic --noinput -v0
+        exec gunicorn mysite.wsgi:application \
+            --bind "0.0.0.0:$PORT" \
+            --workers "$WORKERS" \
+            --max-requests 10000 --max-requests-jitter 1000 \
+            --access-logfile -
+        ;;
+    asgi)
+        WORKERS=${WEB_CONCURRENCY:-$CORES}
+        require_shared_cache "$WORKERS"
+        python manage.py collectstatic --noinput -v0
+        exec gunicorn mysite.asgi:application \
+            --worker-class uvicorn_worker.UvicornWorker \
+            --bind "0.0.0.0:$PORT" \
+            --workers "$WORKERS" \
+            --max-requests 10000 --max-requests-jitter 1000 \
+            --access-logfile -
+        ;;
+    *)
+        echo "Неизвестный SERVER_MODE: $MODE (ожидается dev, wsgi или asgi)" >&2
+        exit 1
+        ;;
+esac